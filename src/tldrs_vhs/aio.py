@@ -0,0 +1,266 @@
+"""asyncio front end for ``Store``.
+
+``AsyncStore`` keeps the event loop free of blocking work:
+
+* hashing, compression and blob I/O for ``put``/``get`` run on a bounded
+  "io" thread pool;
+* ``has``/``info`` lookups run on their own small pool, so a few large
+  uploads occupying every io worker cannot delay them;
+* metadata writes go through one writer task that commits whatever puts
+  are waiting in a single transaction (group commit), and also runs
+  ``delete``, ``gc`` and access-time flushes so writes never contend with
+  each other. A read that makes buffered touches due queues a flush and
+  returns without waiting for it, even with ``access_tracking="sync"``.
+
+Inputs may be bytes, a blocking binary stream, an object with an async
+``read(n)`` (``asyncio.StreamReader``) or an async iterator of bytes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Optional, Union
+
+from .store import CHUNK_SIZE, SCHEME, ObjectInfo, Store, _Ingested, _PutOptions, parse_ref
+
+AsyncSource = Union[bytes, BinaryIO, Any]
+
+
+class _LoopReader:
+    """Blocking file-like view of an async source, read from a worker thread.
+
+    Each ``read`` runs the source's coroutine on the event loop and waits for
+    it, so at most one block is in flight and slow producers apply
+    backpressure to the ingest thread rather than buffering.
+    """
+
+    def __init__(self, source: Any, loop: asyncio.AbstractEventLoop) -> None:
+        self.source = source
+        self.loop = loop
+        self._pending = b""
+        self._eof = False
+
+    async def _next_block(self, n: int) -> bytes:
+        if hasattr(self.source, "read"):
+            return await self.source.read(n)
+        try:
+            return bytes(await self.source.__anext__())
+        except StopAsyncIteration:
+            return b""
+
+    def read(self, n: int = -1) -> bytes:
+        n = CHUNK_SIZE if n is None or n < 0 else n
+        while not self._pending and not self._eof:
+            block = asyncio.run_coroutine_threadsafe(self._next_block(n), self.loop).result()
+            if block:
+                self._pending = block
+            else:
+                self._eof = True
+        data, self._pending = self._pending[:n], self._pending[n:]
+        return data
+
+
+@dataclass
+class _Job:
+    future: asyncio.Future
+    items: Optional[list[_Ingested]] = None
+    fn: Optional[Callable[[], Any]] = None
+
+
+class AsyncStore:
+    """Async wrapper around a ``Store``; see the module docstring."""
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        *,
+        io_workers: int = 4,
+        lookup_workers: int = 4,
+        store: Optional[Store] = None,
+        **store_kwargs: Any,
+    ) -> None:
+        self.store = store if store is not None else Store(root, **store_kwargs)
+        self._io = ThreadPoolExecutor(io_workers, thread_name_prefix="vhs-io")
+        self._lookups = ThreadPoolExecutor(lookup_workers, thread_name_prefix="vhs-lookup")
+        # One thread, so every metadata write uses the same connection in order.
+        self._writer_pool = ThreadPoolExecutor(1, thread_name_prefix="vhs-writer")
+        self._queue: Optional[asyncio.Queue[_Job]] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_queued = False
+        self._closing = False
+        self.store._flush_touches = self._queue_touch_flush
+
+    async def __aenter__(self) -> "AsyncStore":
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+    async def _run(self, pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Any:
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(pool, fn, *args)
+
+    # -- writes ---------------------------------------------------------------
+
+    def _submit(self, job_items: Optional[list[_Ingested]] = None, fn: Optional[Callable[[], Any]] = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._write_loop())
+        future = loop.create_future()
+        self._queue.put_nowait(_Job(future, job_items, fn))
+        return future
+
+    async def _write_loop(self) -> None:
+        assert self._queue is not None
+        while True:
+            jobs = [await self._queue.get()]
+            while not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            # Consecutive puts that are already waiting share one transaction.
+            for is_put, group in itertools.groupby(jobs, key=lambda job: job.fn is None):
+                batch = list(group)
+                if not is_put:
+                    for job in batch:
+                        await self._finish([job], job.fn)  # type: ignore[arg-type]
+                    continue
+                items = [item for job in batch for item in job.items or []]
+                await self._finish(
+                    batch,
+                    lambda: self.store._write(lambda conn: self.store._record(conn, items)),
+                    items,
+                )
+
+    async def _finish(self, jobs: list[_Job], fn: Callable[[], Any], items: Optional[list[_Ingested]] = None) -> None:
+        try:
+            result = await self._run(self._writer_pool, fn)
+        except Exception as exc:
+            for item in items or []:
+                item.discard()
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            return
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _queue_touch_flush(self) -> None:
+        """Hand a due touch flush to the writer; called from lookup and io threads."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or self._closing:
+            self.store.flush()
+            return
+        loop.call_soon_threadsafe(self._submit_touch_flush)
+
+    def _submit_touch_flush(self) -> None:
+        # Touches stay pending until the flush runs, so every read until then
+        # finds them due; one queued flush covers them all.
+        if self._flush_queued or self._closing:
+            return
+        self._flush_queued = True
+
+        def flush() -> None:
+            self._flush_queued = False
+            self.store.flush()
+
+        # Access times are best-effort: a failed flush does not fail a read.
+        self._submit(fn=flush).add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    async def put(
+        self,
+        stream: AsyncSource,
+        compress: bool = False,
+        compress_min_bytes: Optional[int] = None,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        dict_id: Optional[str] = None,
+        chunked: bool = False,
+        seekable: bool = False,
+        frame_size: Optional[int] = None,
+    ) -> str:
+        """Store ``stream`` and return its ref. Options are as for ``Store.put``."""
+        opts = _PutOptions(compress, compress_min_bytes, codec, level, dict_id, chunked, seekable, frame_size)
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            source: Any = BytesIO(bytes(stream))
+        elif hasattr(stream, "__anext__") or asyncio.iscoroutinefunction(getattr(stream, "read", None)):
+            source = _LoopReader(stream, asyncio.get_running_loop())
+        else:
+            source = stream
+        item = await self._run(self._io, self.store._ingest, source, opts)
+        if item.staged:
+            await self._submit(job_items=[item])
+        self.store._count_puts([item])
+        return f"{SCHEME}{item.hash}"
+
+    async def delete(self, ref: str) -> bool:
+        return await self._submit(fn=lambda: self.store.delete(ref))
+
+    async def gc(self, max_age_days: Optional[int], max_size_mb: Optional[int], **kwargs: Any) -> dict:
+        """Run ``Store.gc`` on the writer, between metadata commits."""
+        return await self._submit(fn=lambda: self.store.gc(max_age_days, max_size_mb, **kwargs))
+
+    # -- reads ----------------------------------------------------------------
+
+    async def has(self, ref: str) -> bool:
+        return await self._run(self._lookups, self.store.has, ref)
+
+    async def info(self, ref: str) -> Optional[ObjectInfo]:
+        return await self._run(self._lookups, self.store.info, ref)
+
+    async def get(self, ref: str, offset: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the content of ``ref`` (or a byte range) in blocks.
+
+        Raises ``ValueError`` for a malformed ref and ``FileNotFoundError``
+        when it is not stored, before the first block.
+        """
+        if not parse_ref(ref):
+            raise ValueError("Invalid ref (expected vhs://<sha256>)")
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("offset and length must be non-negative")
+        loc = await self._run(self._lookups, self.store._locate, ref)
+        pieces = self.store._iter_range(loc, offset, length)
+        return self._drain(pieces)
+
+    async def _drain(self, pieces: Any) -> AsyncIterator[bytes]:
+        done = object()
+        try:
+            while True:
+                piece = await self._run(self._io, next, pieces, done)
+                if piece is done:
+                    return
+                if piece:
+                    yield piece
+        finally:
+            pieces.close()
+
+    async def read(self, ref: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Return the content of ``ref`` (or a byte range) as bytes."""
+        return b"".join([piece async for piece in await self.get(ref, offset, length)])
+
+    async def close(self) -> None:
+        """Wait for queued writes, then release the pools and the store."""
+        # From here on reads flush their own touches; ``Store.close`` writes
+        # whatever is still pending.
+        self._closing = True
+        self.store._flush_touches = self.store.flush
+        if self._queue is not None:
+            # Queued after every pending write, so it completes last.
+            await self._submit(fn=lambda: None)
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._queue = self._writer = None
+        for pool in (self._io, self._lookups):
+            pool.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(self._writer_pool, self.store.close)
+        self._writer_pool.shutdown(wait=True)
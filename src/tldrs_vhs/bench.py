@@ -0,0 +1,269 @@
+"""Micro-benchmarks for the store.
+
+Run with ``tldrs-vhs bench [--sizes 1000,10000]`` for store operations or
+``python -m tldrs_vhs.bench egress [--size-mb N]`` for copy throughput;
+results are printed as JSON.
+Throughputs are in MB/s (10**6 bytes) and measured with a warm page cache,
+so they compare code paths rather than disks. Latencies are in milliseconds.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from .egress import copy_fd
+from .store import Store
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def _rate(nbytes: int, seconds: float) -> float:
+    return round(nbytes / max(seconds, 1e-9) / 1e6, 1)
+
+
+def _timed(fn: Callable[[], object]) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def _drain(fd: int) -> threading.Thread:
+    def run() -> None:
+        while os.read(fd, 1024 * 1024):
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _to_pipe(copy: Callable[[int], object]) -> tuple[float, object]:
+    r, w = os.pipe()
+    reader = _drain(r)
+    try:
+        elapsed, result = _timed(lambda: copy(w))
+    finally:
+        os.close(w)
+        reader.join()
+        os.close(r)
+    return elapsed, result
+
+
+def bench_egress(size_mb: int = 256, root: Optional[Path] = None) -> dict:
+    """Compare kernel-assisted and buffered copies of a raw blob to a file and a pipe."""
+    with tempfile.TemporaryDirectory(dir=root) as tmp:
+        store = Store(root=Path(tmp) / "store")
+        block = os.urandom(1024 * 1024)
+        ref = store.put(BytesIO(block * size_mb))
+        blob = store._blob_path(ref[6:])
+        size = blob.stat().st_size
+        out = Path(tmp) / "out"
+
+        def kernel_file() -> str:
+            out.unlink(missing_ok=True)
+            with blob.open("rb") as src, out.open("wb") as dst:
+                return copy_fd(src.fileno(), dst.fileno(), 0, size)
+
+        def buffered_file() -> None:
+            out.unlink(missing_ok=True)
+            with blob.open("rb") as src, out.open("wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        def kernel_pipe(fd: int) -> str:
+            with blob.open("rb") as src:
+                return copy_fd(src.fileno(), fd, 0, size)
+
+        def buffered_pipe(fd: int) -> None:
+            with blob.open("rb") as src, os.fdopen(fd, "wb", closefd=False) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        file_kernel_s, file_method = _timed(kernel_file)
+        file_buffered_s, _ = _timed(buffered_file)
+        pipe_kernel_s, pipe_method = _to_pipe(kernel_pipe)
+        pipe_buffered_s, _ = _to_pipe(buffered_pipe)
+        store.close()
+    return {
+        "size_bytes": size,
+        "file": {
+            "method": file_method,
+            "kernel_mb_s": _rate(size, file_kernel_s),
+            "buffered_mb_s": _rate(size, file_buffered_s),
+        },
+        "pipe": {
+            "method": pipe_method,
+            "kernel_mb_s": _rate(size, pipe_kernel_s),
+            "buffered_mb_s": _rate(size, pipe_buffered_s),
+        },
+    }
+
+
+def _corpus(rng: random.Random) -> Iterator[bytes]:
+    """Yield synthetic tool outputs: logs, JSON, and near-duplicates of both.
+
+    Sizes are log-uniform between 128 bytes and 64 KiB. Every payload is
+    unique, but near-duplicates differ from an earlier one by a single line.
+    """
+    words = [f"w{i}" for i in range(512)]
+    recent: list[bytes] = []
+    serial = 0
+    while True:
+        serial += 1
+        size = int(2 ** rng.uniform(7, 16))
+        kind = rng.random()
+        if kind < 0.3 and recent:
+            lines = rng.choice(recent).split(b"\n")
+            lines[rng.randrange(len(lines))] = f"changed line {serial}".encode()
+            data = b"\n".join(lines)
+        elif kind < 0.65:
+            out = [f"# run {serial}"]
+            while sum(map(len, out)) < size:
+                out.append(f"src/mod{rng.randrange(100)}.py:{rng.randrange(2000)}: " + " ".join(rng.choices(words, k=8)))
+            data = "\n".join(out).encode()
+        else:
+            items = []
+            while sum(map(len, items)) < size:
+                items.append(json.dumps({"path": f"src/{rng.choice(words)}.py", "line": rng.randrange(2000), "text": " ".join(rng.choices(words, k=6))}))
+            data = f'{{"run": {serial}, "results": [{", ".join(items)}]}}'.encode()
+        recent = (recent + [data])[-64:]
+        yield data
+
+
+def _latency(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    n = len(ordered)
+    if not n:
+        return {}
+
+    def pct(p: float) -> float:
+        return round(ordered[min(n - 1, int(p * n))] * 1000, 3)
+
+    return {"n": n, "ops_s": round(n / max(sum(ordered), 1e-9), 1), "p50_ms": pct(0.5), "p99_ms": pct(0.99)}
+
+
+def _measure(fn: Callable[[str], object], refs: list[str]) -> tuple[dict, float]:
+    samples = []
+    for ref in refs:
+        start = time.perf_counter()
+        fn(ref)
+        samples.append(time.perf_counter() - start)
+    return _latency(samples), sum(samples)
+
+
+def _cli_cost(root: Path, command: str, ref: str, samples: int) -> dict:
+    env = dict(os.environ, TLDRS_VHS_HOME=str(root), TLDRS_VHS_NO_DAEMON="1")
+    argv = [sys.executable, "-m", "tldrs_vhs.cli", command, ref]
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return _latency(times)
+
+
+def bench_store(
+    sizes: tuple[int, ...] = DEFAULT_SIZES,
+    ops: int = 1000,
+    cli_samples: int = 5,
+    root: Optional[Path] = None,
+    seed: int = 0,
+) -> dict:
+    """Time each store operation as one store grows through ``sizes`` objects.
+
+    At each size ``put`` is timed over the objects added to reach it, and
+    ``get``/``has``/``info`` over ``ops`` randomly chosen refs; ``has`` also
+    over the same number of absent refs. ``ls`` and ``stats`` run ``ops // 10``
+    times. ``gc`` is a dry run that plans to evict half the store. With
+    ``cli_samples`` the same ``has``/``info``/``get`` calls are also timed as
+    separate ``tldrs-vhs`` processes.
+    """
+    rng = random.Random(seed)
+    corpus = _corpus(rng)
+    results = []
+    with tempfile.TemporaryDirectory(dir=root) as tmp:
+        store_root = Path(tmp) / "store"
+        store = Store(root=store_root)
+        refs: list[str] = []
+        total_bytes = 0
+        try:
+            for target in sorted(sizes):
+                put_samples, put_bytes = [], 0
+                while len(refs) < target:
+                    data = next(corpus)
+                    compress = len(data) >= 4096
+                    start = time.perf_counter()
+                    refs.append(store.put(BytesIO(data), compress=compress))
+                    put_samples.append(time.perf_counter() - start)
+                    put_bytes += len(data)
+                total_bytes += put_bytes
+                store.flush()
+                sample = rng.choices(refs, k=ops)
+                absent = [f"{rng.getrandbits(256):064x}" for _ in range(ops)]
+                row: dict = {"objects": len(refs), "logical_bytes": total_bytes, "ops": {}}
+                timings = row["ops"]
+                if put_samples:
+                    timings["put"] = dict(_latency(put_samples), mb_s=_rate(put_bytes, sum(put_samples)))
+                get_bytes = sum(store.size_of(ref) for ref in sample)
+                timings["get"], get_s = _measure(lambda ref: store.read_range(ref, 0), sample)
+                timings["get"]["mb_s"] = _rate(get_bytes, get_s)
+                timings["has"], _ = _measure(store.has, sample)
+                timings["has_miss"], _ = _measure(store.has, absent)
+                timings["info"], _ = _measure(store.info, sample)
+                light = sample[: max(ops // 10, 1)]
+                timings["ls"], _ = _measure(lambda _ref: store.list(limit=20), light)
+                timings["stats"], _ = _measure(lambda _ref: store.stats(), light)
+                half_mb = max(int(store.stats()["total_stored_bytes"] / 2 / 1024 / 1024), 0)
+                timings["gc"], _ = _measure(lambda _ref: store.gc(None, half_mb, dry_run=True), light[:3])
+                store.flush()
+                if cli_samples:
+                    ref = sample[0]
+                    row["cli"] = {cmd: _cli_cost(store_root, cmd, ref, cli_samples) for cmd in ("has", "info", "get")}
+                results.append(row)
+        finally:
+            store.close()
+    return {"seed": seed, "ops": ops, "python": sys.version.split()[0], "sizes": results}
+
+
+def run_store(args: argparse.Namespace) -> int:
+    """Entry point for ``tldrs-vhs bench``."""
+    result = bench_store(
+        args.sizes,
+        ops=args.ops,
+        cli_samples=args.cli_samples,
+        root=Path(args.dir) if args.dir else None,
+        seed=args.seed,
+    )
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m tldrs_vhs.bench")
+    sub = parser.add_subparsers(dest="suite", required=True)
+    egress_p = sub.add_parser("egress", help="Blob copy throughput to a file and a pipe")
+    egress_p.add_argument("--size-mb", type=int, default=256, help="Blob size (default: 256)")
+    egress_p.add_argument("--dir", default=None, help="Scratch directory (default: system temp)")
+    args = parser.parse_args(argv)
+    if args.suite == "egress":
+        result = bench_egress(args.size_mb, Path(args.dir) if args.dir else None)
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,439 @@
+"""Streaming bundles for moving sets of objects between stores.
+
+A bundle is a magic line followed by records. Each record is a 4-byte
+big-endian header length, a JSON header, and ``length`` bytes of payload::
+
+    VHSBUNDLE\\n | bundle | (dict | chunk | object)* | end
+
+The ``bundle`` record carries the format version and the object count.
+``end`` repeats the count, so a truncated stream is detected. Each
+``object`` record holds the object's metadata (hash, size, compression,
+storage, created_at) and its bytes exactly as stored. Loose and packed blobs
+are one compressed (or raw) stream. Seekable objects are their framed
+container. Chunked objects are a list of chunk hashes whose ``chunk``
+records come first. Each chunk and each zstd dictionary is sent once per
+bundle, before the first record that needs it.
+
+Nothing is decompressed and recompressed on the way. ``import_bundle``
+decompresses only to verify hashes, block by block as each payload streams
+into a temp file. Objects the target already has are read past without
+being staged, and metadata is committed ``batch_size`` objects at a time.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from .search import TextCapture
+    from .store import Store, _Chunk, _Ingested, _Location
+
+MAGIC = b"VHSBUNDLE\n"
+VERSION = 1
+BATCH_SIZE = 500
+BLOCK_SIZE = 1024 * 1024
+# Largest JSON header accepted; the chunk list of a very large object fits.
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+_LENGTH = struct.Struct(">I")
+
+
+class BundleError(ValueError):
+    """The stream is not a bundle, is truncated, or does not match its hashes."""
+
+
+def _write_record(out: BinaryIO, header: dict) -> None:
+    raw = json.dumps(header, separators=(",", ":")).encode()
+    out.write(_LENGTH.pack(len(raw)) + raw)
+
+
+def _open_stored(store: "Store", loc: "_Location") -> tuple[int, "_Location"]:
+    """Open the file holding ``loc``'s bytes, following a concurrent tier move or repack."""
+    try:
+        return os.open(loc.path, os.O_RDONLY), loc
+    except FileNotFoundError:
+        fresh = store._lookup(loc.hash)
+        if fresh is None or fresh.path == loc.path:
+            raise
+        return os.open(fresh.path, os.O_RDONLY), fresh
+
+
+def _copy_out(store: "Store", fd: int, out: BinaryIO, offset: int, count: int) -> None:
+    from .egress import fileno
+
+    with store.metrics.phase("disk"):
+        if fileno(out) is not None:
+            store._copy_fd(fd, out, offset, count)
+            return
+        done = 0
+        while done < count:
+            data = os.pread(fd, min(BLOCK_SIZE, count - done), offset + done)
+            if not data:
+                raise FileNotFoundError(f"Stored file ended early at byte {offset + done}")
+            out.write(data)
+            done += len(data)
+
+
+def export_bundle(store: "Store", refs: Iterable[str], out: BinaryIO) -> dict:
+    """Write the objects behind ``refs`` to ``out`` as a bundle.
+
+    Every ref is resolved before anything is written, so a missing ref fails
+    the export instead of truncating the bundle. Duplicate refs are sent
+    once. Access times are not updated. Returns counts of ``objects``,
+    ``chunks``, ``dicts`` and payload ``bytes`` written.
+    """
+    from .codec import split
+    from .store import parse_ref
+
+    hashes: dict[str, None] = {}
+    for ref in refs:
+        hash_hex = parse_ref(ref)
+        if not hash_hex:
+            raise ValueError(f"Invalid ref {ref!r} (expected vhs://<sha256>)")
+        hashes[hash_hex] = None
+    result = {"objects": 0, "chunks": 0, "dicts": 0, "bytes": 0}
+    with store.metrics.op("export"):
+        locs = []
+        for hash_hex in hashes:
+            loc = store._lookup(hash_hex)
+            if loc is None:
+                raise FileNotFoundError(f"Missing blob for {hash_hex}")
+            locs.append(loc)
+        sent_dicts: set[str] = set()
+        sent_chunks: set[str] = set()
+
+        def send_dict(compression: str) -> None:
+            dict_id = split(compression)[1]
+            if dict_id is None or dict_id in sent_dicts:
+                return
+            data = store._load_dict(dict_id)
+            _write_record(out, {"type": "dict", "id": dict_id, "length": len(data)})
+            out.write(data)
+            sent_dicts.add(dict_id)
+            result["dicts"] += 1
+
+        out.write(MAGIC)
+        _write_record(out, {"type": "bundle", "version": VERSION, "objects": len(locs)})
+        conn = store._conn()
+        for loc in locs:
+            with conn:
+                row = conn.execute("SELECT size, created_at FROM objects WHERE hash = ?", (loc.hash,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"Missing blob for {loc.hash} (deleted during export)")
+            header = {"type": "object", "hash": loc.hash, "size": row[0], "created_at": row[1]}
+            if loc.storage == "chunked":
+                with conn:
+                    chunks = conn.execute(
+                        """
+                        SELECT oc.chunk_hash, c.size, c.compression FROM object_chunks oc
+                        JOIN chunks c ON c.hash = oc.chunk_hash
+                        WHERE oc.object_hash = ? ORDER BY oc.seq
+                        """,
+                        (loc.hash,),
+                    ).fetchall()
+                for chunk_hash, size, compression in chunks:
+                    if chunk_hash in sent_chunks:
+                        continue
+                    send_dict(compression or "")
+                    fd = os.open(store._chunk_path(chunk_hash), os.O_RDONLY)
+                    try:
+                        length = os.fstat(fd).st_size
+                        _write_record(
+                            out,
+                            {"type": "chunk", "hash": chunk_hash, "size": size, "compression": compression or "", "length": length},
+                        )
+                        _copy_out(store, fd, out, 0, length)
+                    finally:
+                        os.close(fd)
+                    sent_chunks.add(chunk_hash)
+                    result["chunks"] += 1
+                    result["bytes"] += length
+                send_dict(loc.compression)
+                header.update(compression=loc.compression, storage="chunked", length=0, chunks=[c[0] for c in chunks])
+                _write_record(out, header)
+                result["objects"] += 1
+                continue
+            fd, loc = _open_stored(store, loc)
+            try:
+                if loc.storage == "packed":
+                    # Packing is a layout choice of the source store; the
+                    # target decides for itself.
+                    offset, length, storage = loc.offset, loc.length, ""
+                else:
+                    offset, length, storage = 0, os.fstat(fd).st_size, loc.storage
+                send_dict(loc.compression)
+                header.update(compression=loc.compression, storage=storage, length=length)
+                _write_record(out, header)
+                _copy_out(store, fd, out, offset, length)
+            finally:
+                os.close(fd)
+            result["objects"] += 1
+            result["bytes"] += length
+        _write_record(out, {"type": "end", "objects": result["objects"]})
+        out.flush()
+    return result
+
+
+def _read_exact(src: BinaryIO, n: int) -> bytes:
+    parts = []
+    while n > 0:
+        data = src.read(n)
+        if not data:
+            raise BundleError("Truncated bundle")
+        parts.append(data)
+        n -= len(data)
+    return b"".join(parts)
+
+
+def _read_header(src: BinaryIO) -> dict:
+    (n,) = _LENGTH.unpack(_read_exact(src, _LENGTH.size))
+    if n > MAX_HEADER_BYTES:
+        raise BundleError(f"Bundle record header of {n} bytes is too large")
+    raw = _read_exact(src, n)
+    try:
+        header = json.loads(raw)
+    except ValueError:
+        raise BundleError("Corrupt bundle record header") from None
+    if not isinstance(header, dict):
+        raise BundleError("Corrupt bundle record header")
+    return header
+
+
+def _payload(src: BinaryIO, length: int) -> Iterator[bytes]:
+    while length > 0:
+        data = src.read(min(BLOCK_SIZE, length))
+        if not data:
+            raise BundleError("Truncated bundle")
+        length -= len(data)
+        yield data
+
+
+def _tee(blocks: Iterable[bytes], f: BinaryIO) -> Iterator[bytes]:
+    for block in blocks:
+        f.write(block)
+        yield block
+
+
+def _decompressed(store: "Store", blocks: Iterable[bytes], compression: str) -> Iterator[bytes]:
+    if not compression:
+        yield from blocks
+        return
+    decompressor = store._decompressor(compression)
+    for block in blocks:
+        yield decompressor.decompress(block)
+    yield decompressor.flush()
+
+
+def _drain(blocks: Iterable[bytes]) -> None:
+    for _ in blocks:
+        pass
+
+
+def _capture(store: "Store") -> "TextCapture":
+    from .search import TextCapture
+
+    return TextCapture(store.search_max_bytes)
+
+
+def _verify(
+    store: "Store", hash_hex: str, size: int, plain: Iterable[bytes], capture: Optional["TextCapture"] = None
+) -> None:
+    """Consume ``plain`` (the decompressed content) and check it against ``hash_hex`` and ``size``."""
+    import hashlib
+
+    hasher = hashlib.sha256()
+    seen = 0
+    if capture is not None:
+        plain = capture.tee(plain)
+    try:
+        for block in plain:
+            with store.metrics.phase("hash"):
+                hasher.update(block)
+            seen += len(block)
+    except (BundleError, OSError):
+        raise
+    except Exception as exc:
+        # zlib.error, zstd and lz4 errors: the stored bytes do not decode.
+        raise BundleError(f"Corrupt payload for {hash_hex}: {exc}") from None
+    if seen != size or hasher.hexdigest() != hash_hex:
+        raise BundleError(f"Content of {hash_hex} in the bundle does not match its hash")
+
+
+def _receive_file(store: "Store", src: BinaryIO, length: int, check) -> Path:
+    """Stream ``length`` payload bytes into a temp file; ``check`` verifies them as they pass."""
+    temp = store._temp_path()
+    try:
+        with temp.open("wb") as f:
+            check(_tee(_payload(src, length), f))
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    return temp
+
+
+def _receive_dict(store: "Store", dict_id: str, data: bytes) -> None:
+    import hashlib
+
+    if hashlib.sha256(data).hexdigest()[:16] != dict_id:
+        raise BundleError(f"Dictionary {dict_id} in the bundle does not match its id")
+    path = store.dict_root / f"{dict_id}.zdict"
+    if path.exists():
+        return
+    store.dict_root.mkdir(parents=True, exist_ok=True)
+    tmp = store.dict_root / f".{dict_id}.{os.getpid()}.tmp"
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _receive_chunk(store: "Store", src: BinaryIO, header: dict) -> "_Chunk":
+    from .store import _Chunk
+
+    chunk_hash, size, compression = header["hash"], int(header["size"]), header.get("compression", "")
+    length = int(header.get("length", 0))
+    temp = _receive_file(
+        store, src, length, lambda blocks: _verify(store, chunk_hash, size, _decompressed(store, blocks, compression))
+    )
+    return _Chunk(chunk_hash, size, length, compression, temp)
+
+
+def _receive_object(
+    store: "Store", src: BinaryIO, header: dict, chunks: dict[str, "_Chunk"], capture: Optional["TextCapture"]
+) -> "_Ingested":
+    from .store import _Ingested, _Location
+
+    hash_hex, size = header["hash"], int(header["size"])
+    compression, storage = header.get("compression", ""), header.get("storage", "")
+    length = int(header.get("length", 0))
+    if storage == "chunked":
+        parts = []
+        for chunk_hash in header.get("chunks", []):
+            chunk = chunks.get(chunk_hash) or store._existing_chunk(chunk_hash)
+            if chunk is None:
+                raise BundleError(f"Chunk {chunk_hash} of {hash_hex} is neither in the bundle nor in the store")
+            parts.append(chunk)
+        plain = (
+            store._read_blob(chunk.temp or store._chunk_path(chunk.hash), chunk.compression) for chunk in parts
+        )
+        _verify(store, hash_hex, size, plain, capture)
+        stored = sum({chunk.hash: chunk.stored_size for chunk in parts}.values())
+        item = _Ingested(hash_hex, size, stored, compression, None, "chunked", chunks=parts)
+    elif storage == "framed":
+        temp = _receive_file(store, src, length, _drain)
+        try:
+            loc = _Location(hash_hex, "framed", compression, temp, size=size)
+            _verify(store, hash_hex, size, store._iter_range(loc, 0, None), capture)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+        item = _Ingested(hash_hex, size, length, compression, temp, "framed")
+    elif storage == "":
+        if store.pack_max_bytes is not None and length <= store.pack_max_bytes:
+            data = _read_exact(src, length) if length else b""
+            _verify(store, hash_hex, size, _decompressed(store, [data], compression), capture)
+            item = _Ingested(hash_hex, size, length, compression, None, "packed", data=data)
+        else:
+            temp = _receive_file(
+                store,
+                src,
+                length,
+                lambda blocks: _verify(store, hash_hex, size, _decompressed(store, blocks, compression), capture),
+            )
+            item = _Ingested(hash_hex, size, length, compression, temp)
+    else:
+        raise BundleError(f"Unknown storage {storage!r} for {hash_hex}")
+    item.text = capture.text() if capture is not None else None
+    return item
+
+
+def import_bundle(store: "Store", src: BinaryIO, batch_size: int = BATCH_SIZE) -> dict:
+    """Read a bundle from ``src`` into ``store``.
+
+    Every object and chunk is checked against its hash before it is
+    recorded. Objects the store already has are skipped, and the rest are
+    committed ``batch_size`` at a time. Objects keep their ``created_at``.
+    On a bad or truncated bundle, batches already committed stay, so
+    running the import again resumes where it stopped. Raises
+    ``BundleError``. Returns counts of ``objects`` in the bundle, objects
+    ``imported`` and ``skipped``, new ``chunks``, and payload ``bytes`` read.
+    """
+    from .store import _PutOptions
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    if _read_exact(src, len(MAGIC)) != MAGIC:
+        raise BundleError("Not a tldrs-vhs bundle")
+    first = _read_header(src)
+    if first.get("type") != "bundle":
+        raise BundleError("Not a tldrs-vhs bundle")
+    if first.get("version") != VERSION:
+        raise BundleError(f"Unsupported bundle version {first.get('version')!r} (expected {VERSION})")
+    (store.root / "tmp").mkdir(parents=True, exist_ok=True)
+    result = {"objects": 0, "imported": 0, "skipped": 0, "chunks": 0, "bytes": 0}
+    indexes = store._indexes(_PutOptions())
+    pending: list[_Ingested] = []
+    created: dict[str, int] = {}
+    chunks: dict[str, _Chunk] = {}
+
+    def commit() -> None:
+        items = list(pending)
+
+        def record(conn) -> None:
+            store._record(conn, items)
+            conn.executemany(
+                "UPDATE objects SET created_at = ? WHERE hash = ?",
+                [(created[item.hash], item.hash) for item in items if item.staged],
+            )
+
+        store._write(record)
+        staged = sum(item.staged for item in items)
+        result["imported"] += staged
+        result["skipped"] += len(items) - staged
+        pending.clear()
+        created.clear()
+
+    with store.metrics.op("import"):
+        try:
+            while True:
+                header = _read_header(src)
+                kind = header.get("type")
+                length = int(header.get("length", 0))
+                if kind == "end":
+                    if header.get("objects") != result["objects"]:
+                        raise BundleError("Bundle object count does not match its end record")
+                    break
+                if kind == "dict":
+                    _receive_dict(store, header["id"], _read_exact(src, length))
+                    continue
+                result["bytes"] += length
+                if kind == "chunk":
+                    if header["hash"] in chunks or store._existing_chunk(header["hash"]) is not None:
+                        _drain(_payload(src, length))
+                        continue
+                    chunks[header["hash"]] = _receive_chunk(store, src, header)
+                    result["chunks"] += 1
+                    continue
+                if kind != "object":
+                    raise BundleError(f"Unknown bundle record {kind!r}")
+                result["objects"] += 1
+                hash_hex = header["hash"]
+                if hash_hex in created or store._existing(hash_hex) is not None:
+                    _drain(_payload(src, length))
+                    result["skipped"] += 1
+                    continue
+                pending.append(_receive_object(store, src, header, chunks, _capture(store) if indexes else None))
+                created[hash_hex] = int(header.get("created_at") or store._now())
+                if len(pending) >= batch_size:
+                    commit()
+            if pending:
+                commit()
+        finally:
+            for item in pending:
+                item.discard()
+            # Chunks whose objects were skipped or never arrived.
+            for chunk in chunks.values():
+                if chunk.temp is not None:
+                    chunk.temp.unlink(missing_ok=True)
+    return result
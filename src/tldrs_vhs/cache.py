@@ -0,0 +1,110 @@
+"""In-process caches for hot refs.
+
+``BlobCache`` holds the decompressed content of small objects in a
+byte-budgeted LRU, plus a bounded set of recent ``has`` misses. Objects are
+immutable, so a cached payload never goes stale; entries only have to be
+dropped when the object is deleted. Misses can be turned into hits by
+another process at any time, so negative entries expire after a short TTL.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class BlobCache:
+    """Byte-budgeted LRU of decompressed payloads with a TTL'd miss set."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_item_bytes: int = 1024 * 1024,
+        negative_size: int = 10_000,
+        negative_ttl_s: float = 10.0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self.negative_size = negative_size
+        self.negative_ttl_s = negative_ttl_s
+        self._blobs: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self._missing: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.negative_hits = 0
+
+    def get(self, hash_hex: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._blobs.get(hash_hex)
+            if data is None:
+                self.misses += 1
+                return None
+            self._blobs.move_to_end(hash_hex)
+            self.hits += 1
+            return data
+
+    def __contains__(self, hash_hex: str) -> bool:
+        with self._lock:
+            return hash_hex in self._blobs
+
+    def put(self, hash_hex: str, data: bytes) -> None:
+        if len(data) > self.max_item_bytes:
+            return
+        with self._lock:
+            if hash_hex in self._blobs:
+                return
+            self._blobs[hash_hex] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, hash_hex: str) -> None:
+        with self._lock:
+            data = self._blobs.pop(hash_hex, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def is_missing(self, hash_hex: str) -> bool:
+        """True when ``hash_hex`` was recently reported absent."""
+        with self._lock:
+            expires = self._missing.get(hash_hex)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._missing[hash_hex]
+                return False
+            self.negative_hits += 1
+            return True
+
+    def add_missing(self, hash_hex: str) -> None:
+        if self.negative_size <= 0:
+            return
+        with self._lock:
+            self._missing[hash_hex] = time.monotonic() + self.negative_ttl_s
+            self._missing.move_to_end(hash_hex)
+            while len(self._missing) > self.negative_size:
+                self._missing.popitem(last=False)
+
+    def discard_missing(self, hash_hex: str) -> None:
+        with self._lock:
+            self._missing.pop(hash_hex, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "negative_entries": len(self._missing),
+                "negative_hits": self.negative_hits,
+            }
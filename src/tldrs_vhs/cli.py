@@ -1,13 +1,60 @@
 from __future__ import annotations
 
 import argparse
+import itertools
 import json
+import os
 import sys
 from pathlib import Path
+from typing import Optional
 
-from .store import Store
+from .store import Store, resolve_root
 from . import __version__
 
+# Commands the thin client can answer from a running `serve` daemon.
+_DAEMON_COMMANDS = ("has", "get", "cat", "info")
+
+
+def _add_codec_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--codec",
+        choices=["zlib", "zstd", "lz4", "auto"],
+        default=None,
+        help="Compression codec (implies compression unless --compress-min-bytes is set)",
+    )
+    p.add_argument("--level", type=int, default=None, help="Codec compression level")
+    p.add_argument(
+        "--dict",
+        dest="dict_id",
+        nargs="?",
+        const="latest",
+        default=None,
+        help="Use a trained zstd dictionary (default: latest)",
+    )
+    p.add_argument(
+        "--chunked",
+        action="store_true",
+        help="Store as content-defined chunks shared with similar outputs",
+    )
+    p.add_argument(
+        "--seekable",
+        action="store_true",
+        help="Write compressed payloads as indexed frames for fast range reads",
+    )
+    p.add_argument("--frame-size", type=int, default=None, help="Uncompressed frame size for --seekable")
+    p.add_argument(
+        "--index",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Add text payloads to the full-text index (default: TLDRS_VHS_SEARCH_INDEX)",
+    )
+    p.add_argument(
+        "--line-index",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Record a line index for `get --lines` (default: TLDRS_VHS_LINE_INDEX)",
+    )
+
 
 def _parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -20,17 +67,49 @@ def _parse_args() -> argparse.Namespace:
 
     put_p = sub.add_parser("put", help="Store a file or stdin")
     put_p.add_argument("file", nargs="?", default="-", help="File path or '-' for stdin")
-    put_p.add_argument("--compress", action="store_true", help="Compress stored payload (zlib)")
+    put_p.add_argument("--compress", action="store_true", help="Compress stored payload (default codec: zlib)")
     put_p.add_argument(
         "--compress-min-bytes",
         type=int,
         default=None,
         help="Compress if payload is at least N bytes",
     )
+    put_p.add_argument(
+        "--expect-hash",
+        default=None,
+        help="Known sha256/ref of the payload; skip ingest if already stored",
+    )
+    placement = put_p.add_mutually_exclusive_group()
+    placement.add_argument("--link", action="store_true", help="Reflink or hard-link FILE into the store instead of copying")
+    placement.add_argument("--move", action="store_true", help="Move FILE into the store (removed unless already stored)")
+    _add_codec_args(put_p)
+
+    put_many_p = sub.add_parser("put-many", help="Store files listed on stdin, emit JSONL")
+    put_many_p.add_argument("-0", "--null", action="store_true", help="Input is NUL-separated")
+    put_many_p.add_argument("--compress", action="store_true", help="Compress stored payloads (default codec: zlib)")
+    put_many_p.add_argument(
+        "--compress-min-bytes",
+        type=int,
+        default=None,
+        help="Compress payloads of at least N bytes",
+    )
+    _add_codec_args(put_many_p)
 
     get_p = sub.add_parser("get", help="Fetch a ref to stdout or file")
     get_p.add_argument("ref", help="vhs://<hash> or raw hash")
     get_p.add_argument("--out", default=None, help="Output file path")
+    get_p.add_argument("--offset", type=int, default=0, help="Start at byte N")
+    get_p.add_argument("--length", type=int, default=None, help="Read at most N bytes")
+    get_p.add_argument("--link", action="store_true", help="Hard-link a read-only copy to --out when possible")
+    get_p.add_argument("--lines", default=None, metavar="A:B", help="Lines A to B, numbered from 1 (A: or :B open-ended)")
+
+    head_p = sub.add_parser("head", help="Print the first bytes of a ref")
+    head_p.add_argument("ref", help="vhs://<hash> or raw hash")
+    head_p.add_argument("-c", "--bytes", type=int, default=4096, help="Bytes to print (default: 4096)")
+
+    tail_p = sub.add_parser("tail", help="Print the last bytes of a ref")
+    tail_p.add_argument("ref", help="vhs://<hash> or raw hash")
+    tail_p.add_argument("-c", "--bytes", type=int, default=4096, help="Bytes to print (default: 4096)")
 
     cat_p = sub.add_parser("cat", help="Alias for get (stdout)")
     cat_p.add_argument("ref", help="vhs://<hash> or raw hash")
@@ -38,6 +117,22 @@ def _parse_args() -> argparse.Namespace:
     has_p = sub.add_parser("has", help="Check if ref exists (exit 0/1)")
     has_p.add_argument("ref", help="vhs://<hash> or raw hash")
 
+    has_many_p = sub.add_parser("has-many", help="Check refs listed on stdin, emit JSONL")
+    has_many_p.add_argument("-0", "--null", action="store_true", help="Input is NUL-separated")
+
+    get_many_p = sub.add_parser("get-many", help="Fetch refs listed on stdin into a directory")
+    get_many_p.add_argument("--out-dir", required=True, help="Directory to write <hash> files into")
+    get_many_p.add_argument("-0", "--null", action="store_true", help="Input is NUL-separated")
+
+    export_p = sub.add_parser("export", help="Write refs and their metadata to a bundle (stdout or --out)")
+    export_p.add_argument("refs", nargs="*", help="Refs to export; none or '-' reads them from stdin")
+    export_p.add_argument("-o", "--out", default=None, help="Bundle file (default: stdout)")
+    export_p.add_argument("-0", "--null", action="store_true", help="Refs on stdin are NUL-separated")
+
+    import_p = sub.add_parser("import", help="Load a bundle made by `export`, emit JSON counts")
+    import_p.add_argument("file", nargs="?", default="-", help="Bundle file or '-' for stdin")
+    import_p.add_argument("--batch-size", type=int, default=500, help="Objects committed per transaction (default: 500)")
+
     info_p = sub.add_parser("info", help="Show metadata for a ref")
     info_p.add_argument("ref", help="vhs://<hash> or raw hash")
 
@@ -45,45 +140,310 @@ def _parse_args() -> argparse.Namespace:
     rm_p.add_argument("ref", help="vhs://<hash> or raw hash")
 
     ls_p = sub.add_parser("ls", help="List recent refs")
-    ls_p.add_argument("--limit", type=int, default=20, help="Max results (default: 20)")
-    ls_p.add_argument("--jsonl", action="store_true", help="Emit one JSON object per line")
+    ls_p.add_argument("--limit", type=int, default=20, help="Max results (default: 20; 0 for no limit)")
+    ls_p.add_argument("--jsonl", action="store_true", help="Stream one JSON object per line")
+    ls_p.add_argument("--after", metavar="CURSOR", default=None, help="Continue after the row with this cursor")
+    ls_p.add_argument("--min-size", type=int, default=None, help="Only objects of at least N bytes")
+    ls_p.add_argument("--max-size", type=int, default=None, help="Only objects of at most N bytes")
+    ls_p.add_argument("--compression", default=None, help="Only objects stored with CODEC ('none' for raw)")
+    ls_p.add_argument("--older-than-days", type=float, default=None, help="Only objects stored over D days ago")
+    ls_p.add_argument("--newer-than-days", type=float, default=None, help="Only objects stored within D days")
+
+    search_p = sub.add_parser("search", help="Full-text search of indexed text, emit JSONL")
+    search_p.add_argument("query", help="FTS5 query, e.g. 'ModuleNotFoundError' or '\"connection refused\"'")
+    search_p.add_argument("--limit", type=int, default=20, help="Max results (default: 20)")
+
+    grep_p = sub.add_parser("grep", help="Scan all text objects for a regex, emit JSONL")
+    grep_p.add_argument("pattern", help="Python regular expression")
+    grep_p.add_argument("-i", "--ignore-case", action="store_true", help="Case-insensitive match")
+    grep_p.add_argument("-F", "--fixed-strings", action="store_true", help="Match PATTERN literally")
+    grep_p.add_argument("-m", "--max-count", type=int, default=3, help="Matches per object (default: 3)")
+    grep_p.add_argument("--limit", type=int, default=None, help="Stop after N matches")
+    grep_p.add_argument("--workers", type=int, default=None, help="Scan processes (default: CPU count)")
+
+    sub.add_parser("reindex", help="Add stored text objects missing from the full-text index")
 
     stats_p = sub.add_parser("stats", help="Show store statistics")
+    stats_p.add_argument("--metrics", action="store_true", help="Include operation counters and latencies")
+    stats_p.add_argument(
+        "--prometheus",
+        default=None,
+        metavar="FILE",
+        help="Also write metrics in Prometheus text format to FILE (for node_exporter)",
+    )
+
+    repack_p = sub.add_parser("repack", help="Compact pack files after deletes/GC")
+    repack_p.add_argument(
+        "--max-live-ratio",
+        type=float,
+        default=0.7,
+        help="Rewrite packs whose live fraction is at most this (default: 0.7)",
+    )
+
+    train_p = sub.add_parser("train-dict", help="Train a zstd dictionary from stored blobs")
+    train_p.add_argument("--samples", type=int, default=2000, help="Max blobs to sample (default: 2000)")
+    train_p.add_argument("--size", type=int, default=112640, help="Dictionary size in bytes")
+
+    fsck_p = sub.add_parser("fsck", aliases=["verify"], help="Rehash objects and find stray files")
+    fsck_p.add_argument("--repair", action="store_true", help="Drop bad rows and remove orphan/temp files")
+    fsck_p.add_argument("--sample", type=float, default=1.0, help="Verify a random fraction of objects (default: 1)")
+    fsck_p.add_argument("--workers", type=int, default=None, help="Verification threads (default: CPU count)")
+    fsck_p.add_argument("--budget-ms", type=int, default=None, help="Stop after about N ms and save a cursor")
+    fsck_p.add_argument("--resume", action="store_true", help="Continue from the saved cursor")
+
+    serve_p = sub.add_parser("serve", help="Run a resident daemon on a Unix socket")
+    serve_p.add_argument("--socket", default=None, help="Socket path (default: <root>/vhs.sock)")
+    serve_p.add_argument("--tier-every", type=float, default=None, metavar="SECONDS", help="Run tiering in the background")
+    serve_p.add_argument("--cold-after-days", type=float, default=1.0, help="Tiering cutoff (default: 1)")
+
+    recover_p = sub.add_parser("recover", help="Remove dead temp files and rows whose data was lost")
+    recover_p.add_argument("--full", action="store_true", help="Check every object, not just those since the last boot")
+
+    tier_p = sub.add_parser("tier", help="Report per-tier bytes; --run moves blobs between tiers")
+    tier_p.add_argument("--run", action="store_true", help="Demote cold blobs and promote ones read again")
+    tier_p.add_argument("--cold-after-days", type=float, default=1.0, help="Unread this long = cold (default: 1)")
+    tier_p.add_argument("--codec", choices=["zlib", "zstd", "lz4"], default=None, help="Cold codec (default: zstd 19, else zlib 9)")
+    tier_p.add_argument("--level", type=int, default=None, help="Cold codec level (default: codec maximum)")
+    tier_p.add_argument("--no-promote", action="store_true", help="Leave cold blobs cold even if read again")
+    tier_p.add_argument("--cold-root", default=None, help="Link <root>/cold to this directory (e.g. a bigger disk)")
+    tier_p.add_argument("--dry-run", action="store_true", help="Report what would move")
+    tier_p.add_argument("--budget-ms", type=int, default=None, help="Stop after about N ms; rerun to continue")
+    tier_p.add_argument("--batch-size", type=int, default=100, help="Objects per batch (default: 100)")
+
+    bench_p = sub.add_parser("bench", help="Benchmark store operations on a scratch store, emit JSON")
+    bench_p.add_argument(
+        "--sizes",
+        type=lambda text: tuple(int(float(part)) for part in text.split(",") if part),
+        default=(1_000, 10_000, 100_000),
+        help="Comma-separated store sizes in objects (default: 1000,10000,100000; 1e6 is accepted)",
+    )
+    bench_p.add_argument("--ops", type=int, default=1000, help="Timed calls per operation and size (default: 1000)")
+    bench_p.add_argument("--cli-samples", type=int, default=5, help="CLI process runs per command; 0 to skip (default: 5)")
+    bench_p.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0)")
+    bench_p.add_argument("--dir", default=None, help="Scratch directory (default: system temp)")
+    bench_p.add_argument("--output", default=None, help="Write JSON here instead of stdout")
 
     gc_p = sub.add_parser("gc", help="Garbage-collect old blobs")
     gc_p.add_argument("--max-age-days", type=int, default=None, help="Delete blobs unused for N days")
     gc_p.add_argument("--max-size-mb", type=int, default=None, help="Cap total store size in MB")
     gc_p.add_argument("--dry-run", action="store_true", help="Report what would be deleted")
     gc_p.add_argument("--keep-last", type=int, default=0, help="Protect newest N blobs from GC")
+    gc_p.add_argument("--budget-ms", type=int, default=None, help="Stop after about N ms; rerun to continue")
+    gc_p.add_argument("--batch-size", type=int, default=500, help="Objects deleted per transaction (default: 500)")
 
     return parser.parse_args()
 
 
+def _read_manifest(null: bool) -> list[str]:
+    data = sys.stdin.buffer.read()
+    sep = b"\0" if null else b"\n"
+    entries = []
+    for raw in data.split(sep):
+        entry = raw.decode("utf-8", errors="surrogateescape")
+        if not null:
+            entry = entry.strip()
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def _parse_lines(spec: str) -> tuple[int, Optional[int]]:
+    """Parse ``A:B``, ``A:``, ``:B`` or ``A`` into a 1-based inclusive line range."""
+    first, sep, last = spec.partition(":")
+    try:
+        start = int(first) if first else 1
+        end = (int(last) if last else None) if sep else start
+    except ValueError:
+        raise ValueError(f"Bad line range {spec!r} (expected A:B)") from None
+    return start, end
+
+
+def _try_daemon(argv: list[str]) -> Optional[int]:
+    """Answer simple `has/get/cat/info REF` calls via the daemon, if one is running.
+
+    Returns None to fall back to in-process mode.
+    """
+    if len(argv) != 2 or argv[0] not in _DAEMON_COMMANDS or argv[1].startswith("-"):
+        return None
+    if os.environ.get("TLDRS_VHS_NO_DAEMON"):
+        return None
+    from .server import Client, DaemonError, socket_path
+
+    path = socket_path(resolve_root())
+    if not path.exists():
+        return None
+    client = Client.connect(path)
+    if client is None:
+        return None
+    command, ref = argv
+    try:
+        if command == "has":
+            return 0 if client.has(ref) else 1
+        if command == "info":
+            info = client.info(ref)
+            if info is None:
+                print("{}")
+                return 1
+            print(json.dumps(info, indent=2))
+            return 0
+        try:
+            client.start_get(ref)
+        except DaemonError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        try:
+            client.stream_to(sys.stdout.buffer)
+        except (ConnectionError, OSError):
+            print("Error: daemon connection lost mid-transfer", file=sys.stderr)
+            return 1
+        return 0
+    except (ConnectionError, OSError):
+        # The daemon went away before answering; run in-process instead.
+        return None
+    finally:
+        client.close()
+
+
 def main() -> int:
+    fast = _try_daemon(sys.argv[1:])
+    if fast is not None:
+        return fast
     args = _parse_args()
+    if args.command == "bench":
+        # Runs against its own scratch store, never the user's.
+        from .bench import run_store
+
+        return run_store(args)
     store = Store()
+    try:
+        return _dispatch(args, store)
+    finally:
+        store.close()
 
+
+def _dispatch(args: argparse.Namespace, store: Store) -> int:
     if args.command == "put":
-        if args.file == "-":
-            ref = store.put(
-                sys.stdin.buffer,
-                compress=args.compress,
-                compress_min_bytes=args.compress_min_bytes,
-            )
-        else:
-            with open(args.file, "rb") as f:
+        if args.file == "-" and (args.link or args.move):
+            print("Error: --link/--move need a file path", file=sys.stderr)
+            return 1
+        try:
+            if args.file == "-":
                 ref = store.put(
-                    f,
+                    sys.stdin.buffer,
+                    compress=args.compress,
+                    compress_min_bytes=args.compress_min_bytes,
+                    expect_hash=args.expect_hash,
+                    codec=args.codec,
+                    level=args.level,
+                    dict_id=args.dict_id,
+                    chunked=args.chunked,
+                    seekable=args.seekable,
+                    frame_size=args.frame_size,
+                    index=args.index,
+                    line_index=args.line_index,
+                )
+            else:
+                ref = store.put_file(
+                    args.file,
+                    "link" if args.link else "move" if args.move else "copy",
                     compress=args.compress,
                     compress_min_bytes=args.compress_min_bytes,
+                    expect_hash=args.expect_hash,
+                    codec=args.codec,
+                    level=args.level,
+                    dict_id=args.dict_id,
+                    chunked=args.chunked,
+                    seekable=args.seekable,
+                    frame_size=args.frame_size,
+                    index=args.index,
+                    line_index=args.line_index,
                 )
+        except (ValueError, FileNotFoundError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
         print(ref)
         return 0
 
+    if args.command == "put-many":
+        paths = _read_manifest(args.null)
+        errors: dict[str, str] = {}
+        for p in paths:
+            if not Path(p).is_file():
+                errors[p] = "not a file"
+                continue
+            try:
+                open(p, "rb").close()
+            except OSError as exc:
+                errors[p] = exc.strerror or str(exc)
+        present = [p for p in paths if p not in errors]
+        try:
+            refs = store.put_many(
+                present,
+                compress=args.compress,
+                compress_min_bytes=args.compress_min_bytes,
+                codec=args.codec,
+                level=args.level,
+                dict_id=args.dict_id,
+                chunked=args.chunked,
+                seekable=args.seekable,
+                frame_size=args.frame_size,
+                index=args.index,
+                line_index=args.line_index,
+            )
+        except (ValueError, OSError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        by_path = dict(zip(present, refs))
+        for p in paths:
+            if p in by_path:
+                print(json.dumps({"path": p, "ref": by_path[p]}))
+            else:
+                print(json.dumps({"path": p, "error": errors[p]}))
+        return 1 if errors else 0
+
+    if args.command == "has-many":
+        results = store.has_many(_read_manifest(args.null))
+        for ref, present in results.items():
+            print(json.dumps({"ref": ref, "present": present}))
+        return 0 if all(results.values()) else 1
+
+    if args.command == "get-many":
+        results = store.get_many(_read_manifest(args.null), Path(args.out_dir))
+        for ref, path in results.items():
+            if path is None:
+                print(json.dumps({"ref": ref, "error": "not found"}))
+            else:
+                print(json.dumps({"ref": ref, "path": str(path)}))
+        return 0 if all(results.values()) else 1
+
+    if args.command == "get" and args.lines is not None:
+        if args.offset or args.length is not None or args.link:
+            print("Error: --lines cannot be combined with --offset/--length/--link", file=sys.stderr)
+            return 1
+        try:
+            start, end = _parse_lines(args.lines)
+            # Resolve the ref before --out is created or truncated.
+            store.size_of(args.ref)
+        except Exception as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        try:
+            if args.out:
+                with open(args.out, "wb") as dst:
+                    store.copy_lines(args.ref, dst, start, end)
+            else:
+                store.copy_lines(args.ref, sys.stdout.buffer, start, end)
+        except Exception as exc:
+            if args.out:
+                Path(args.out).unlink(missing_ok=True)
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        return 0
+
     if args.command == "get":
         out = Path(args.out) if args.out else None
         try:
-            store.get(args.ref, out=out)
+            store.get(args.ref, out=out, offset=args.offset, length=args.length, link=args.link)
         except Exception as exc:
             print(f"Error: {exc}", file=sys.stderr)
             return 1
@@ -97,15 +457,59 @@ def main() -> int:
             return 1
         return 0
 
+    if args.command in ("head", "tail"):
+        try:
+            offset = 0
+            if args.command == "tail":
+                offset = max(store.size_of(args.ref) - args.bytes, 0)
+            store.copy_range(args.ref, sys.stdout.buffer, offset, args.bytes)
+        except Exception as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        return 0
+
     if args.command == "has":
         return 0 if store.has(args.ref) else 1
 
+    if args.command == "export":
+        from .bundle import export_bundle
+
+        refs = args.refs if args.refs and args.refs != ["-"] else _read_manifest(args.null)
+        try:
+            if args.out:
+                with open(args.out, "wb") as out:
+                    result = export_bundle(store, refs, out)
+            else:
+                result = export_bundle(store, refs, sys.stdout.buffer)
+        except (ValueError, FileNotFoundError) as exc:
+            if args.out:
+                Path(args.out).unlink(missing_ok=True)
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print(json.dumps(result), file=sys.stderr)
+        return 0
+
+    if args.command == "import":
+        from .bundle import import_bundle
+
+        try:
+            if args.file == "-":
+                result = import_bundle(store, sys.stdin.buffer, batch_size=args.batch_size)
+            else:
+                with open(args.file, "rb") as src:
+                    result = import_bundle(store, src, batch_size=args.batch_size)
+        except (ValueError, FileNotFoundError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print(json.dumps(result, indent=2))
+        return 0
+
     if args.command == "info":
         info = store.info(args.ref)
         if info is None:
             print("{}")
             return 1
-        print(json.dumps(info.__dict__, indent=2))
+        print(json.dumps(info.json_dict(), indent=2))
         return 0
 
     if args.command == "rm":
@@ -121,16 +525,140 @@ def main() -> int:
         return 0
 
     if args.command == "ls":
-        items = store.list(limit=args.limit)
-        if args.jsonl:
-            for item in items:
-                print(json.dumps(item.__dict__))
-        else:
-            print(json.dumps([i.__dict__ for i in items], indent=2))
+        items = itertools.islice(
+            store.iter_objects(
+                after=args.after,
+                min_size=args.min_size,
+                max_size=args.max_size,
+                compression="" if args.compression == "none" else args.compression,
+                older_than_days=args.older_than_days,
+                newer_than_days=args.newer_than_days,
+            ),
+            args.limit or None,
+        )
+        try:
+            if args.jsonl:
+                for item in items:
+                    print(json.dumps({**item.json_dict(), "cursor": item.cursor}))
+            else:
+                print(json.dumps([{**i.json_dict(), "cursor": i.cursor} for i in items], indent=2))
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command in ("search", "grep"):
+        from .search import grep, search
+
+        try:
+            if args.command == "search":
+                hits = search(store, args.query, limit=args.limit)
+            else:
+                hits = grep(
+                    store,
+                    args.pattern,
+                    ignore_case=args.ignore_case,
+                    fixed=args.fixed_strings,
+                    limit=args.limit,
+                    max_per_object=args.max_count,
+                    workers=args.workers,
+                )
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        for hit in hits:
+            print(json.dumps(hit))
+        return 0 if hits else 1
+
+    if args.command == "reindex":
+        from .search import reindex
+
+        try:
+            print(json.dumps(reindex(store), indent=2))
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
         return 0
 
     if args.command == "stats":
-        print(json.dumps(store.stats(), indent=2))
+        stats = store.stats()
+        if args.prometheus:
+            gauges = {k: v for k, v in stats.items() if isinstance(v, (int, float))}
+            store.metrics.write_prometheus(Path(args.prometheus), gauges)
+        if args.metrics:
+            stats["metrics"] = store.metrics.summary()
+        print(json.dumps(stats, indent=2))
+        return 0
+
+    if args.command == "repack":
+        print(json.dumps(store.repack(max_live_ratio=args.max_live_ratio), indent=2))
+        return 0
+
+    if args.command == "train-dict":
+        try:
+            dict_id = store.train_dict(samples=args.samples, dict_size=args.size)
+        except (ValueError, FileNotFoundError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print(json.dumps({"dict_id": dict_id}, indent=2))
+        return 0
+
+    if args.command == "recover":
+        from .recovery import recover
+
+        print(json.dumps(recover(store, full=args.full), indent=2))
+        return 0
+
+    if args.command in ("fsck", "verify"):
+        from .fsck import fsck
+
+        result = fsck(
+            store,
+            workers=args.workers,
+            sample=args.sample,
+            repair=args.repair,
+            resume=args.resume,
+            budget_ms=args.budget_ms,
+        )
+        print(json.dumps(result, indent=2))
+        problems = result["missing"] or result["corrupt"] or result["orphans"] or result["stale_temps"]
+        return 1 if problems and not args.repair else 0
+
+    if args.command == "serve":
+        from .server import serve
+
+        serve(
+            store,
+            Path(args.socket) if args.socket else None,
+            tier_every_s=args.tier_every,
+            cold_after_days=args.cold_after_days,
+        )
+        return 0
+
+    if args.command == "tier":
+        from . import tiering
+
+        try:
+            if args.cold_root:
+                store._link_cold_root(Path(args.cold_root).expanduser().resolve())
+            if args.run or args.dry_run:
+                result = tiering.run(
+                    store,
+                    cold_after_days=args.cold_after_days,
+                    codec=args.codec,
+                    level=args.level,
+                    promote=not args.no_promote,
+                    dry_run=args.dry_run,
+                    budget_ms=args.budget_ms,
+                    batch_size=args.batch_size,
+                )
+                result["tiers"] = tiering.report(store)
+            else:
+                result = tiering.report(store)
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print(json.dumps(result, indent=2))
         return 0
 
     if args.command == "gc":
@@ -139,6 +667,8 @@ def main() -> int:
             args.max_size_mb,
             dry_run=args.dry_run,
             keep_last=args.keep_last,
+            budget_ms=args.budget_ms,
+            batch_size=args.batch_size,
         )
         print(json.dumps(result, indent=2))
         return 0
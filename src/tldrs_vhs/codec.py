@@ -0,0 +1,178 @@
+"""Compression codecs, keyed by the value stored in ``objects.compression``.
+
+``""`` means raw. Other values are a codec name, optionally followed by
+``:<dict_id>`` when the payload was compressed with a trained dictionary
+(``zstd:1a2b...``). zlib is always available; zstd and lz4 need the
+``tldrs-vhs[zstd]`` / ``tldrs-vhs[lz4]`` extras.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+from dataclasses import dataclass
+from typing import Callable, Optional, Protocol
+
+# Cheapest first; ``auto`` picks the first one that meets the ratio target.
+AUTO_CANDIDATES = (("lz4", None), ("zstd", 3), ("zlib", 6))
+AUTO_SAMPLE_BYTES = 256 * 1024
+AUTO_MIN_RATIO = 1.5
+
+
+class CodecError(ValueError):
+    """Unknown codec, or a codec whose optional dependency is missing."""
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class Decompressor(Protocol):
+    def decompress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+@dataclass(frozen=True)
+class Codec:
+    name: str
+    module: Optional[str]
+    default_level: int
+    max_level: int
+    supports_dict: bool
+    make_compressor: Callable[[int, Optional[bytes]], Compressor]
+    make_decompressor: Callable[[Optional[bytes]], Decompressor]
+
+    def available(self) -> bool:
+        return self.module is None or importlib.util.find_spec(self.module) is not None
+
+
+def _zlib_compressor(level: int, dictionary: Optional[bytes]) -> Compressor:
+    import zlib
+
+    return zlib.compressobj(level=level)
+
+
+def _zlib_decompressor(dictionary: Optional[bytes]) -> Decompressor:
+    import zlib
+
+    return zlib.decompressobj()
+
+
+class _ZstdDecompressor:
+    def __init__(self, dictionary: Optional[bytes]) -> None:
+        import zstandard
+
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self._obj = zstandard.ZstdDecompressor(dict_data=dict_data).decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _zstd_compressor(level: int, dictionary: Optional[bytes]) -> Compressor:
+    import zstandard
+
+    dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+    return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compressobj()
+
+
+class _LZ4Compressor:
+    def __init__(self, level: int) -> None:
+        import lz4.frame
+
+        self._obj = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self._started = False
+
+    def _begin(self) -> bytes:
+        if self._started:
+            return b""
+        self._started = True
+        return self._obj.begin()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._begin() + self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._begin() + self._obj.flush()
+
+
+class _LZ4Decompressor:
+    def __init__(self) -> None:
+        import lz4.frame
+
+        self._obj = lz4.frame.LZ4FrameDecompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._obj.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+CODECS: dict[str, Codec] = {}
+
+
+def register(codec: Codec) -> None:
+    CODECS[codec.name] = codec
+
+
+register(Codec("zlib", None, 6, 9, False, _zlib_compressor, _zlib_decompressor))
+register(Codec("zstd", "zstandard", 3, 22, True, _zstd_compressor, _ZstdDecompressor))
+register(Codec("lz4", "lz4", 0, 16, False, lambda level, d: _LZ4Compressor(level), lambda d: _LZ4Decompressor()))
+
+
+def split(compression: str) -> tuple[str, Optional[str]]:
+    """Split a stored compression value into ``(codec_name, dict_id)``."""
+    name, _, dict_id = compression.partition(":")
+    return name, dict_id or None
+
+
+def get(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise CodecError(f"Unknown codec: {name!r}")
+    if not codec.available():
+        raise CodecError(f"Codec {name!r} needs the optional dependency {codec.module!r} (pip install tldrs-vhs[{name}])")
+    return codec
+
+
+def compressor(name: str, level: Optional[int] = None, dictionary: Optional[bytes] = None) -> Compressor:
+    codec = get(name)
+    if dictionary is not None and not codec.supports_dict:
+        raise CodecError(f"Codec {name!r} does not support dictionaries")
+    if level is None:
+        level = codec.default_level
+    if not 0 <= level <= codec.max_level:
+        raise CodecError(f"Level for {name!r} must be between 0 and {codec.max_level}")
+    return codec.make_compressor(level, dictionary)
+
+
+def decompressor(name: str, dictionary: Optional[bytes] = None) -> Decompressor:
+    return get(name).make_decompressor(dictionary)
+
+
+def compress_bytes(name: str, data: bytes, level: Optional[int] = None) -> bytes:
+    c = compressor(name, level)
+    return c.compress(data) + c.flush()
+
+
+def choose_auto(sample: bytes, min_ratio: float = AUTO_MIN_RATIO) -> Optional[tuple[str, Optional[int]]]:
+    """Pick the cheapest available codec whose ratio on ``sample`` meets the target.
+
+    Returns ``(codec_name, level)``, or None when nothing compresses well
+    enough and the payload should be stored raw.
+    """
+    if not sample:
+        return None
+    for name, level in AUTO_CANDIDATES:
+        if not CODECS[name].available():
+            continue
+        packed = compress_bytes(name, sample, level)
+        if len(sample) / max(len(packed), 1) >= min_ratio:
+            return name, level
+    return None
@@ -0,0 +1,118 @@
+"""Kernel-assisted copies out of raw blob files.
+
+``copy_fd`` moves bytes between file descriptors without passing them
+through Python buffers. It tries, in order: a reflink (``FICLONE``) when a
+whole blob goes to an empty regular file, ``copy_file_range`` for other
+regular-file targets, ``sendfile`` (pipes, sockets, and filesystems where
+``copy_file_range`` is refused), and finally a plain ``pread``/``write`` loop.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import stat
+from typing import BinaryIO, Optional
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+_BUFFER = 1024 * 1024
+# Errors meaning "this mechanism does not apply here", not "the copy failed".
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+
+def fileno(dst: BinaryIO) -> Optional[int]:
+    """The descriptor behind ``dst``, or None for in-memory streams."""
+    try:
+        return dst.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def clone(src_fd: int, dst_fd: int) -> bool:
+    """Reflink all of ``src_fd`` onto ``dst_fd`` (copy-on-write); False if unsupported."""
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    done = 0
+    try:
+        while done < count:
+            n = os.copy_file_range(src_fd, dst_fd, count - done, offset + done)
+            if n == 0:
+                break
+            done += n
+    except OSError as exc:
+        if exc.errno not in _UNSUPPORTED:
+            raise
+    return done
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    done = 0
+    try:
+        while done < count:
+            n = os.sendfile(dst_fd, src_fd, offset + done, count - done)
+            if n == 0:
+                break
+            done += n
+    except OSError as exc:
+        if exc.errno not in _UNSUPPORTED:
+            raise
+    return done
+
+
+def copy_fd(src_fd: int, dst_fd: int, offset: int, count: int) -> str:
+    """Copy ``count`` bytes of ``src_fd`` from ``offset`` to ``dst_fd``'s position.
+
+    Returns the mechanism that finished the copy: ``"clone"``,
+    ``"copy_file_range"``, ``"sendfile"`` or ``"buffered"``.
+    """
+    if count <= 0:
+        return "buffered"
+    regular = stat.S_ISREG(os.fstat(dst_fd).st_mode)
+    if (
+        regular
+        and offset == 0
+        and count == os.fstat(src_fd).st_size
+        and os.fstat(dst_fd).st_size == 0
+        and os.lseek(dst_fd, 0, os.SEEK_CUR) == 0
+        and clone(src_fd, dst_fd)
+    ):
+        os.lseek(dst_fd, count, os.SEEK_SET)
+        return "clone"
+    done = 0
+    method = "buffered"
+    if regular and hasattr(os, "copy_file_range"):
+        done = _copy_file_range(src_fd, dst_fd, offset, count)
+        method = "copy_file_range"
+    if done < count and hasattr(os, "sendfile"):
+        sent = _sendfile(src_fd, dst_fd, offset + done, count - done)
+        if sent:
+            method = "sendfile"
+        done += sent
+    if done < count:
+        while done < count:
+            data = os.pread(src_fd, min(_BUFFER, count - done), offset + done)
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view):]
+            done += len(data)
+        method = "buffered"
+    return method
@@ -0,0 +1,124 @@
+"""Seekable framed container for compressed blobs.
+
+The payload is cut into frames of a fixed uncompressed size, each compressed
+independently, followed by an index of frame offsets and a fixed-size footer::
+
+    frame 0 | frame 1 | ... | frame N-1 | index: (N + 1) x u64 | footer
+
+The footer stores the magic, frame size, frame count, total uncompressed size
+and the index offset, so a reader can seek to any uncompressed offset and
+decompress only the frames that cover it.
+"""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from .codec import Compressor, Decompressor
+
+MAGIC = b"VHSF"
+FRAME_SIZE = 256 * 1024
+_FOOTER = struct.Struct("<4sIIQQ")
+
+
+class FramedFormatError(ValueError):
+    """The blob is not a valid framed container."""
+
+
+class FramedWriter:
+    """File-like sink that compresses fixed-size frames into ``dst``."""
+
+    def __init__(
+        self,
+        dst: BinaryIO,
+        make_compressor: Callable[[], Compressor],
+        frame_size: int = FRAME_SIZE,
+    ) -> None:
+        if frame_size <= 0:
+            raise ValueError("frame_size must be positive")
+        self.dst = dst
+        self.make_compressor = make_compressor
+        self.frame_size = frame_size
+        self.offsets = [0]
+        self.total = 0
+        self._buf = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        self.total += len(data)
+        while len(self._buf) >= self.frame_size:
+            self._emit(bytes(self._buf[:self.frame_size]))
+            del self._buf[:self.frame_size]
+        return len(data)
+
+    def _emit(self, frame: bytes) -> None:
+        compressor = self.make_compressor()
+        packed = compressor.compress(frame) + compressor.flush()
+        self.dst.write(packed)
+        self.offsets.append(self.offsets[-1] + len(packed))
+
+    def close(self) -> None:
+        """Write the final partial frame, the index and the footer."""
+        if self._buf:
+            self._emit(bytes(self._buf))
+            self._buf.clear()
+        index_offset = self.offsets[-1]
+        count = len(self.offsets) - 1
+        self.dst.write(struct.pack(f"<{len(self.offsets)}Q", *self.offsets))
+        self.dst.write(_FOOTER.pack(MAGIC, self.frame_size, count, self.total, index_offset))
+
+
+@dataclass
+class FrameIndex:
+    frame_size: int
+    total: int
+    offsets: list[int]
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets) - 1
+
+
+def read_index(f: BinaryIO) -> FrameIndex:
+    f.seek(0, 2)
+    end = f.tell()
+    if end < _FOOTER.size:
+        raise FramedFormatError("blob too short for a framed footer")
+    f.seek(end - _FOOTER.size)
+    magic, frame_size, count, total, index_offset = _FOOTER.unpack(f.read(_FOOTER.size))
+    if magic != MAGIC:
+        raise FramedFormatError("bad framed magic")
+    f.seek(index_offset)
+    raw = f.read(8 * (count + 1))
+    if len(raw) != 8 * (count + 1):
+        raise FramedFormatError("truncated frame index")
+    return FrameIndex(frame_size, total, list(struct.unpack(f"<{count + 1}Q", raw)))
+
+
+def iter_range(
+    f: BinaryIO,
+    make_decompressor: Callable[[], Decompressor],
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Yield the uncompressed bytes ``[offset, offset + length)``.
+
+    Only frames overlapping the range are read and decompressed.
+    """
+    index = read_index(f)
+    end = index.total if length is None else min(index.total, offset + length)
+    if offset >= end:
+        return
+    first = offset // index.frame_size
+    last = (end - 1) // index.frame_size
+    for i in range(first, last + 1):
+        f.seek(index.offsets[i])
+        packed = f.read(index.offsets[i + 1] - index.offsets[i])
+        decompressor = make_decompressor()
+        frame = decompressor.decompress(packed) + decompressor.flush()
+        start = i * index.frame_size
+        lo = max(offset - start, 0)
+        hi = min(end - start, len(frame))
+        yield frame[lo:hi]
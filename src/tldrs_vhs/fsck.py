@@ -0,0 +1,222 @@
+"""Consistency check for a store: rehash objects and find stray files.
+
+Objects are verified in hash order, a batch at a time, on a thread pool
+(hashlib and the codecs release the GIL on large buffers). Each object is
+read through the normal read path, so compressed, chunked, framed and packed
+objects are decompressed with the codec recorded for them and the SHA-256 of
+the content is compared with the ref.
+
+When a run stops early (``budget_ms``) the last verified hash is saved to
+``<root>/fsck.cursor``; ``resume=True`` continues from there. The
+filesystem walk for orphans and stale temp files runs alongside the first
+segment of a pass.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .store import Store
+
+CURSOR_NAME = "fsck.cursor"
+BATCH_SIZE = 256
+# Temp files younger than this may belong to a put that is still running.
+STALE_TEMP_S = 3600
+
+
+class _HashSink:
+    def __init__(self) -> None:
+        import hashlib
+
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        self.size += len(data)
+        return len(data)
+
+
+def _verify(store: "Store", row: tuple) -> Optional[tuple[str, str]]:
+    """Return ``(kind, detail)`` for a bad object, or None when it checks out."""
+    from .store import _Location
+
+    hash_hex, size, storage, compression, pack_id, pack_offset, stored_size, tier = row
+    if storage == "packed":
+        loc = _Location(hash_hex, storage, compression, store._pack_path(pack_id), pack_offset, stored_size)
+    else:
+        loc = _Location(hash_hex, storage, compression, store._object_path(hash_hex, tier))
+    sink = _HashSink()
+    try:
+        store._copy_object(loc, sink)  # type: ignore[arg-type]
+    except FileNotFoundError as exc:
+        return "missing", str(exc)
+    except Exception as exc:  # any decode failure means the stored bytes are bad
+        return "corrupt", f"{type(exc).__name__}: {exc}"
+    if sink.size != size:
+        return "corrupt", f"size {sink.size} != {size}"
+    if sink.hasher.hexdigest() != hash_hex:
+        return "corrupt", "hash mismatch"
+    return None
+
+
+def _find_strays(store: "Store") -> tuple[list[Path], list[Path]]:
+    """Files with no metadata row, and temp files left by crashed puts."""
+    orphans: list[Path] = []
+    conn = store._conn()
+    for root, table, storage_filter in (
+        (store.blob_root, "objects", " AND storage NOT IN ('chunked', 'packed') AND tier = 0"),
+        (store.cold_blob_root, "objects", " AND storage NOT IN ('chunked', 'packed') AND tier = 1"),
+        (store.chunk_root, "chunks", ""),
+    ):
+        if not root.exists():
+            continue
+        for dirpath, _, filenames in os.walk(root):
+            for i in range(0, len(filenames), 500):
+                names = filenames[i:i + 500]
+                marks = ",".join("?" * len(names))
+                with conn:
+                    known = {
+                        r[0]
+                        for r in conn.execute(f"SELECT hash FROM {table} WHERE hash IN ({marks}){storage_filter}", names)
+                    }
+                orphans.extend(Path(dirpath) / name for name in names if name not in known)
+    if store.pack_root.exists():
+        with conn:
+            packs = {store._pack_path(r[0]).name for r in conn.execute("SELECT id FROM packs")}
+        orphans.extend(p for p in store.pack_root.iterdir() if p.name not in packs)
+    stale: list[Path] = []
+    cutoff = time.time() - STALE_TEMP_S
+    for tmp, pattern in ((store.root / "tmp", "upload-*"), (store.cold_root / "tmp", "tier-*")):
+        if not tmp.exists():
+            continue
+        for path in tmp.glob(pattern):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    stale.append(path)
+            except FileNotFoundError:
+                continue
+    return orphans, stale
+
+
+def fsck(
+    store: "Store",
+    *,
+    workers: Optional[int] = None,
+    sample: float = 1.0,
+    repair: bool = False,
+    resume: bool = False,
+    budget_ms: Optional[int] = None,
+) -> dict:
+    """Verify every object (or a random ``sample`` fraction) and look for stray files.
+
+    With ``repair`` the rows of missing or corrupt objects are deleted (along
+    with whatever data remains, so the next ``put`` stores a good copy),
+    orphan files are unlinked, stale temp files are removed, and the
+    counters behind ``stats`` are recomputed if they have drifted.
+    """
+    if not 0 < sample <= 1:
+        raise ValueError("sample must be in (0, 1]")
+    cursor_path = store.root / CURSOR_NAME
+    cursor = ""
+    if resume and cursor_path.exists():
+        cursor = cursor_path.read_text().strip()
+    started = time.monotonic()
+    report: dict = {
+        "checked": 0,
+        "ok": 0,
+        "missing": [],
+        "corrupt": [],
+        "orphans": [],
+        "stale_temps": [],
+        "repaired": 0,
+        "complete": True,
+        "cursor": None,
+    }
+    conn = store._conn()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4) as pool:
+        strays: Optional[Future] = None if cursor else pool.submit(_find_strays, store)
+        while True:
+            with conn:
+                rows = conn.execute(
+                    """
+                    SELECT hash, size, storage, compression, pack_id, pack_offset, stored_size, tier
+                    FROM objects WHERE hash > ? ORDER BY hash LIMIT ?
+                    """,
+                    (cursor, BATCH_SIZE),
+                ).fetchall()
+            if not rows:
+                cursor = ""
+                break
+            cursor = rows[-1][0]
+            if sample < 1:
+                rows = [row for row in rows if random.random() < sample]
+            for row, problem in zip(rows, pool.map(lambda r: _verify(store, r), rows)):
+                report["checked"] += 1
+                if problem is None:
+                    report["ok"] += 1
+                else:
+                    kind, detail = problem
+                    report[kind].append({"hash": row[0], "error": detail})
+            if budget_ms is not None and (time.monotonic() - started) * 1000 >= budget_ms:
+                report["complete"] = False
+                report["cursor"] = cursor
+                break
+        if strays is not None:
+            orphans, stale = strays.result()
+            report["orphans"] = [str(p) for p in orphans]
+            report["stale_temps"] = [str(p) for p in stale]
+
+    if cursor:
+        cursor_path.write_text(cursor + "\n")
+    else:
+        cursor_path.unlink(missing_ok=True)
+
+    if repair:
+        report["repaired"] = _repair(store, report)
+    return report
+
+
+def _repair(store: "Store", report: dict) -> int:
+    from .store import recount_totals
+
+    bad = [entry["hash"] for entry in report["missing"] + report["corrupt"]]
+
+    def fix(conn) -> int:
+        fixed = 0
+        for hash_hex in bad:
+            if store._remove(conn, hash_hex) is not None:
+                fixed += 1
+        # Re-check orphans under the write lock: a concurrent put moves its
+        # blob into place and inserts the row in one transaction.
+        for name in report["orphans"]:
+            path = Path(name)
+            tree = path.parent.parent.parent
+            if tree in (store.blob_root, store.cold_blob_root):
+                row = conn.execute("SELECT storage, tier FROM objects WHERE hash = ?", (path.name,)).fetchone()
+                if row and row[0] not in ("chunked", "packed") and store._object_path(path.name, row[1]) == path:
+                    continue
+            elif tree == store.chunk_root:
+                if conn.execute("SELECT 1 FROM chunks WHERE hash = ?", (path.name,)).fetchone():
+                    continue
+            elif path.parent == store.pack_root:
+                ids = {store._pack_path(r[0]).name for r in conn.execute("SELECT id FROM packs")}
+                if path.name in ids:
+                    continue
+            path.unlink(missing_ok=True)
+            fixed += 1
+        if recount_totals(conn):
+            fixed += 1
+        return fixed
+
+    fixed = store._write(fix)
+    for name in report["stale_temps"]:
+        Path(name).unlink(missing_ok=True)
+        fixed += 1
+    return fixed
@@ -0,0 +1,277 @@
+"""Operation counters and latency histograms for a store.
+
+Each ``Store`` records, per operation (``put``, ``get``, ``has``, ...), a call
+count, an error count and a latency histogram, plus a histogram of the time
+spent in each phase of the operation: ``hash``, ``compress``,
+``decompress``, ``disk``, ``metadata`` (SQLite) and ``lock`` (waiting for the
+SQLite write lock). Phases are self-time: a ``disk`` step inside a
+``metadata`` step is not counted twice.
+
+Counts accumulate in memory and are merged into ``<root>/metrics.json`` when
+a store that wrote something is closed, and at most every
+``PERSIST_INTERVAL_S`` by long-running processes, so totals survive across
+CLI invocations for the cost of one small file rewrite per writing process.
+Short processes that only read drop their counts instead. Set
+``TLDRS_VHS_METRICS=0`` to turn this off.
+
+``TLDRS_VHS_TRACE=1`` logs each operation's phase timings to stderr; any
+other value is a file that JSON lines are appended to.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Histogram upper bounds in seconds; the last bucket is +Inf.
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+PERSIST_INTERVAL_S = 30.0
+PREFIX = "tldrs_vhs"
+
+
+def _empty() -> dict:
+    return {"counters": {}, "histograms": {}}
+
+
+def _merge(into: dict, delta: dict) -> dict:
+    counters = into.setdefault("counters", {})
+    for name, value in delta["counters"].items():
+        counters[name] = counters.get(name, 0) + value
+    hists = into.setdefault("histograms", {})
+    for name, hist in delta["histograms"].items():
+        old = hists.get(name)
+        if old is None or len(old["buckets"]) != len(hist["buckets"]):
+            hists[name] = {"buckets": list(hist["buckets"]), "sum": hist["sum"], "count": hist["count"]}
+            continue
+        old["buckets"] = [a + b for a, b in zip(old["buckets"], hist["buckets"])]
+        old["sum"] += hist["sum"]
+        old["count"] += hist["count"]
+    return into
+
+
+def _quantile(hist: dict, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding quantile ``q``, in seconds."""
+    if not hist["count"]:
+        return None
+    rank = q * hist["count"]
+    seen = 0
+    for bound, n in zip(BUCKETS, hist["buckets"]):
+        seen += n
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+class Metrics:
+    """Thread-safe recorder for one store; a no-op when ``enabled`` is false."""
+
+    def __init__(self, path: Optional[Path], enabled: bool = True, trace: Optional[str] = None) -> None:
+        self.path = path
+        self.enabled = enabled
+        self.trace = os.environ.get("TLDRS_VHS_TRACE") if trace is None else trace
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._delta = _empty()
+        self._pid = os.getpid()
+        self._persisted_at = time.monotonic()
+
+    def add(self, name: str, value: float = 1) -> None:
+        """Increment counter ``name``."""
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = self._delta["counters"]
+            counters[name] = counters.get(name, 0) + value
+
+    def _observe(self, name: str, seconds: float) -> None:
+        hists = self._delta["histograms"]
+        hist = hists.get(name)
+        if hist is None:
+            hist = hists[name] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        index = len(BUCKETS)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+        hist["buckets"][index] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+    @contextmanager
+    def op(self, name: str) -> Iterator[None]:
+        """Time one store operation. Nested operations count toward the outer one."""
+        if not self.enabled or getattr(self._local, "phases", None) is not None:
+            yield
+            return
+        phases: dict[str, float] = {}
+        self._local.phases = phases
+        self._local.child = 0.0
+        failed = False
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.phases = None
+            self._finish(name, elapsed, phases, failed)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Attribute the time spent in the block to ``name`` within the current operation."""
+        phases = getattr(self._local, "phases", None)
+        if phases is None:
+            yield
+            return
+        outer_child, self._local.child = self._local.child, 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phases[name] = phases.get(name, 0.0) + elapsed - self._local.child
+            self._local.child = outer_child + elapsed
+
+    def _finish(self, name: str, elapsed: float, phases: dict[str, float], failed: bool) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # The parent persists what it recorded before fork().
+                self._delta = _empty()
+                self._pid = os.getpid()
+            counters = self._delta["counters"]
+            key = f"{name}.errors" if failed else f"{name}.calls"
+            counters[key] = counters.get(key, 0) + 1
+            self._observe(name, elapsed)
+            for phase, seconds in phases.items():
+                self._observe(f"{name}.{phase}", seconds)
+            due = self.path is not None and time.monotonic() - self._persisted_at >= PERSIST_INTERVAL_S
+        if self.trace:
+            self._log(name, elapsed, phases, failed)
+        if due:
+            self.persist()
+
+    def _log(self, name: str, elapsed: float, phases: dict[str, float], failed: bool) -> None:
+        import json
+
+        record = {
+            "op": name,
+            "ms": round(elapsed * 1000, 3),
+            "phases_ms": {k: round(v * 1000, 3) for k, v in sorted(phases.items())},
+            "error": failed,
+        }
+        if self.trace in ("1", "stderr"):
+            print(f"tldrs-vhs trace: {json.dumps(record)}", file=sys.stderr)
+            return
+        with open(self.trace, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _load(self) -> dict:
+        import json
+
+        if self.path is None:
+            return _empty()
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return _empty()
+        if not isinstance(data, dict):
+            return _empty()
+        return _merge(_empty(), {"counters": data.get("counters", {}), "histograms": data.get("histograms", {})})
+
+    def persist(self) -> None:
+        """Merge what this process recorded into the metrics file."""
+        with self._lock:
+            delta, self._delta = self._delta, _empty()
+            self._persisted_at = time.monotonic()
+        if self.path is None or not (delta["counters"] or delta["histograms"]):
+            return
+        import fcntl
+        import json
+
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        try:
+            with open(lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                data = _merge(self._load(), delta)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(data, separators=(",", ":")))
+                tmp.replace(self.path)
+        except OSError:
+            # Metrics are best effort; never fail a store operation over them.
+            with self._lock:
+                _merge(self._delta, delta)
+
+    def snapshot(self) -> dict:
+        """Persisted totals plus what this process has not persisted yet."""
+        with self._lock:
+            delta = _merge(_empty(), self._delta)
+        return _merge(self._load(), delta)
+
+    def summary(self) -> dict:
+        """Counters, and per-operation and per-phase latency, for ``stats --metrics``."""
+        data = self.snapshot()
+        counters = data["counters"]
+        ops: dict[str, dict] = {}
+        for name, hist in sorted(data["histograms"].items()):
+            op, _, phase = name.partition(".")
+            entry = {"count": hist["count"], "total_s": round(hist["sum"], 6)}
+            if phase:
+                ops.setdefault(op, {}).setdefault("phases", {})[phase] = entry
+                continue
+            p50, p99 = _quantile(hist, 0.5), _quantile(hist, 0.99)
+            entry["p50_ms_le"] = None if p50 is None else p50 * 1000
+            entry["p99_ms_le"] = None if p99 is None else p99 * 1000
+            ops.setdefault(op, {}).update(entry)
+        derived = {}
+        puts = counters.get("put.objects", 0)
+        if puts:
+            derived["dedup_hit_ratio"] = round(counters.get("put.dedup_hits", 0) / puts, 4)
+        stored_in = counters.get("put.bytes_in", 0) - counters.get("put.dedup_bytes", 0)
+        if stored_in > 0:
+            derived["compression_savings"] = round(1 - counters.get("put.bytes_stored", 0) / stored_in, 4)
+        return {"counters": counters, "derived": derived, "operations": ops}
+
+    def prometheus(self, gauges: Optional[dict[str, float]] = None) -> str:
+        """Render totals in the Prometheus text exposition format."""
+        data = self.snapshot()
+        lines = []
+        for name, value in sorted((gauges or {}).items()):
+            metric = f"{PREFIX}_store_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{PREFIX}_{name.replace('.', '_')}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        hists = sorted(data["histograms"].items())
+        for metric, want_phase in ((f"{PREFIX}_operation_seconds", False), (f"{PREFIX}_phase_seconds", True)):
+            typed = False
+            for name, hist in hists:
+                op, _, phase = name.partition(".")
+                if bool(phase) != want_phase:
+                    continue
+                if not typed:
+                    typed = True
+                    lines.append(f"# TYPE {metric} histogram")
+                labels = f'op="{op}",phase="{phase}"' if phase else f'op="{op}"'
+                cumulative = 0
+                for bound, n in zip((*BUCKETS, "+Inf"), hist["buckets"]):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {hist['sum']}")
+                lines.append(f"{metric}_count{{{labels}}} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path, gauges: Optional[dict[str, float]] = None) -> None:
+        """Atomically write a textfile for node_exporter's textfile collector."""
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.prometheus(gauges))
+        tmp.replace(path)
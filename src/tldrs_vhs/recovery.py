@@ -0,0 +1,165 @@
+"""Startup recovery: clean up after crashed processes and power loss.
+
+A put stages its payload under ``tmp/`` and renames it into place inside
+the transaction that records its row. A process that dies before that
+leaves only the temp file behind. ``recover`` removes temp files whose
+process is gone (named ``upload-<pid>-...`` / ``tier-<pid>-...``) once they
+are ``TEMP_GRACE_S`` old, and any temp file older than the current boot.
+
+A power loss is different. With ``durability="fast"`` neither blobs nor
+commits are synced, so a row can survive while its blob is missing or
+truncated. The store keeps the boot id (Linux's
+``/proc/sys/kernel/random/boot_id``) in ``<root>/recovery.state``. On the
+first open after a reboot it checks every object created since the last
+recovery: loose blobs and chunks must have their recorded size, and packed
+objects must fit in their pack. Rows that fail are removed, as
+``fsck --repair`` would, so the next ``put`` stores the content again.
+Blobs whose rows were lost are orphans that ``fsck --repair`` removes.
+
+``recover(store, full=True)`` (``tldrs-vhs recover --full``) checks every
+object, for platforms without a boot id or after restoring a backup.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from .store import RECOVERY_MARKER, ROW_BACKED_STORAGE, TEMP_GRACE_S, _boot_id
+
+if TYPE_CHECKING:
+    from .store import Store
+
+# Allowance for the clock stepping back after a reboot.
+CLOCK_SLACK_S = 600
+BATCH_SIZE = 500
+
+
+def recover(store: "Store", full: bool = False) -> dict:
+    """Remove dead temp files and, after a reboot (or with ``full``), rows whose data is gone."""
+    marker_path = store.root / RECOVERY_MARKER
+    try:
+        marker = marker_path.read_text().split()
+    except FileNotFoundError:
+        marker = []
+    boot = _boot_id()
+    report: dict = {"temps_removed": _sweep_temps(store), "checked": 0, "dropped": []}
+    since: Optional[int] = None
+    if full:
+        since = 0
+    elif len(marker) == 2 and boot is not None and marker[0] != boot:
+        since = int(marker[1]) - CLOCK_SLACK_S
+    if since is not None:
+        report["checked"], report["dropped"] = _drop_damaged(store, since)
+    if boot is not None and marker[:1] != [boot]:
+        # A store seen for the first time has nothing to check yet.
+        temp = marker_path.with_name(f".{RECOVERY_MARKER}.{os.getpid()}")
+        temp.write_text(f"{boot} {store._now()}\n")
+        temp.replace(marker_path)
+    return report
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _boot_time() -> float:
+    try:
+        with open("/proc/uptime") as f:
+            return time.time() - float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _sweep_temps(store: "Store") -> int:
+    booted = _boot_time()
+    grace = time.time() - TEMP_GRACE_S
+    removed = 0
+    for tmp_dir in (store.root / "tmp", store.cold_root / "tmp"):
+        try:
+            entries = list(os.scandir(tmp_dir))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            kind, _, rest = entry.name.partition("-")
+            pid = rest.partition("-")[0]
+            if kind not in ("upload", "tier") or not pid.isdigit():
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime < booted or (mtime < grace and not _pid_alive(int(pid))):
+                Path(entry.path).unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def _intact(store: "Store", conn: sqlite3.Connection, hash_hex: str) -> bool:
+    row = conn.execute(
+        "SELECT storage, stored_size, tier, pack_id, pack_offset FROM objects WHERE hash = ?", (hash_hex,)
+    ).fetchone()
+    if row is None:
+        return True
+    storage, stored_size, tier, pack_id, pack_offset = row
+    if storage not in ROW_BACKED_STORAGE:
+        return _size(store._object_path(hash_hex, tier)) == stored_size
+    if storage == "packed":
+        return _size(store._pack_path(pack_id)) >= pack_offset + stored_size
+    chunks = conn.execute(
+        """
+        SELECT DISTINCT c.hash, c.stored_size FROM object_chunks oc JOIN chunks c ON c.hash = oc.chunk_hash
+        WHERE oc.object_hash = ?
+        """,
+        (hash_hex,),
+    ).fetchall()
+    return all(_size(store._chunk_path(chunk_hash)) == size for chunk_hash, size in chunks)
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return -1
+
+
+def _drop_damaged(store: "Store", since: int) -> tuple[int, list[str]]:
+    """Check objects created at or after ``since``; remove the damaged ones."""
+    conn = store._conn()
+    checked = 0
+    damaged: list[str] = []
+    key: tuple[int, str] = (since, "")
+    while True:
+        with conn:
+            rows = conn.execute(
+                """
+                SELECT created_at, hash FROM objects WHERE (created_at, hash) > (?, ?)
+                ORDER BY created_at, hash LIMIT ?
+                """,
+                (*key, BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                break
+            key = rows[-1]
+            checked += len(rows)
+            damaged += [h for _, h in rows if not _intact(store, conn, h)]
+    if not damaged:
+        return checked, []
+
+    def drop(conn: sqlite3.Connection) -> list[str]:
+        # Re-check under the write lock: a concurrent put may have replaced the row.
+        gone = [h for h in damaged if not _intact(store, conn, h)]
+        for hash_hex in gone:
+            store._remove(conn, hash_hex)
+        return gone
+
+    return checked, store._write(drop)
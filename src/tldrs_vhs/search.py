@@ -0,0 +1,292 @@
+"""Full-text search over stored text, and a brute-force regex scan.
+
+When indexing is on (``Store(search_index=True)``, ``TLDRS_VHS_SEARCH_INDEX=1``
+or ``put(index=True)``), ``put`` copies the first ``search_max_bytes`` of each
+text-like payload into the SQLite FTS5 table ``text_index`` as the payload
+streams through. A payload whose first block contains a NUL byte or is not
+UTF-8 is treated as binary and skipped after that one check. Rows are keyed
+by ``doc_id(hash)``, so ``delete`` and ``gc`` drop them with a rowid lookup.
+The indexed text is stored in the database, so indexing roughly doubles the
+space used by the text it covers.
+
+``search`` answers FTS5 queries from the index. ``grep`` scans the
+decompressed content of every object for a regular expression on a process
+pool, and works whether or not the index exists. ``reindex`` backfills the
+index for objects stored before it was turned on.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import sqlite3
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from .store import Store
+
+SNIFF_BYTES = 8192
+GREP_BATCH = 64
+# Longest matching line reported by grep, in characters.
+GREP_LINE_CHARS = 240
+
+
+def doc_id(hash_hex: str) -> int:
+    """FTS rowid for an object: the leading 60 bits of its hash."""
+    return int(hash_hex[:15], 16)
+
+
+def sniff_text(sample: bytes) -> bool:
+    """Whether ``sample`` (the start of a payload) looks like UTF-8 text."""
+    sample = sample[:SNIFF_BYTES]
+    if b"\0" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character cut off by the sample boundary is fine.
+        return exc.start >= len(sample) - 3 and exc.reason == "unexpected end of data"
+    return True
+
+
+class TextCapture:
+    """Keep the first ``limit`` bytes of a stream of blocks if it looks like text."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.binary = False
+        self._parts: list[bytes] = []
+        self._size = 0
+
+    def tee(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        for block in blocks:
+            if not self.binary and self._size < self.limit:
+                if not self._size and not sniff_text(block):
+                    self.binary = True
+                else:
+                    take = block[: self.limit - self._size]
+                    self._parts.append(take)
+                    self._size += len(take)
+            yield block
+
+    def text(self) -> Optional[str]:
+        if self.binary or not self._size:
+            return None
+        return b"".join(self._parts).decode("utf-8", errors="replace")
+
+
+def has_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'text_index'").fetchone() is not None
+
+
+def search(store: "Store", query: str, limit: int = 20) -> list[dict]:
+    """Run an FTS5 ``query`` against the index, best matches first.
+
+    Returns ``{"ref", "snippet", "score"}`` dicts; matched terms in the
+    snippet are wrapped in ``[`` and ``]``. Raises ``ValueError`` for a
+    malformed query or when SQLite has no FTS5.
+    """
+    from .store import SCHEME
+
+    if not store.search_available:
+        raise ValueError("Full-text search needs SQLite with FTS5")
+    with store.metrics.op("search"), store._conn() as conn:
+        try:
+            rows = conn.execute(
+                """
+                SELECT hash, snippet(text_index, 1, '[', ']', '...', 16), bm25(text_index)
+                FROM text_index WHERE text_index MATCH ? ORDER BY rank LIMIT ?
+                """,
+                (query, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as exc:
+            raise ValueError(f"Bad search query: {exc}") from None
+    return [{"ref": f"{SCHEME}{h}", "snippet": snippet, "score": round(-score, 3)} for h, snippet, score in rows]
+
+
+_worker_store: Optional["Store"] = None
+
+
+def _init_worker(root: str) -> None:
+    global _worker_store
+    from pathlib import Path
+
+    from .store import Store
+
+    # Read-only: a grep worker must never recover, migrate or write.
+    _worker_store = Store(root=Path(root), read_only=True, layers=(), metrics=False)
+
+
+def _grep_lines(blocks: Iterable[bytes], regex: re.Pattern[bytes], max_hits: int) -> Iterator[tuple[int, bytes]]:
+    """Yield ``(line number, line)`` for matches, reading ``blocks`` line by line.
+
+    Only whole lines are held in memory. Nothing is yielded when the first
+    block does not look like text.
+    """
+    line = 1
+    tail = b""
+    found = 0
+    sniffed = False
+    for block in itertools.chain(blocks, [None]):
+        if block is None:
+            data, tail = tail, b""
+        else:
+            if not sniffed:
+                if not sniff_text(block):
+                    return
+                sniffed = True
+            data = tail + block
+            cut = data.rfind(b"\n") + 1
+            data, tail = data[:cut], data[cut:]
+        counted = 0
+        for match in regex.finditer(data):
+            start = data.rfind(b"\n", 0, match.start()) + 1
+            end = data.find(b"\n", match.end())
+            line += data.count(b"\n", counted, start)
+            counted = start
+            yield line, data[start:] if end < 0 else data[start:end]
+            found += 1
+            if found >= max_hits:
+                return
+        line += data.count(b"\n", counted)
+
+
+def _grep_batch(
+    store: "Store", hashes: list[str], pattern: str, ignore_case: bool, max_per_object: int
+) -> list[dict]:
+    from .store import SCHEME
+
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    regex = re.compile(pattern.encode(), flags)
+    hits: list[dict] = []
+    for hash_hex in hashes:
+        loc = store._lookup(hash_hex)
+        if loc is None:
+            continue
+        pieces = store._iter_range(loc, 0, None)
+        try:
+            found = list(_grep_lines(pieces, regex, max_per_object))
+        except FileNotFoundError:
+            continue
+        finally:
+            pieces.close()
+        hits.extend(
+            {
+                "ref": f"{SCHEME}{hash_hex}",
+                "line": line,
+                "text": text.decode("utf-8", errors="replace")[:GREP_LINE_CHARS],
+            }
+            for line, text in found
+        )
+    return hits
+
+
+def _grep_worker(hashes: list[str], pattern: str, ignore_case: bool, max_per_object: int) -> list[dict]:
+    assert _worker_store is not None
+    return _grep_batch(_worker_store, hashes, pattern, ignore_case, max_per_object)
+
+
+def grep(
+    store: "Store",
+    pattern: str,
+    *,
+    ignore_case: bool = False,
+    fixed: bool = False,
+    limit: Optional[int] = None,
+    max_per_object: int = 3,
+    workers: Optional[int] = None,
+) -> list[dict]:
+    """Scan every text object for ``pattern``, most recently used first.
+
+    Returns ``{"ref", "line", "text"}`` dicts, at most ``max_per_object`` per
+    object and ``limit`` in total. Objects are decompressed and matched in
+    batches on ``workers`` processes (default: CPU count; ``1`` scans in
+    this process). ``fixed`` matches ``pattern`` literally. Access times are
+    not updated.
+    """
+    if fixed:
+        pattern = re.escape(pattern)
+    try:
+        re.compile(pattern.encode())
+    except re.error as exc:
+        raise ValueError(f"Bad pattern: {exc}") from None
+    with store.metrics.op("grep"):
+        store.flush()
+        with store._conn() as conn:
+            hashes = [row[0] for row in conn.execute("SELECT hash FROM objects ORDER BY last_accessed DESC, hash")]
+        batches = [hashes[i:i + GREP_BATCH] for i in range(0, len(hashes), GREP_BATCH)]
+        workers = min(workers or os.cpu_count() or 1, len(batches))
+        hits: list[dict] = []
+        if workers <= 1:
+            for batch in batches:
+                hits.extend(_grep_batch(store, batch, pattern, ignore_case, max_per_object))
+                if limit is not None and len(hits) >= limit:
+                    break
+            return hits[:limit]
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(store.root),))
+        try:
+            scan = partial(_grep_worker, pattern=pattern, ignore_case=ignore_case, max_per_object=max_per_object)
+            results = pool.map(scan, batches)
+            for batch_hits in results:
+                hits.extend(batch_hits)
+                if limit is not None and len(hits) >= limit:
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return hits[:limit]
+
+
+def reindex(store: "Store", batch_size: int = 200) -> dict:
+    """Index text objects that are not in the index yet.
+
+    Returns counts of objects ``indexed`` and ``skipped`` (binary, or
+    already indexed).
+    """
+    if not store.search_available:
+        raise ValueError("Full-text search needs SQLite with FTS5")
+    result = {"indexed": 0, "skipped": 0}
+    with store.metrics.op("reindex"):
+        with store._conn() as conn:
+            hashes = [row[0] for row in conn.execute("SELECT hash FROM objects")]
+        pending: list[tuple[str, str]] = []
+
+        def index_pending(conn: sqlite3.Connection) -> None:
+            for hash_hex, text in pending:
+                store._index_text(conn, hash_hex, text)
+
+        def commit() -> None:
+            store._write(index_pending)
+            result["indexed"] += len(pending)
+            pending.clear()
+
+        for hash_hex in hashes:
+            with store._conn() as conn:
+                if conn.execute("SELECT 1 FROM text_index WHERE rowid = ?", (doc_id(hash_hex),)).fetchone():
+                    result["skipped"] += 1
+                    continue
+            loc = store._lookup(hash_hex)
+            if loc is None:
+                result["skipped"] += 1
+                continue
+            capture = TextCapture(store.search_max_bytes)
+            try:
+                for _ in capture.tee(store._iter_range(loc, 0, store.search_max_bytes)):
+                    if capture.binary:
+                        break
+            except FileNotFoundError:
+                result["skipped"] += 1
+                continue
+            text = capture.text()
+            if text is None:
+                result["skipped"] += 1
+                continue
+            pending.append((hash_hex, text))
+            if len(pending) >= batch_size:
+                commit()
+        if pending:
+            commit()
+    return result
@@ -0,0 +1,239 @@
+"""Resident store daemon over a Unix domain socket, plus a thin client.
+
+Wire protocol: every frame is a 4-byte big-endian length followed by that
+many bytes. A request is a single JSON frame such as
+``{"op": "has", "ref": "vhs://..."}``. The reply starts with a JSON header
+frame (``{"ok": true, ...}`` or ``{"ok": false, "error": "..."}``). For
+``get`` a successful header is followed by raw data frames and a zero-length
+terminator frame. A connection may carry any number of requests.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+SOCKET_NAME = "vhs.sock"
+_LEN = struct.Struct(">I")
+
+
+class DaemonError(Exception):
+    """The daemon answered a request with an error."""
+
+
+def socket_path(root: Path) -> Path:
+    return root / SOCKET_NAME
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    return _recv_exact(sock, n) if n else b""
+
+
+def _send_json(sock: socket.socket, obj: dict) -> None:
+    _send_frame(sock, json.dumps(obj).encode())
+
+
+class _FrameWriter:
+    """File-like sink that sends the OK header lazily, then data frames."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.started = False
+
+    def start(self) -> None:
+        if not self.started:
+            _send_json(self.sock, {"ok": True})
+            self.started = True
+
+    def write(self, data: bytes) -> int:
+        self.start()
+        if data:
+            _send_frame(self.sock, bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "StoreServer"
+
+    def handle(self) -> None:
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, ValueError):
+                return
+            try:
+                self._dispatch(request)
+            except ConnectionError:
+                return
+            except Exception as exc:
+                # No header went out: a streamed reply that fails after its
+                # header raises ConnectionError instead, and the client sees
+                # the connection drop.
+                try:
+                    _send_json(self.request, {"ok": False, "error": str(exc) or type(exc).__name__})
+                except OSError:
+                    return
+
+    def finish(self) -> None:
+        # Each client gets its own thread, and with it a SQLite connection.
+        self.server.store.release_thread_conn()
+
+    def _dispatch(self, request: dict) -> None:
+        store = self.server.store
+        op = request.get("op")
+        ref = request.get("ref", "")
+        if op == "ping":
+            _send_json(self.request, {"ok": True})
+        elif op == "has":
+            _send_json(self.request, {"ok": True, "present": store.has(ref)})
+        elif op == "info":
+            info = store.info(ref)
+            _send_json(self.request, {"ok": True, "info": info.json_dict() if info else None})
+        elif op == "stats":
+            _send_json(self.request, {"ok": True, "stats": store.stats()})
+        elif op == "get":
+            writer = _FrameWriter(self.request)
+            try:
+                store.copy_to(ref, writer)  # type: ignore[arg-type]
+            except Exception as exc:
+                if writer.started:
+                    raise ConnectionError(str(exc)) from exc
+                raise
+            writer.start()
+            _send_frame(self.request, b"")
+        else:
+            _send_json(self.request, {"ok": False, "error": f"unknown op: {op}"})
+
+
+class StoreServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, store) -> None:
+        self.store = store
+        super().__init__(str(path), _Handler)
+
+    def server_bind(self) -> None:
+        # Create the socket owner-only, rather than chmod it after bind and
+        # leave a window in which other users can connect.
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+
+def _tier_loop(store, every_s: float, stop: "threading.Event", **options: Any) -> None:
+    from .tiering import run
+
+    while not stop.wait(every_s):
+        try:
+            run(store, **options)
+        except Exception as exc:  # keep serving; the next pass retries
+            print(f"tldrs-vhs serve: tiering failed: {exc}", file=sys.stderr)
+
+
+def serve(store, path: Optional[Path] = None, tier_every_s: Optional[float] = None, **tier_options: Any) -> None:
+    """Serve ``store`` on a Unix socket until interrupted.
+
+    With ``tier_every_s`` a background thread runs ``tiering.run`` with
+    ``tier_options`` at that interval.
+    """
+    path = path or socket_path(store.root)
+    if path.exists():
+        client = Client.connect(path)
+        if client is not None:
+            client.close()
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        path.unlink()
+    server = StoreServer(path, store)
+    stop = threading.Event()
+    if tier_every_s:
+        threading.Thread(target=_tier_loop, args=(store, tier_every_s, stop), kwargs=tier_options, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        if path.exists():
+            path.unlink()
+
+
+class Client:
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+
+    @classmethod
+    def connect(cls, path: Path, timeout: float = 0.5) -> Optional["Client"]:
+        """Connect to a running daemon, or return None when none is listening."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            sock.close()
+            return None
+        sock.settimeout(None)
+        return cls(sock)
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def _call(self, request: dict) -> dict:
+        _send_json(self.sock, request)
+        reply = json.loads(_recv_frame(self.sock))
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error", "daemon error"))
+        return reply
+
+    def ping(self) -> bool:
+        return bool(self._call({"op": "ping"}).get("ok"))
+
+    def has(self, ref: str) -> bool:
+        return bool(self._call({"op": "has", "ref": ref})["present"])
+
+    def info(self, ref: str) -> Optional[dict]:
+        return self._call({"op": "info", "ref": ref})["info"]
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})["stats"]
+
+    def get(self, ref: str, dst: BinaryIO) -> None:
+        self.start_get(ref)
+        self.stream_to(dst)
+
+    def start_get(self, ref: str) -> None:
+        """Request a blob; raises DaemonError if the daemon cannot serve it."""
+        self._call({"op": "get", "ref": ref})
+
+    def stream_to(self, dst: BinaryIO) -> None:
+        """Copy the data frames following a successful ``start_get``."""
+        while True:
+            data = _recv_frame(self.sock)
+            if not data:
+                return
+            dst.write(data)
@@ -1,19 +1,67 @@
 from __future__ import annotations
 
-import hashlib
+import functools
+import itertools
 import os
-import shutil
-import zlib
 import sqlite3
 import sys
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import BinaryIO, Optional
+from typing import TYPE_CHECKING, BinaryIO, Callable, Generator, Iterable, Iterator, Optional, Sequence, TypeVar, Union
+
+if TYPE_CHECKING:
+    import hashlib
+
+    from .cache import BlobCache
+    from .codec import Compressor, Decompressor
+    from .metrics import Metrics
 
 
 DEFAULT_HOME = Path.home() / ".tldrs-vhs"
 SCHEME = "vhs://"
+JOURNAL_MODES = ("wal", "delete")
+ACCESS_TRACKING_MODES = ("buffered", "sync")
+DURABILITY_MODES = ("fast", "batched", "strict")
+PUT_FILE_MODES = ("copy", "link", "move")
+WRITE_RETRIES = 5
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CODEC = "zlib"
+PACK_TARGET_BYTES = 64 * 1024 * 1024
+GC_BATCH_SIZE = 500
+LIST_PAGE_SIZE = 500
+# Most puts one group commit records in a transaction (``durability="batched"``).
+GROUP_COMMIT_MAX = 1000
+# Written by tldrs_vhs.recovery: the boot it last ran in.
+RECOVERY_MARKER = "recovery.state"
+# Temp files younger than this may belong to a put still in flight.
+TEMP_GRACE_S = 60
+# Storage layouts whose presence is recorded by the row, not a loose blob file.
+ROW_BACKED_STORAGE = ("chunked", "packed")
+# objects.tier: where a loose blob lives (see tldrs_vhs.tiering).
+TIER_HOT = 0
+TIER_COLD = 1
+
+T = TypeVar("T")
+F = TypeVar("F", bound=Callable)
+
+# hashlib, zlib and shutil are imported where they are used so a
+# cold `tldrs-vhs has` does not pay for them (see test_startup.py).
+
+
+def _instrumented(name: str) -> Callable[[F], F]:
+    """Record calls to a Store method as operation ``name`` in ``Store.metrics``."""
+
+    def wrap(fn: F) -> F:
+        @functools.wraps(fn)
+        def inner(self: "Store", *args: object, **kwargs: object) -> object:
+            with self.metrics.op(name):
+                return fn(self, *args, **kwargs)
+
+        return inner  # type: ignore[return-value]
+
+    return wrap
 
 
 @dataclass
@@ -22,289 +70,2495 @@ class ObjectInfo:
     size: int
     stored_size: int
     compression: str
-    created_at: str
-    last_accessed: str
+    created_at: int
+    last_accessed: int
+    storage: str = ""
+    tier: int = TIER_HOT
+    # Line count, for objects with a line index.
+    lines: Optional[int] = None
+
+    @property
+    def cursor(self) -> str:
+        """Position of this object in ``Store.list`` order, for ``after=``."""
+        return f"{self.last_accessed}:{self.hash}"
+
+    def json_dict(self) -> dict:
+        """Fields for JSON output, with timestamps as ISO 8601 UTC strings."""
+        from datetime import datetime, timezone
+
+        return {
+            **self.__dict__,
+            "created_at": datetime.fromtimestamp(self.created_at, timezone.utc).isoformat(),
+            "last_accessed": datetime.fromtimestamp(self.last_accessed, timezone.utc).isoformat(),
+        }
+
+
+@dataclass
+class _Chunk:
+    hash: str
+    size: int
+    stored_size: int
+    compression: str
+    temp: Optional[Path]
+
+
+@dataclass
+class _Ingested:
+    """A payload that has been hashed and staged but not yet recorded."""
+
+    hash: str
+    size: int
+    stored_size: int
+    compression: str
+    temp: Optional[Path]
+    storage: str = ""
+    chunks: list[_Chunk] = field(default_factory=list)
+    # Small payloads bound for a pack are staged in memory instead of ``temp``.
+    data: Optional[bytes] = None
+    # False when the object was already stored and nothing was staged.
+    staged: bool = True
+    # Leading text to add to the search index, if any.
+    text: Optional[str] = None
+    # ``(lines, stride, packed_counts)`` for the line index, if any.
+    lines: Optional[tuple[int, int, bytes]] = None
+    # True once the staged files have been fsynced.
+    synced: bool = False
+
+    def discard(self) -> None:
+        self.data = None
+        if self.temp is not None:
+            self.temp.unlink(missing_ok=True)
+            self.temp = None
+        for chunk in self.chunks:
+            if chunk.temp is not None:
+                chunk.temp.unlink(missing_ok=True)
+                chunk.temp = None
+
+
+@dataclass
+class _Location:
+    """Where and how an object's bytes are stored."""
+
+    hash: str
+    storage: str
+    compression: str
+    path: Path
+    offset: int = 0
+    length: int = 0
+    # Uncompressed size, when known.
+    size: int = -1
+    # The lower layer that holds the object, or None for this store.
+    layer: Optional["Store"] = None
+
+
+class _BlockReader:
+    """``read`` over an iterator of byte blocks, one block per call."""
+
+    def __init__(self, blocks: Iterable[bytes]) -> None:
+        self._blocks = (block for block in blocks if block)
+
+    def read(self, n: int = -1) -> bytes:
+        return next(self._blocks, b"")
+
+
+@dataclass(frozen=True)
+class _PutOptions:
+    compress: bool = False
+    compress_min_bytes: Optional[int] = None
+    codec: Optional[str] = None
+    level: Optional[int] = None
+    dict_id: Optional[str] = None
+    chunked: bool = False
+    seekable: bool = False
+    frame_size: Optional[int] = None
+    # None defers to ``Store.search_index``.
+    index: Optional[bool] = None
+    # None defers to ``Store.line_index``.
+    line_index: Optional[bool] = None
+
+    @property
+    def codec_name(self) -> str:
+        return self.codec or DEFAULT_CODEC
+
+    @property
+    def always_compress(self) -> bool:
+        # Naming a codec without a threshold asks for compression.
+        return self.compress or (self.codec is not None and self.compress_min_bytes is None)
+
+
+class _GroupCommit:
+    """Record the puts of concurrent threads in shared transactions.
+
+    The first thread to queue becomes the leader: it waits ``window_s`` for
+    others to join, then records the whole queue (up to
+    ``GROUP_COMMIT_MAX`` puts) in one transaction while later arrivals queue
+    for the next one. If the transaction fails, every put in it fails.
+    """
+
+    def __init__(self, store: "Store", window_s: float) -> None:
+        self.store = store
+        self.window_s = window_s
+        self._cond = threading.Condition()
+        self._queue: list[_GroupMember] = []
+        self._leading = False
+
+    def commit(self, items: list[_Ingested]) -> None:
+        me = _GroupMember(items)
+        with self._cond:
+            self._queue.append(me)
+        while True:
+            with self._cond:
+                while self._leading and not me.done:
+                    self._cond.wait()
+                if me.done:
+                    break
+                self._leading = True
+            try:
+                if self.window_s > 0:
+                    time.sleep(self.window_s)
+                with self._cond:
+                    batch = self._queue[:GROUP_COMMIT_MAX]
+                    del self._queue[:GROUP_COMMIT_MAX]
+                self._run(batch)
+            finally:
+                with self._cond:
+                    self._leading = False
+                    self._cond.notify_all()
+        if me.error is not None:
+            raise me.error
+
+    def _run(self, batch: list[_GroupMember]) -> None:
+        items = [item for member in batch for item in member.items]
+        try:
+            self.store._write(lambda conn: self.store._record(conn, items))
+        except BaseException as exc:
+            for member in batch:
+                member.error = exc
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            for member in batch:
+                member.done = True
+        if batch[0].error is None:
+            self.store.metrics.add("put.group_commits")
+
+
+@dataclass
+class _GroupMember:
+    items: list[_Ingested]
+    done: bool = False
+    error: Optional[BaseException] = None
 
 
 class Store:
-    def __init__(self, root: Optional[Path] = None) -> None:
-        self.root = (root or Path(os.environ.get("TLDRS_VHS_HOME", DEFAULT_HOME))).expanduser().resolve()
+    """Content-addressed blob store with SQLite metadata.
+
+    Each thread reuses a single SQLite connection for the lifetime of the
+    store (reopened after ``fork``). In the default ``"wal"`` journal mode
+    readers never block writers; writers start ``BEGIN IMMEDIATE``
+    transactions, wait up to ``busy_timeout_ms`` for the lock and retry a few
+    times beyond that with backoff.
+
+    Any number of processes may ``put`` the same or different content into
+    one root concurrently: blobs are written to unique temp files, and inside
+    the write transaction ``_record`` checks for an existing row. If the row
+    exists and its data is present, the new copy is discarded. Otherwise the
+    temp file is renamed into place and the row written with ``INSERT OR
+    REPLACE`` (replacing a row whose blob had gone missing). Every caller gets
+    the same ref and each hash is stored exactly once.
+
+    Reads (``has``/``info``/``get``) do not write ``last_accessed`` directly.
+    In ``"buffered"`` access tracking, touches are collected in memory and
+    flushed in one transaction when ``touch_flush_size`` hashes are pending,
+    when the oldest pending touch is ``touch_flush_interval_s`` old, before
+    ``list``/``gc``, and on ``close``. In ``"sync"`` mode each read flushes
+    immediately. Either way a row is only rewritten when its stored value is
+    older than ``touch_granularity_s``, so repeated reads cost no writes.
+
+    When ``pack_max_bytes`` (or ``TLDRS_VHS_PACK_MAX_BYTES``) is set, plain
+    blobs whose stored size is at most that many bytes are appended to shared
+    append-only pack files under ``packs/`` instead of getting their own file.
+
+    When ``cache_max_bytes`` (or ``TLDRS_VHS_CACHE_BYTES``) is set, the
+    decompressed content of objects up to ``cache_max_item_bytes`` is kept in
+    an in-process LRU, and ``has`` misses are remembered for
+    ``negative_cache_ttl_s``. The cache only sees this process's deletes.
+
+    Loose blobs not read for a while can be moved to a cold tier under
+    ``<root>/cold`` by ``tldrs_vhs.tiering``; ``cold_root`` (or
+    ``TLDRS_VHS_COLD_ROOT``) makes that a symlink to another disk.
+
+    ``layers`` (or ``TLDRS_VHS_PATH``, separated like ``PATH``) lists lower
+    store roots, searched in order and opened read-only. ``has``, ``info``
+    and reads fall through to them on a miss, and ``put`` records nothing
+    when a lower layer already holds the hash. With ``promote_reads`` (or
+    ``TLDRS_VHS_PROMOTE=1``) an object read from a lower layer is copied
+    into this store first. ``read_only`` opens a store without creating,
+    migrating or writing anything; that is how layers are opened.
+
+    With ``line_index`` (or ``TLDRS_VHS_LINE_INDEX=1``) ``put`` records a
+    sparse line index for text payloads, so ``read_lines`` can jump to a line
+    range (see ``tldrs_vhs.lines``).
+
+    With ``search_index`` (or ``TLDRS_VHS_SEARCH_INDEX=1``) the first
+    ``search_max_bytes`` of text payloads are added to a full-text index on
+    ``put`` (see ``tldrs_vhs.search``).
+
+    ``durability`` (or ``TLDRS_VHS_DURABILITY``) trades ingest speed for
+    crash safety. ``"fast"`` (the default) never fsyncs and lets SQLite skip
+    the sync on commit in WAL mode: a process crash loses nothing, but after
+    a power loss the last puts may be gone. ``"strict"`` fsyncs each staged
+    file and the directories it is renamed into before the row is committed,
+    and commits with ``synchronous = FULL``. ``"batched"`` gives the same
+    guarantee, but the puts of threads that arrive within
+    ``group_commit_window_ms`` of each other share one transaction and one
+    sync of each directory. On open, ``tldrs_vhs.recovery`` removes temp files
+    left by dead processes, and after a reboot it drops rows whose data did
+    not survive.
+
+    Operation counts and per-phase latencies are recorded in ``metrics`` and
+    persisted under the root on ``close`` if the store wrote anything (see
+    ``tldrs_vhs.metrics``); pass ``metrics=False`` or set
+    ``TLDRS_VHS_METRICS=0`` to turn that off.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        *,
+        journal_mode: str = "wal",
+        busy_timeout_ms: int = 5000,
+        access_tracking: str = "buffered",
+        touch_granularity_s: float = 60.0,
+        touch_flush_size: int = 1000,
+        touch_flush_interval_s: float = 30.0,
+        pack_max_bytes: Optional[int] = None,
+        cache_max_bytes: Optional[int] = None,
+        cache_max_item_bytes: int = 1024 * 1024,
+        negative_cache_size: int = 10_000,
+        negative_cache_ttl_s: float = 10.0,
+        metrics: Optional[bool] = None,
+        search_index: Optional[bool] = None,
+        search_max_bytes: int = 1024 * 1024,
+        line_index: Optional[bool] = None,
+        line_index_stride: int = 64 * 1024,
+        cold_root: Optional[Path] = None,
+        layers: Optional[Sequence[Path]] = None,
+        promote_reads: Optional[bool] = None,
+        read_only: bool = False,
+        durability: Optional[str] = None,
+        group_commit_window_ms: float = 2.0,
+    ) -> None:
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"journal_mode must be one of {JOURNAL_MODES}")
+        if access_tracking not in ACCESS_TRACKING_MODES:
+            raise ValueError(f"access_tracking must be one of {ACCESS_TRACKING_MODES}")
+        if durability is None:
+            durability = os.environ.get("TLDRS_VHS_DURABILITY") or "fast"
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.durability = durability
+        self._group = _GroupCommit(self, group_commit_window_ms / 1000)
+        self.root = resolve_root(root)
         self.blob_root = self.root / "blobs"
         self.db_path = self.root / "meta.sqlite"
+        self.dict_root = self.root / "dicts"
+        self.chunk_root = self.root / "chunks"
+        self.pack_root = self.root / "packs"
+        self.cold_root = self.root / "cold"
+        self.cold_blob_root = self.cold_root / "blobs"
+        if pack_max_bytes is None and os.environ.get("TLDRS_VHS_PACK_MAX_BYTES"):
+            pack_max_bytes = int(os.environ["TLDRS_VHS_PACK_MAX_BYTES"])
+        self.pack_max_bytes = pack_max_bytes
+        if cache_max_bytes is None and os.environ.get("TLDRS_VHS_CACHE_BYTES"):
+            cache_max_bytes = int(os.environ["TLDRS_VHS_CACHE_BYTES"])
+        self._cache: Optional[BlobCache] = None
+        if cache_max_bytes:
+            from .cache import BlobCache
+
+            self._cache = BlobCache(cache_max_bytes, cache_max_item_bytes, negative_cache_size, negative_cache_ttl_s)
+        if metrics is None:
+            metrics = os.environ.get("TLDRS_VHS_METRICS", "1") != "0"
+        from .metrics import Metrics
+
+        self.metrics: Metrics = Metrics(self.root / "metrics.json", enabled=metrics)
+        # Set by the first committed write; ``close`` persists metrics only then.
+        self._wrote = False
+        if search_index is None:
+            search_index = os.environ.get("TLDRS_VHS_SEARCH_INDEX", "0") not in ("", "0")
+        self.search_index = search_index
+        self.search_max_bytes = search_max_bytes
+        if line_index is None:
+            line_index = os.environ.get("TLDRS_VHS_LINE_INDEX", "0") not in ("", "0")
+        self.line_index = line_index
+        self.line_index_stride = line_index_stride
+        self._search_available: Optional[bool] = None
+        self._dicts: dict[str, bytes] = {}
+        self.journal_mode = journal_mode
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._pid = os.getpid()
+        self.access_tracking = access_tracking
+        self.touch_granularity_s = touch_granularity_s
+        self.touch_flush_size = touch_flush_size
+        self.touch_flush_interval_s = touch_flush_interval_s
+        self._pending_touches: dict[str, int] = {}
+        self._pending_since = 0.0
+        self._touch_lock = threading.Lock()
+        # Runs when a read makes buffered touches due. AsyncStore replaces it
+        # so the flush happens on its writer thread.
+        self._flush_touches: Callable[[], None] = self.flush
+        if layers is None:
+            layers = [Path(p) for p in os.environ.get("TLDRS_VHS_PATH", "").split(os.pathsep) if p]
+        self.layer_roots = [resolve_root(Path(p)) for p in layers if resolve_root(Path(p)) != self.root]
+        self._layers: Optional[list[Store]] = None
+        if promote_reads is None:
+            promote_reads = os.environ.get("TLDRS_VHS_PROMOTE", "0") not in ("", "0")
+        self.promote_reads = promote_reads
+        self.read_only = read_only
+        if read_only:
+            if not self.db_path.exists():
+                raise FileNotFoundError(f"No store at {self.root}")
+            try:
+                self._init_db()
+            except BaseException:
+                self.release_thread_conn()
+                raise
+            return
         self.root.mkdir(parents=True, exist_ok=True)
         self.blob_root.mkdir(parents=True, exist_ok=True)
+        if cold_root is None and os.environ.get("TLDRS_VHS_COLD_ROOT"):
+            cold_root = Path(os.environ["TLDRS_VHS_COLD_ROOT"])
+        if cold_root is not None:
+            self._link_cold_root(Path(cold_root).expanduser().resolve())
         self._init_db()
+        self._recover_if_needed()
+
+    def _link_cold_root(self, target: Path) -> None:
+        """Point ``<root>/cold`` at ``target`` so every reader finds cold blobs there."""
+        if self.cold_root.is_symlink() or self.cold_root.exists():
+            if self.cold_root.resolve() != target:
+                raise ValueError(f"{self.cold_root} already points at {self.cold_root.resolve()}, not {target}")
+            return
+        target.mkdir(parents=True, exist_ok=True)
+        try:
+            self.cold_root.symlink_to(target, target_is_directory=True)
+        except FileExistsError:
+            # Another process linked it first.
+            if self.cold_root.resolve() != target:
+                raise ValueError(f"{self.cold_root} already points at {self.cold_root.resolve()}, not {target}") from None
+
+    def _recover_if_needed(self) -> None:
+        """Run ``tldrs_vhs.recovery`` on the first open after a reboot, or for stale temp files.
+
+        A temp file is stale once it is ``TEMP_GRACE_S`` old; younger ones
+        are usually puts in flight in other processes. Both checks are a
+        few small reads, so opening a store stays cheap.
+        """
+        try:
+            marker = (self.root / RECOVERY_MARKER).read_text().split()
+        except FileNotFoundError:
+            marker = []
+        boot = _boot_id()
+        rebooted = boot is not None and marker[:1] != [boot]
+        grace = time.time() - TEMP_GRACE_S
+        leftovers = False
+        try:
+            with os.scandir(self.root / "tmp") as entries:
+                for entry in entries:
+                    try:
+                        if entry.stat().st_mtime < grace:
+                            leftovers = True
+                            break
+                    except FileNotFoundError:
+                        # Renamed into place while we looked.
+                        continue
+        except FileNotFoundError:
+            pass
+        if rebooted or leftovers:
+            from .recovery import recover
+
+            recover(self)
 
     def _init_db(self) -> None:
-        with self._conn() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS objects (
-                    hash TEXT PRIMARY KEY,
-                    size INTEGER NOT NULL,
-                    stored_size INTEGER NOT NULL DEFAULT 0,
-                    compression TEXT NOT NULL DEFAULT '',
-                    created_at TEXT NOT NULL,
-                    last_accessed TEXT NOT NULL
-                )
-                """
+        conn = self._conn()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        if self.read_only:
+            raise ValueError(f"{self.root} uses an older schema; open it read-write once to upgrade it")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock.
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, migrate in enumerate(MIGRATIONS, start=1):
+                if version < target:
+                    migrate(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Connections must not cross fork(); start over in the child.
+            self._local = threading.local()
+            self._conns = []
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"{self.db_path.as_uri()}?mode=ro" if self.read_only else self.db_path,
+                timeout=self.busy_timeout_ms / 1000,
+                isolation_level="IMMEDIATE",
+                check_same_thread=False,
+                cached_statements=256,
+                uri=self.read_only,
             )
-            self._ensure_columns(conn)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            # INSERT OR REPLACE must fire the delete triggers that keep totals.
+            conn.execute("PRAGMA recursive_triggers = ON")
+            if not self.read_only:
+                conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+                # In WAL mode NORMAL only syncs at checkpoints; a power loss can
+                # undo the last commits but never corrupts the database.
+                fast = self.durability == "fast" and self.journal_mode == "wal"
+                conn.execute(f"PRAGMA synchronous = {'NORMAL' if fast else 'FULL'}")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
 
-    def _ensure_columns(self, conn: sqlite3.Connection) -> None:
-        cols = {row[1] for row in conn.execute("PRAGMA table_info(objects)")}
-        if "stored_size" not in cols:
-            conn.execute("ALTER TABLE objects ADD COLUMN stored_size INTEGER NOT NULL DEFAULT 0")
-        if "compression" not in cols:
-            conn.execute("ALTER TABLE objects ADD COLUMN compression TEXT NOT NULL DEFAULT ''")
-        # Backfill stored_size if missing or zero
-        conn.execute("UPDATE objects SET stored_size = size WHERE stored_size = 0")
+    def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` in a write transaction, retrying if the database stays locked."""
+        if self.read_only:
+            raise ValueError(f"{self.root} is open read-only")
+        delay = 0.05
+        conn = self._conn()
+        with self.metrics.phase("lock"):
+            for attempt in range(WRITE_RETRIES):
+                try:
+                    # Take the write lock up front so reads inside fn are consistent
+                    # with the writes that follow.
+                    conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as exc:
+                    if "locked" not in str(exc) and "busy" not in str(exc):
+                        raise
+                    if attempt == WRITE_RETRIES - 1:
+                        raise
+                    self.metrics.add("sqlite.busy_retries")
+                    time.sleep(delay)
+                    delay *= 2
+        with self.metrics.phase("metadata"):
+            try:
+                result = fn(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        self._wrote = True
+        return result
 
-    def _conn(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+    def release_thread_conn(self) -> None:
+        """Close the calling thread's SQLite connection (and its layers').
+
+        For short-lived threads, such as the daemon's per-client handlers,
+        whose connections would otherwise stay open until ``close``.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._conns_lock:
+                self._conns = [c for c in self._conns if c is not conn]
+            conn.close()
+        for layer in self._layers or []:
+            layer.release_thread_conn()
 
-    def _now(self) -> str:
-        return datetime.now(timezone.utc).isoformat()
+    def close(self) -> None:
+        self.flush()
+        for layer in self._layers or []:
+            layer.close()
+        self._layers = None
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+        # Persisting locks and rewrites metrics.json, which would dominate a
+        # read-only CLI call such as a cold ``has``; their counts are dropped.
+        if self._wrote:
+            self.metrics.persist()
+
+    def __enter__(self) -> "Store":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _now(self) -> int:
+        return int(time.time())
 
     def _blob_path(self, hash_hex: str) -> Path:
         return self.blob_root / hash_hex[:2] / hash_hex[2:4] / hash_hex
 
+    def _object_path(self, hash_hex: str, tier: int) -> Path:
+        """Path of a loose blob in ``tier``."""
+        root = self.cold_blob_root if tier == TIER_COLD else self.blob_root
+        return root / hash_hex[:2] / hash_hex[2:4] / hash_hex
+
+    def _chunk_path(self, hash_hex: str) -> Path:
+        return self.chunk_root / hash_hex[:2] / hash_hex[2:4] / hash_hex
+
+    def _pack_path(self, pack_id: int) -> Path:
+        return self.pack_root / f"pack-{pack_id:06d}.pack"
+
+    def _lower(self) -> list["Store"]:
+        """The lower layers, opened on first use.
+
+        Roots without a store are skipped, as are stores that cannot be
+        opened read-only (an older schema, or a damaged database).
+        """
+        if self._layers is None:
+            layers = []
+            for root in self.layer_roots:
+                try:
+                    layers.append(Store(root, read_only=True, layers=(), metrics=False, busy_timeout_ms=self.busy_timeout_ms))
+                except FileNotFoundError:
+                    continue
+                except (ValueError, sqlite3.Error) as exc:
+                    self.metrics.add("layers.skipped")
+                    print(f"tldrs-vhs: skipping layer {root}: {exc}", file=sys.stderr)
+            self._layers = layers
+        return self._layers
+
+    def _in_lower(self, hash_hex: str) -> Optional["Store"]:
+        """The first lower layer holding ``hash_hex``."""
+        for layer in self._lower():
+            if layer._present(hash_hex):
+                return layer
+        return None
+
+    @property
+    def search_available(self) -> bool:
+        """Whether the full-text index exists (SQLite was built with FTS5)."""
+        if self._search_available is None:
+            from .search import has_index
+
+            # No ``with conn``: this may run inside a write transaction.
+            self._search_available = has_index(self._conn())
+        return self._search_available
+
+    def _indexes(self, opts: _PutOptions) -> bool:
+        wanted = self.search_index if opts.index is None else opts.index
+        return wanted and self.search_available
+
+    def _indexes_lines(self, opts: _PutOptions) -> bool:
+        return self.line_index if opts.line_index is None else opts.line_index
+
+    @_instrumented("has")
     def has(self, ref: str) -> bool:
         hash_hex = parse_ref(ref)
-        if not hash_hex:
-            return False
-        path = self._blob_path(hash_hex)
-        if not path.exists():
+        if not hash_hex or not self._present(hash_hex):
+            self.metrics.add("has.misses")
             return False
+        self.metrics.add("has.hits")
         self._touch(hash_hex)
         return True
 
+    def _present(self, hash_hex: str) -> bool:
+        cache = self._cache
+        if cache is not None:
+            if hash_hex in cache:
+                return True
+            if cache.is_missing(hash_hex):
+                return False
+        with self.metrics.phase("disk"):
+            if self._blob_path(hash_hex).exists():
+                return True
+        with self.metrics.phase("metadata"), self._conn() as conn:
+            marks = ",".join("?" * len(ROW_BACKED_STORAGE))
+            row = conn.execute(
+                f"SELECT 1 FROM objects WHERE hash = ? AND (storage IN ({marks}) OR tier = ?)",
+                (hash_hex, *ROW_BACKED_STORAGE, TIER_COLD),
+            ).fetchone()
+        if row is None and self.layer_roots and self._in_lower(hash_hex) is not None:
+            self.metrics.add("layers.hits")
+            return True
+        if row is None and cache is not None:
+            cache.add_missing(hash_hex)
+        return row is not None
+
+    @_instrumented("info")
     def info(self, ref: str) -> Optional[ObjectInfo]:
         hash_hex = parse_ref(ref)
         if not hash_hex:
             return None
         with self._conn() as conn:
             row = conn.execute(
-                "SELECT hash, size, stored_size, compression, created_at, last_accessed FROM objects WHERE hash = ?",
+                """
+                SELECT o.hash, o.size, o.stored_size, o.compression, o.created_at, o.last_accessed, o.storage, o.tier,
+                       l.lines
+                FROM objects o LEFT JOIN line_index l ON l.hash = o.hash WHERE o.hash = ?
+                """,
                 (hash_hex,),
             ).fetchone()
         if not row:
+            for layer in self._lower():
+                info = layer.info(hash_hex)
+                if info is not None:
+                    return info
             return None
         self._touch(hash_hex)
         return ObjectInfo(*row)
 
-    def list(self, limit: int = 20) -> list[ObjectInfo]:
-        with self._conn() as conn:
-            rows = conn.execute(
-                "SELECT hash, size, stored_size, compression, created_at, last_accessed FROM objects ORDER BY last_accessed DESC LIMIT ?",
-                (limit,),
-            ).fetchall()
-        return [ObjectInfo(*row) for row in rows]
+    @_instrumented("ls")
+    def list(
+        self,
+        limit: Optional[int] = 20,
+        *,
+        after: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        compression: Optional[str] = None,
+        older_than_days: Optional[float] = None,
+        newer_than_days: Optional[float] = None,
+    ) -> list[ObjectInfo]:
+        """The ``limit`` most recently read objects (all with None); see ``iter_objects``."""
+        return list(
+            itertools.islice(
+                self.iter_objects(
+                    after=after,
+                    min_size=min_size,
+                    max_size=max_size,
+                    compression=compression,
+                    older_than_days=older_than_days,
+                    newer_than_days=newer_than_days,
+                    page_size=min(limit or LIST_PAGE_SIZE, LIST_PAGE_SIZE),
+                ),
+                limit,
+            )
+        )
+
+    def iter_objects(
+        self,
+        *,
+        after: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        compression: Optional[str] = None,
+        older_than_days: Optional[float] = None,
+        newer_than_days: Optional[float] = None,
+        page_size: int = LIST_PAGE_SIZE,
+    ) -> Iterator[ObjectInfo]:
+        """Yield objects most recently read first, one indexed page at a time.
+
+        ``after`` is the ``cursor`` of the last object already seen. Each page
+        is a keyset query on ``(last_accessed, hash)``, so page N costs the
+        same as page 1. ``compression`` matches the codec name ("" for
+        uncompressed). Ages are measured from ``created_at``. An object read
+        while the listing runs moves to the front and may be skipped.
+        """
+        where, params = [], []
+        if min_size is not None:
+            where.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("size <= ?")
+            params.append(max_size)
+        if compression is not None:
+            where.append("compression = ?")
+            params.append(compression)
+        if older_than_days is not None:
+            where.append("created_at < ?")
+            params.append(self._now() - older_than_days * 86400)
+        if newer_than_days is not None:
+            where.append("created_at >= ?")
+            params.append(self._now() - newer_than_days * 86400)
+        key = _parse_cursor(after) if after else None
+        self.flush()
+        conn = self._conn()
+        while True:
+            conds, args = list(where), list(params)
+            if key is not None:
+                conds.insert(0, "(last_accessed, hash) < (?, ?)")
+                args[:0] = key
+            with conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT hash, size, stored_size, compression, created_at, last_accessed, storage, tier
+                    FROM objects WHERE {" AND ".join(conds) or "1"}
+                    ORDER BY last_accessed DESC, hash DESC LIMIT ?
+                    """,
+                    (*args, page_size),
+                ).fetchall()
+            yield from (ObjectInfo(*row) for row in rows)
+            if len(rows) < page_size:
+                return
+            key = (rows[-1][5], rows[-1][0])
 
+    @_instrumented("stats")
     def stats(self) -> dict:
+        """Store totals, read from counters kept up to date by triggers."""
         with self._conn() as conn:
-            row = conn.execute(
-                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects"
+            (
+                count,
+                total_bytes,
+                loose_stored,
+                chunked_count,
+                chunked_bytes,
+                chunk_count,
+                chunk_bytes,
+                chunk_stored,
+            ) = conn.execute(f"SELECT {', '.join(TOTALS)} FROM totals").fetchone()
+            pack_count, pack_bytes, pack_live = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(live_bytes), 0) FROM packs"
             ).fetchone()
-        if row:
-            count, total_bytes, total_stored = row
-        else:
-            count, total_bytes, total_stored = (0, 0, 0)
-        return {
+        result = {
             "count": int(count),
             "total_bytes": int(total_bytes),
-            "total_stored_bytes": int(total_stored),
+            "total_stored_bytes": int(loose_stored + chunk_stored),
+            "chunked_objects": int(chunked_count),
+            "chunks": int(chunk_count),
+            "chunk_bytes": int(chunk_bytes),
+            "chunk_stored_bytes": int(chunk_stored),
+            # Logical bytes of chunked objects per unique chunk byte kept.
+            "dedup_ratio": round(chunked_bytes / chunk_bytes, 3) if chunk_bytes else 1.0,
+            "packs": int(pack_count),
+            "pack_bytes": int(pack_bytes),
+            "pack_live_bytes": int(pack_live),
         }
+        if self._cache is not None:
+            result["cache"] = self._cache.stats()
+        if self.layer_roots:
+            result["layers"] = [str(layer.root) for layer in self._lower()]
+        return result
+
+    @_instrumented("get")
+    def get(
+        self,
+        ref: str,
+        out: Optional[Path] = None,
+        offset: int = 0,
+        length: Optional[int] = None,
+        link: bool = False,
+    ) -> None:
+        """Write ``ref`` (or a byte range of it) to ``out`` or stdout.
+
+        Raw blobs are copied by the kernel (reflink, ``copy_file_range`` or
+        ``sendfile``). With ``link`` a raw blob is hard-linked to ``out`` and
+        made read-only; other objects, or a link across filesystems, fall
+        back to a copy.
+        """
+        ranged = offset != 0 or length is not None
+        if link and (out is None or ranged):
+            raise ValueError("link needs an output path and no offset/length")
+        if out is None:
+            if ranged:
+                self.copy_range(ref, sys.stdout.buffer, offset, length)
+            else:
+                self.copy_to(ref, sys.stdout.buffer)
+            return
+        # Resolve before creating the output so a bad ref leaves no file behind.
+        loc, data = (self._locate(ref), None) if link else self._hot(ref)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        if link and self._is_raw_file(loc) and _link_readonly(loc.path, out):
+            return
+        _unshare(out)
+        self.metrics.add("get.bytes_out", _span(len(data) if data is not None else loc.size, offset, length))
+        with out.open("wb") as dst:
+            if data is not None:
+                dst.write(data[offset:] if length is None else data[offset:offset + length])
+            elif ranged:
+                self._copy_loc_range(loc, dst, offset, length)
+            else:
+                self._copy_object(loc, dst)
+
+    @_instrumented("get")
+    def read_range(self, ref: str, offset: int, length: Optional[int] = None) -> bytes:
+        """Return ``length`` bytes (or the rest) starting at ``offset``."""
+        from io import BytesIO
+
+        buf = BytesIO()
+        self.copy_range(ref, buf, offset, length)
+        return buf.getvalue()
+
+    @_instrumented("get")
+    def copy_range(self, ref: str, dst: BinaryIO, offset: int, length: Optional[int] = None) -> None:
+        """Stream a byte range of ``ref`` to ``dst``.
+
+        Raw blobs seek directly and framed (seekable) blobs decompress only
+        the frames covering the range; chunked objects skip whole chunks.
+        Other compressed blobs must be decompressed from the start.
+        """
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("offset and length must be non-negative")
+        loc, data = self._hot(ref)
+        self.metrics.add("get.bytes_out", _span(len(data) if data is not None else loc.size, offset, length))
+        if data is not None:
+            dst.write(data[offset:] if length is None else data[offset:offset + length])
+        else:
+            self._copy_loc_range(loc, dst, offset, length)
+
+    @_instrumented("get")
+    def read_lines(self, ref: str, start: int, end: Optional[int] = None) -> bytes:
+        """Return lines ``start`` to ``end`` (numbered from 1, inclusive; ``None`` for the rest)."""
+        from io import BytesIO
+
+        buf = BytesIO()
+        self.copy_lines(ref, buf, start, end)
+        return buf.getvalue()
+
+    @_instrumented("get")
+    def copy_lines(self, ref: str, dst: BinaryIO, start: int, end: Optional[int] = None) -> None:
+        """Stream lines ``start`` to ``end`` of ``ref`` to ``dst``.
+
+        With a line index the byte range is found by a lookup plus a scan of
+        at most one index stride, then read like ``copy_range``. Without one
+        the content is scanned from the start.
+        """
+        from io import BytesIO
+
+        from . import lines
+
+        if start < 1 or (end is not None and end < start):
+            raise ValueError("Lines are numbered from 1, and the range must not end before it starts")
+        loc = self._locate(ref)
+        holder = loc.layer or self
+        with self.metrics.phase("metadata"), holder._conn() as conn:
+            row = conn.execute("SELECT stride, counts FROM line_index WHERE hash = ?", (loc.hash,)).fetchone()
+        if row is None:
+            for piece in lines.scan_lines(self._iter_range(loc, 0, None), start, end):
+                dst.write(piece)
+            return
+        stride, counts = row[0], lines.unpack(row[1])
+
+        def read(offset: int, length: int) -> bytes:
+            buf = BytesIO()
+            self._copy_loc_range(loc, buf, offset, length)
+            return buf.getvalue()
+
+        begin = 0 if start == 1 else lines.newline_end(counts, stride, loc.size, start - 1, read)
+        stop = loc.size if end is None else lines.newline_end(counts, stride, loc.size, end, read)
+        self.metrics.add("get.bytes_out", stop - begin)
+        self._copy_loc_range(loc, dst, begin, stop - begin)
+
+    def _copy_loc_range(self, loc: _Location, dst: BinaryIO, offset: int, length: Optional[int]) -> None:
+        from .egress import fileno
+
+        if loc.layer is not None and loc.layer is not self:
+            loc.layer._copy_loc_range(loc, dst, offset, length)
+            return
+        if self._is_raw_file(loc) and fileno(dst) is not None:
+            try:
+                f = loc.path.open("rb")
+            except FileNotFoundError:
+                # Tiering may have moved the blob since it was looked up.
+                fresh = self._lookup(loc.hash)
+                if fresh is None or fresh.path == loc.path:
+                    raise
+                self._copy_loc_range(fresh, dst, offset, length)
+                return
+            with self.metrics.phase("disk"), f:
+                size = os.fstat(f.fileno()).st_size
+                self._copy_fd(f.fileno(), dst, offset, _span(size, offset, length))
+            return
+        for piece in self._iter_range(loc, offset, length):
+            dst.write(piece)
+
+    def _is_raw_file(self, loc: _Location) -> bool:
+        return loc.storage not in (*ROW_BACKED_STORAGE, "framed") and not loc.compression
+
+    def _copy_fd(self, src_fd: int, dst: BinaryIO, offset: int, count: int) -> str:
+        from .egress import copy_fd
 
-    def get(self, ref: str, out: Optional[Path] = None) -> None:
+        # Anything already buffered in dst must land before the kernel copy.
+        dst.flush()
+        return copy_fd(src_fd, dst.fileno(), offset, count)
+
+    def size_of(self, ref: str) -> int:
+        info = self.info(ref)
+        if info is None:
+            raise FileNotFoundError(f"Missing blob for {parse_ref(ref) or ref}")
+        return info.size
+
+    def _iter_range(self, loc: _Location, offset: int, length: Optional[int]) -> Generator[bytes, None, None]:
+        if loc.layer is not None and loc.layer is not self:
+            yield from loc.layer._iter_range(loc, offset, length)
+            return
+        if length == 0:
+            return
+        end = None if length is None else offset + length
+        if loc.storage == "framed":
+            from .framed import iter_range
+
+            with loc.path.open("rb") as f:
+                yield from iter_range(f, lambda: self._decompressor(loc.compression), offset, length)
+            return
+        if loc.storage == "packed":
+            data = self._read_packed(loc)
+            yield data[offset:] if end is None else data[offset:end]
+            return
+        if loc.storage == "chunked":
+            cursor = self._conn().execute(
+                """
+                SELECT c.hash, c.size, c.compression FROM object_chunks oc
+                JOIN chunks c ON c.hash = oc.chunk_hash
+                WHERE oc.object_hash = ? ORDER BY oc.seq
+                """,
+                (loc.hash,),
+            )
+            pos = 0
+            for chunk_hash, size, compression in cursor:
+                if end is not None and pos >= end:
+                    break
+                if pos + size > offset:
+                    data = self._read_blob(self._chunk_path(chunk_hash), compression or "")
+                    lo = max(offset - pos, 0)
+                    hi = size if end is None else min(end - pos, size)
+                    yield data[lo:hi]
+                pos += size
+            return
+        with loc.path.open("rb") as f:
+            if not loc.compression:
+                f.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    with self.metrics.phase("disk"):
+                        data = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                    if not data:
+                        return
+                    if remaining is not None:
+                        remaining -= len(data)
+                    yield data
+                return
+            decompressor = self._decompressor(loc.compression)
+            pos = 0
+            for packed in itertools.chain(iter(lambda: f.read(CHUNK_SIZE), b""), [None]):
+                with self.metrics.phase("decompress"):
+                    data = decompressor.decompress(packed) if packed is not None else decompressor.flush()
+                if data and pos + len(data) > offset:
+                    lo = max(offset - pos, 0)
+                    hi = len(data) if end is None else min(end - pos, len(data))
+                    if hi > lo:
+                        yield data[lo:hi]
+                pos += len(data)
+                if end is not None and pos >= end:
+                    return
+
+    def _read_blob(self, path: Path, compression: str) -> bytes:
+        with self.metrics.phase("disk"):
+            data = path.read_bytes()
+        if not compression:
+            return data
+        with self.metrics.phase("decompress"):
+            decompressor = self._decompressor(compression)
+            return decompressor.decompress(data) + decompressor.flush()
+
+    @_instrumented("get")
+    def copy_to(self, ref: str, dst: BinaryIO) -> None:
+        """Write the decompressed content of ``ref`` to a binary stream."""
+        loc, data = self._hot(ref)
+        self.metrics.add("get.bytes_out", len(data) if data is not None else loc.size)
+        if data is not None:
+            dst.write(data)
+        else:
+            self._copy_object(loc, dst)
+
+    def _hot(self, ref: str) -> tuple[Optional[_Location], Optional[bytes]]:
+        """Resolve ``ref`` through the hot-blob cache when it is enabled.
+
+        Returns ``(None, data)`` on a hit, ``(loc, data)`` when the object was
+        just loaded into the cache and ``(loc, None)`` when it is not cached.
+        """
+        cache = self._cache
+        if cache is None:
+            return self._locate(ref), None
+        hash_hex = parse_ref(ref)
+        data = cache.get(hash_hex) if hash_hex else None
+        if data is not None:
+            self._touch(hash_hex)
+            return None, data
+        loc = self._locate(ref)
+        if not 0 <= loc.size <= cache.max_item_bytes:
+            return loc, None
+        from io import BytesIO
+
+        buf = BytesIO()
+        self._copy_object(loc, buf)
+        data = buf.getvalue()
+        cache.put(loc.hash, data)
+        return loc, data
+
+    def _locate(self, ref: str) -> _Location:
         hash_hex = parse_ref(ref)
         if not hash_hex:
             raise ValueError("Invalid ref (expected vhs://<sha256>)")
-        path = self._blob_path(hash_hex)
-        if not path.exists():
+        loc = self._resolve(hash_hex)
+        if loc is None:
             raise FileNotFoundError(f"Missing blob for {hash_hex}")
+        self._touch(hash_hex)
+        return loc
 
-        compression = ""
-        with self._conn() as conn:
+    def _lookup(self, hash_hex: str) -> Optional[_Location]:
+        with self.metrics.phase("metadata"), self._conn() as conn:
             row = conn.execute(
-                "SELECT compression FROM objects WHERE hash = ?",
+                "SELECT storage, compression, pack_id, pack_offset, stored_size, size, tier FROM objects WHERE hash = ?",
                 (hash_hex,),
             ).fetchone()
-            if row:
-                compression = row[0] or ""
+        storage, compression, pack_id, offset, stored_size, size, tier = row if row else ("", "", None, 0, 0, -1, 0)
+        if storage == "packed":
+            assert pack_id is not None
+            return _Location(hash_hex, storage, compression or "", self._pack_path(pack_id), offset, stored_size, size)
+        path = self._object_path(hash_hex, tier)
+        if storage not in ROW_BACKED_STORAGE and not path.exists():
+            return None
+        return _Location(hash_hex, storage, compression or "", path, size=size)
 
-        self._touch(hash_hex)
+    def _resolve(self, hash_hex: str) -> Optional[_Location]:
+        """Locate ``hash_hex`` in this store, else in the first lower layer that has it."""
+        loc = self._lookup(hash_hex)
+        if loc is not None or not self.layer_roots:
+            return loc
+        for layer in self._lower():
+            loc = layer._lookup(hash_hex)
+            if loc is None:
+                continue
+            loc.layer = layer
+            self.metrics.add("layers.hits")
+            if self.promote_reads:
+                return self._promote(loc) or loc
+            return loc
+        return None
 
-        if out is None:
-            dest = sys.stdout.buffer
+    def _promote(self, loc: _Location) -> Optional[_Location]:
+        """Copy an object from a lower layer into this store; None if that fails.
+
+        Loose and framed blobs are copied as stored. Packed and chunked
+        objects belong to the layer's packs and chunk table, so their content
+        is stored again with the same codec.
+        """
+        import shutil
+
+        from . import codec as codecs
+
+        layer = loc.layer
+        name, dict_id = codecs.split(loc.compression)
+        try:
+            if dict_id and not (self.dict_root / f"{dict_id}.zdict").exists():
+                self.dict_root.mkdir(parents=True, exist_ok=True)
+                tmp = self.dict_root / f".{dict_id}.{os.getpid()}.tmp"
+                tmp.write_bytes(layer._load_dict(dict_id))
+                tmp.replace(self.dict_root / f"{dict_id}.zdict")
+            if loc.storage in ("", "framed"):
+                temp = self._temp_path()
+                temp.parent.mkdir(parents=True, exist_ok=True)
+                with self.metrics.phase("disk"):
+                    shutil.copyfile(loc.path, temp)
+                item = _Ingested(loc.hash, loc.size, temp.stat().st_size, loc.compression, temp, loc.storage)
+            else:
+                opts = _PutOptions(codec=name or None, dict_id=dict_id, chunked=loc.storage == "chunked")
+                item = self._ingest(_BlockReader(layer._iter_range(loc, 0, None)), opts, layered=False)
+            self._commit([item])
+        except OSError:
+            return None
+        self.metrics.add("layers.promotions")
+        return self._lookup(loc.hash)
+
+    @_instrumented("get_many")
+    def get_many(self, refs: Iterable[str], out_dir: Path) -> dict[str, Optional[Path]]:
+        """Write each ref to ``out_dir/<hash>``.
+
+        Returns a mapping of input ref to the written path, or ``None`` when
+        the ref is invalid or missing.
+        """
+        out_dir.mkdir(parents=True, exist_ok=True)
+        results: dict[str, Optional[Path]] = {}
+        found: list[str] = []
+        for ref in refs:
+            hash_hex = parse_ref(ref)
+            loc = self._resolve(hash_hex) if hash_hex else None
+            if loc is None:
+                results[ref] = None
+                continue
+            dest = out_dir / loc.hash
+            with dest.open("wb") as dst:
+                self._copy_object(loc, dst)
+            self.metrics.add("get.bytes_out", loc.size)
+            results[ref] = dest
+            found.append(loc.hash)
+        self._touch_many(found)
+        return results
+
+    @_instrumented("has_many")
+    def has_many(self, refs: Iterable[str]) -> dict[str, bool]:
+        """Check many refs at once, recording access for the ones present."""
+        results: dict[str, bool] = {}
+        found: list[str] = []
+        for ref in refs:
+            hash_hex = parse_ref(ref)
+            present = bool(hash_hex) and self._present(hash_hex)
+            results[ref] = present
+            if present:
+                found.append(hash_hex)
+        self.metrics.add("has.hits", len(found))
+        self.metrics.add("has.misses", len(results) - len(found))
+        self._touch_many(found)
+        return results
+
+    def _copy_object(self, loc: _Location, dst: BinaryIO) -> None:
+        if loc.layer is not None and loc.layer is not self:
+            loc.layer._copy_object(loc, dst)
+            return
+        if loc.storage == "chunked":
+            # Iterate the cursor so only one chunk is in memory at a time.
+            cursor = self._conn().execute(
+                """
+                SELECT c.hash, c.compression FROM object_chunks oc
+                JOIN chunks c ON c.hash = oc.chunk_hash
+                WHERE oc.object_hash = ? ORDER BY oc.seq
+                """,
+                (loc.hash,),
+            )
+            for chunk_hash, compression in cursor:
+                self._copy_blob(self._chunk_path(chunk_hash), dst, compression or "")
+            return
+        if loc.storage == "framed":
+            for piece in self._iter_range(loc, 0, None):
+                dst.write(piece)
+            return
+        if loc.storage == "packed":
+            dst.write(self._read_packed(loc))
+            return
+        try:
+            self._copy_blob(loc.path, dst, loc.compression)
+        except FileNotFoundError:
+            # Tiering may have moved the blob since it was looked up.
+            fresh = self._lookup(loc.hash)
+            if fresh is None or fresh.path == loc.path:
+                raise
+            self._copy_blob(fresh.path, dst, fresh.compression)
+
+    def _read_packed(self, loc: _Location) -> bytes:
+        """Read a packed object with a single positioned read, then decompress."""
+        for attempt in range(2):
+            try:
+                fd = os.open(loc.path, os.O_RDONLY)
+            except FileNotFoundError:
+                # A concurrent repack moved the object; look it up again.
+                fresh = self._lookup(loc.hash) if attempt == 0 else None
+                if fresh is None or fresh.storage != "packed":
+                    raise
+                loc = fresh
+                continue
+            try:
+                with self.metrics.phase("disk"):
+                    data = os.pread(fd, loc.length, loc.offset)
+            finally:
+                os.close(fd)
+            if len(data) != loc.length:
+                raise FileNotFoundError(f"Truncated pack entry for {loc.hash}")
+            if not loc.compression:
+                return data
+            with self.metrics.phase("decompress"):
+                decompressor = self._decompressor(loc.compression)
+                return decompressor.decompress(data) + decompressor.flush()
+        raise AssertionError("unreachable")
+
+    def _copy_blob(self, path: Path, dst: BinaryIO, compression: str) -> None:
+        from .egress import fileno
+
+        with path.open("rb") as f:
             if compression:
-                with path.open("rb") as f:
-                    _decompress_stream(f, dest, compression)
+                # Includes reading the compressed bytes.
+                with self.metrics.phase("decompress"):
+                    _decompress_stream(f, dst, self._decompressor(compression))
+            elif fileno(dst) is not None:
+                with self.metrics.phase("disk"):
+                    self._copy_fd(f.fileno(), dst, 0, os.fstat(f.fileno()).st_size)
             else:
-                with path.open("rb") as f:
-                    shutil.copyfileobj(f, dest)
-        else:
-            out.parent.mkdir(parents=True, exist_ok=True)
-            with out.open("wb") as dst:
-                if compression:
-                    with path.open("rb") as f:
-                        _decompress_stream(f, dst, compression)
+                import shutil
+
+                with self.metrics.phase("disk"):
+                    shutil.copyfileobj(f, dst)
+
+    @_instrumented("put")
+    def put(
+        self,
+        stream: BinaryIO,
+        compress: bool = False,
+        compress_min_bytes: Optional[int] = None,
+        expect_hash: Optional[str] = None,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        dict_id: Optional[str] = None,
+        chunked: bool = False,
+        seekable: bool = False,
+        frame_size: Optional[int] = None,
+        index: Optional[bool] = None,
+        line_index: Optional[bool] = None,
+    ) -> str:
+        """Store a stream and return its ref.
+
+        If ``expect_hash`` is given and already stored, the stream is not read
+        at all. Otherwise the payload is ingested and must hash to it.
+
+        ``codec`` selects a registered codec (see ``tldrs_vhs.codec``) or
+        ``"auto"``; ``level`` overrides its default level and ``dict_id``
+        (or ``"latest"``) selects a trained zstd dictionary.
+
+        With ``chunked=True`` the payload is split into content-defined
+        chunks that are stored (and compressed) once and shared between
+        objects; the ref is still the hash of the whole payload.
+
+        With ``seekable=True`` compressed payloads are written as independently
+        compressed frames of ``frame_size`` bytes plus an index, so range
+        reads only decompress the frames they touch.
+
+        ``index`` adds text payloads to the full-text index, overriding
+        ``Store.search_index``. ``line_index`` records a line index for text
+        payloads (overriding ``Store.line_index``) and stores compressed
+        ones seekable, so ``read_lines`` decompresses only nearby frames.
+        """
+        opts = _PutOptions(
+            compress, compress_min_bytes, codec, level, dict_id, chunked, seekable, frame_size, index, line_index
+        )
+        if expect_hash is not None:
+            expected = parse_ref(expect_hash)
+            if not expected:
+                raise ValueError("Invalid expected hash (expected vhs://<sha256>)")
+            existing = self._held(expected)
+            if existing is not None:
+                self._count_puts([existing])
+                return f"{SCHEME}{expected}"
+        item = self._ingest(stream, opts)
+        if expect_hash is not None and item.hash != expected:
+            item.discard()
+            raise ValueError(f"Content hash {item.hash} does not match expected {expected}")
+        self._commit([item])
+        self._count_puts([item])
+        return f"{SCHEME}{item.hash}"
+
+    @_instrumented("put")
+    def put_file(
+        self,
+        path: Union[Path, str],
+        how: str = "copy",
+        compress: bool = False,
+        compress_min_bytes: Optional[int] = None,
+        expect_hash: Optional[str] = None,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        dict_id: Optional[str] = None,
+        chunked: bool = False,
+        seekable: bool = False,
+        frame_size: Optional[int] = None,
+        index: Optional[bool] = None,
+        line_index: Optional[bool] = None,
+    ) -> str:
+        """Store the file at ``path`` and return its ref.
+
+        ``how="link"`` reflinks the file into the store, or hard-links it if
+        it is already read-only; ``path``'s mode is never changed.
+        ``how="move"`` hard-links it into the store and then removes ``path``.
+
+        Linking applies only when the payload is stored raw as its own blob.
+        Otherwise, or when linking fails (e.g. across filesystems), the file
+        is copied, and ``"move"`` still removes ``path`` afterwards. When the
+        content is already stored, ``path`` is left untouched. Other options
+        are as for ``put``.
+        """
+        if how not in PUT_FILE_MODES:
+            raise ValueError(f"how must be one of {PUT_FILE_MODES}")
+        opts = _PutOptions(
+            compress, compress_min_bytes, codec, level, dict_id, chunked, seekable, frame_size, index, line_index
+        )
+        path = Path(path)
+        if expect_hash is not None:
+            expected = parse_ref(expect_hash)
+            if not expected:
+                raise ValueError("Invalid expected hash (expected vhs://<sha256>)")
+            existing = self._held(expected)
+            if existing is not None:
+                self._count_puts([existing])
+                return f"{SCHEME}{expected}"
+        with path.open("rb") as f:
+            item = None
+            if how != "copy" and self._stores_raw(opts, os.fstat(f.fileno()).st_size):
+                item = self._stage_in_place(path, f, how)
+                if item is not None and item.staged and self._indexes(opts):
+                    from .search import TextCapture
+
+                    capture = TextCapture(self.search_max_bytes)
+                    f.seek(0)
+                    for _ in capture.tee([f.read(self.search_max_bytes)]):
+                        pass
+                    item.text = capture.text()
+                if item is not None and item.staged and self._indexes_lines(opts):
+                    from .lines import LineIndexer
+
+                    indexer = LineIndexer(self.line_index_stride)
+                    f.seek(0)
+                    for _ in indexer.tee(iter(lambda: f.read(CHUNK_SIZE), b"")):
+                        pass
+                    item.lines = indexer.result()
+            if item is None:
+                item = self._ingest(f, opts)
+        if expect_hash is not None and item.hash != expected:
+            item.discard()
+            raise ValueError(f"Content hash {item.hash} does not match expected {expected}")
+        self._commit([item])
+        self._count_puts([item])
+        if how == "move" and item.staged:
+            path.unlink(missing_ok=True)
+        return f"{SCHEME}{item.hash}"
+
+    def _stores_raw(self, opts: _PutOptions, size: int) -> bool:
+        """Whether a payload of ``size`` bytes becomes a raw blob file of its own."""
+        if opts.chunked or opts.always_compress:
+            return False
+        if opts.compress_min_bytes is not None and size >= opts.compress_min_bytes:
+            return False
+        return self.pack_max_bytes is None or size > self.pack_max_bytes
+
+    def _stage_in_place(self, path: Path, f: BinaryIO, how: str) -> Optional[_Ingested]:
+        """Stage ``path`` as a temp file without copying its bytes.
+
+        Returns None when neither a reflink nor a hard link is possible (for
+        ``"link"``, a hard link needs a read-only file), or the file changed
+        while it was being hashed.
+        """
+        from .egress import clone
+
+        before = os.fstat(f.fileno())
+        with self.metrics.phase("hash"):
+            known = _hash_regular_file(f)
+        if known is None:
+            return None
+        hash_hex, size = known
+        existing = self._held(hash_hex)
+        if existing is not None:
+            return existing
+        tmp = self._temp_path()
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        linked = False
+        if how == "link":
+            with tmp.open("wb") as dst:
+                linked = clone(f.fileno(), dst.fileno())
+            if not linked:
+                tmp.unlink()
+        if not linked:
+            if how == "link" and before.st_mode & 0o222:
+                # A hard link would share the caller's inode, and a write
+                # through ``path`` would change the blob. Making it read-only
+                # would change ``path`` too, so copy instead.
+                return None
+            try:
+                os.link(path, tmp)
+            except OSError:
+                return None
+        after = os.stat(path)
+        if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+            tmp.unlink(missing_ok=True)
+            return None
+        return _Ingested(hash_hex, size, size, "", tmp)
+
+    @_instrumented("put_many")
+    def put_many(
+        self,
+        items: Iterable[Union[BinaryIO, Path, str]],
+        compress: bool = False,
+        compress_min_bytes: Optional[int] = None,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        dict_id: Optional[str] = None,
+        chunked: bool = False,
+        seekable: bool = False,
+        frame_size: Optional[int] = None,
+        index: Optional[bool] = None,
+        line_index: Optional[bool] = None,
+    ) -> list[str]:
+        """Store many payloads, recording all metadata in one transaction.
+
+        Items may be file paths or readable binary streams. Returns refs in
+        input order. Options are as for ``put``.
+        """
+        opts = _PutOptions(
+            compress, compress_min_bytes, codec, level, dict_id, chunked, seekable, frame_size, index, line_index
+        )
+        ingested: list[_Ingested] = []
+        try:
+            for item in items:
+                if isinstance(item, (str, Path)):
+                    with open(item, "rb") as f:
+                        ingested.append(self._ingest(f, opts))
                 else:
-                    with path.open("rb") as f:
-                        shutil.copyfileobj(f, dst)
+                    ingested.append(self._ingest(item, opts))
+        except BaseException:
+            for done in ingested:
+                done.discard()
+            raise
+        if ingested:
+            self._commit(ingested)
+            self._count_puts(ingested)
+        return [f"{SCHEME}{item.hash}" for item in ingested]
 
-    def put(self, stream: BinaryIO, compress: bool = False, compress_min_bytes: Optional[int] = None) -> str:
-        hasher = hashlib.sha256()
-        size = 0
+    def _count_puts(self, items: list[_Ingested]) -> None:
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+        dedup = [item for item in items if not item.staged]
+        metrics.add("put.objects", len(items))
+        metrics.add("put.bytes_in", sum(item.size for item in items))
+        metrics.add("put.bytes_stored", sum(item.stored_size for item in items if item.staged))
+        metrics.add("put.dedup_hits", len(dedup))
+        metrics.add("put.dedup_bytes", sum(item.size for item in dedup))
+
+    def _held(self, hash_hex: str) -> Optional[_Ingested]:
+        """``_existing`` in this store, else in a lower layer."""
+        existing = self._existing(hash_hex)
+        if existing is None and self.layer_roots:
+            layer = self._in_lower(hash_hex)
+            existing = layer._existing(hash_hex) if layer is not None else None
+        # Puts that return here, such as an ``expect_hash`` hit, skip ``_record``.
+        if existing is not None and self._cache is not None:
+            self._cache.discard_missing(hash_hex)
+        return existing
+
+    def _existing(self, hash_hex: str) -> Optional[_Ingested]:
+        with self.metrics.phase("metadata"), self._conn() as conn:
+            row = conn.execute(
+                "SELECT size, stored_size, compression, storage, tier FROM objects WHERE hash = ?",
+                (hash_hex,),
+            ).fetchone()
+        if row is None:
+            return None
+        size, stored_size, compression, storage, tier = row
+        if storage not in ROW_BACKED_STORAGE and not self._object_path(hash_hex, tier).exists():
+            return None
+        return _Ingested(hash_hex, size, stored_size, compression or "", None, storage, staged=False)
+
+    def _ingest(self, stream: BinaryIO, opts: _PutOptions, layered: bool = True, prehash: bool = True) -> _Ingested:
+        """Hash and (optionally) compress ``stream`` into a temp file in one pass.
+
+        Regular files are hashed up front via mmap; when the hash is already
+        stored (here, or in a lower layer when ``layered``) nothing is
+        written. Otherwise only the hashed bytes are staged, and if the file
+        changed meanwhile it is staged again and hashed as it is read. The
+        blob is moved into place by ``_record``.
+        """
+        import hashlib
+
+        held = self._held if layered else self._existing
+        known = version = None
+        if prehash:
+            with self.metrics.phase("hash"):
+                version = _file_version(stream)
+                known = _hash_regular_file(stream)
+        if known is not None:
+            existing = held(known[0])
+            if existing is not None:
+                return existing
+
+        blocks: Iterator[bytes] = iter(lambda: stream.read(CHUNK_SIZE), b"")
+        if known is not None:
+            start = stream.tell()
+            blocks = _read_upto(stream, known[1])
+        # Buffer leading bytes until the threshold and auto-codec decisions
+        # can be made from them.
+        threshold = opts.compress_min_bytes
+        want = 0
+        if not opts.always_compress and threshold is not None:
+            want = threshold
+        if opts.codec_name == "auto":
+            from . import codec as codecs
+
+            want = max(want, codecs.AUTO_SAMPLE_BYTES)
+        head: list[bytes] = []
+        buffered = 0
+        if want > 0:
+            for block in blocks:
+                head.append(block)
+                buffered += len(block)
+                if buffered >= want:
+                    break
+        do_compress = opts.always_compress or (threshold is not None and buffered >= threshold)
+        make_compressor, compression = (None, "")
+        if do_compress:
+            make_compressor, compression = self._compressor_for(opts, b"".join(head))
 
-        self.root.mkdir(parents=True, exist_ok=True)
         tmp_dir = self.root / "tmp"
         tmp_dir.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.sha256() if known is None else None
+        data: Iterable[bytes] = itertools.chain(head, blocks)
+        capture = None
+        if self._indexes(opts):
+            from .search import TextCapture
 
-        raw_path = tmp_dir / f"upload-raw-{os.getpid()}-{os.urandom(6).hex()}"
-        with raw_path.open("wb") as tmp:
-            for chunk in iter(lambda: stream.read(1024 * 1024), b""):
-                hasher.update(chunk)
-                tmp.write(chunk)
-                size += len(chunk)
+            capture = TextCapture(self.search_max_bytes)
+            data = capture.tee(data)
+        indexer = None
+        if self._indexes_lines(opts):
+            from .lines import LineIndexer
 
-        do_compress = compress or (
-            compress_min_bytes is not None and size >= compress_min_bytes
-        )
-        compression = "zlib" if do_compress else ""
-        temp_path = raw_path
+            indexer = LineIndexer(self.line_index_stride)
+            data = indexer.tee(data)
+        if opts.chunked:
+            item = self._stage_chunks(data, hasher, make_compressor, compression)
+        elif (opts.seekable or indexer is not None) and make_compressor is not None:
+            item = self._stage_framed(data, hasher, make_compressor, compression, opts.frame_size)
+        else:
+            item = self._stage_blob(data, hasher, make_compressor, compression)
+        if known is not None:
+            if item.size != known[1] or _file_version(stream) != version:
+                # The staged bytes may not be the ones that were hashed.
+                item.discard()
+                stream.seek(start)
+                return self._ingest(stream, opts, layered, prehash=False)
+            item.hash = known[0]
+        if capture is not None:
+            item.text = capture.text()
+        if indexer is not None:
+            item.lines = indexer.result()
+        if layered and self.layer_roots:
+            # A stream's hash is only known now; drop the staged copy if a
+            # lower layer already has it.
+            layer = self._in_lower(item.hash)
+            existing = layer._existing(item.hash) if layer is not None else None
+            if existing is not None:
+                item.discard()
+                return existing
+        return item
 
-        if do_compress:
-            comp_path = tmp_dir / f"upload-{os.getpid()}-{os.urandom(6).hex()}"
-            compressor = zlib.compressobj(level=6)
-            with raw_path.open("rb") as src, comp_path.open("wb") as dst:
-                for chunk in iter(lambda: src.read(1024 * 1024), b""):
-                    dst.write(compressor.compress(chunk))
-                dst.write(compressor.flush())
-            temp_path = comp_path
-            if raw_path.exists():
-                raw_path.unlink()
-
-        hash_hex = hasher.hexdigest()
-        dest = self._blob_path(hash_hex)
-        dest.parent.mkdir(parents=True, exist_ok=True)
-
-        if not dest.exists():
-            temp_path.replace(dest)
+    def _temp_path(self) -> Path:
+        return self.root / "tmp" / f"upload-{os.getpid()}-{os.urandom(6).hex()}"
+
+    def _stage_blob(
+        self,
+        data: Iterable[bytes],
+        hasher: Optional[hashlib._Hash],
+        make_compressor: Optional[Callable[[], Compressor]],
+        compression: str,
+    ) -> _Ingested:
+        from io import BytesIO
+
+        compressor = make_compressor() if make_compressor else None
+        size = 0
+        # Spool in memory while the payload could still go into a pack.
+        spool_limit = self.pack_max_bytes if self.pack_max_bytes is not None else -1
+        spool: Optional[BytesIO] = BytesIO() if spool_limit >= 0 else None
+        temp_path = self._temp_path()
+        tmp: Optional[BinaryIO] = None
+        try:
+            phase = self.metrics.phase
+            for block in itertools.chain(data, [None]):
+                if block is None:
+                    with phase("compress"):
+                        out = compressor.flush() if compressor else b""
+                else:
+                    if hasher is not None:
+                        with phase("hash"):
+                            hasher.update(block)
+                    size += len(block)
+                    if compressor:
+                        with phase("compress"):
+                            out = compressor.compress(block)
+                    else:
+                        out = block
+                if spool is not None:
+                    spool.write(out)
+                    if spool.tell() <= spool_limit:
+                        continue
+                    with phase("disk"):
+                        tmp = temp_path.open("wb")
+                        tmp.write(spool.getvalue())
+                    spool = None
+                    continue
+                with phase("disk"):
+                    if tmp is None:
+                        tmp = temp_path.open("wb")
+                    tmp.write(out)
+            if tmp is not None:
+                with phase("disk"):
+                    tmp.close()
+        except BaseException:
+            if tmp is not None:
+                tmp.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+        hash_hex = hasher.hexdigest() if hasher is not None else ""
+        if spool is not None:
+            packed = spool.getvalue()
+            return _Ingested(hash_hex, size, len(packed), compression, None, "packed", data=packed)
+        return _Ingested(hash_hex, size, temp_path.stat().st_size, compression, temp_path)
+
+    def _stage_framed(
+        self,
+        data: Iterable[bytes],
+        hasher: Optional[hashlib._Hash],
+        make_compressor: Callable[[], Compressor],
+        compression: str,
+        frame_size: Optional[int],
+    ) -> _Ingested:
+        from .framed import FRAME_SIZE, FramedWriter
+
+        temp_path = self._temp_path()
+        try:
+            with temp_path.open("wb") as tmp:
+                writer = FramedWriter(tmp, make_compressor, frame_size or FRAME_SIZE)
+                for block in data:
+                    if hasher is not None:
+                        with self.metrics.phase("hash"):
+                            hasher.update(block)
+                    # Frames are compressed and written as they fill.
+                    with self.metrics.phase("compress"):
+                        writer.write(block)
+                with self.metrics.phase("compress"):
+                    writer.close()
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        hash_hex = hasher.hexdigest() if hasher is not None else ""
+        return _Ingested(hash_hex, writer.total, temp_path.stat().st_size, compression, temp_path, "framed")
+
+    def _stage_chunks(
+        self,
+        data: Iterable[bytes],
+        hasher: Optional[hashlib._Hash],
+        make_compressor: Optional[Callable[[], Compressor]],
+        compression: str,
+    ) -> _Ingested:
+        """Split ``data`` into content-defined chunks, staging only unseen ones."""
+        import hashlib
+
+        from .chunking import chunk_blocks
+
+        item = _Ingested("", 0, 0, compression, None, "chunked")
+        staged: dict[str, _Chunk] = {}
+        try:
+            for piece in chunk_blocks(data):
+                with self.metrics.phase("hash"):
+                    if hasher is not None:
+                        hasher.update(piece)
+                    chunk_hash = hashlib.sha256(piece).hexdigest()
+                item.size += len(piece)
+                chunk = staged.get(chunk_hash)
+                if chunk is None:
+                    chunk = self._existing_chunk(chunk_hash)
+                if chunk is None:
+                    temp_path = self._temp_path()
+                    payload = piece
+                    if make_compressor:
+                        with self.metrics.phase("compress"):
+                            compressor = make_compressor()
+                            payload = compressor.compress(piece) + compressor.flush()
+                    with self.metrics.phase("disk"):
+                        temp_path.write_bytes(payload)
+                    chunk = _Chunk(chunk_hash, len(piece), temp_path.stat().st_size, compression, temp_path)
+                if chunk_hash not in staged:
+                    staged[chunk_hash] = chunk
+                    item.stored_size += chunk.stored_size
+                item.chunks.append(chunk)
+        except BaseException:
+            item.discard()
+            raise
+        if hasher is not None:
+            item.hash = hasher.hexdigest()
+        return item
+
+    def _existing_chunk(self, chunk_hash: str) -> Optional[_Chunk]:
+        with self.metrics.phase("metadata"), self._conn() as conn:
+            row = conn.execute(
+                "SELECT size, stored_size, compression FROM chunks WHERE hash = ?",
+                (chunk_hash,),
+            ).fetchone()
+        if row is None:
+            return None
+        return _Chunk(chunk_hash, row[0], row[1], row[2] or "", None)
+
+    def _compressor_for(
+        self, opts: _PutOptions, sample: bytes
+    ) -> tuple[Optional[Callable[[], Compressor]], str]:
+        """Resolve put options to ``(compressor_factory, compression_value)``."""
+        from . import codec as codecs
+
+        name, level = opts.codec_name, opts.level
+        if name == "auto":
+            choice = codecs.choose_auto(sample[:codecs.AUTO_SAMPLE_BYTES])
+            if choice is None:
+                return None, ""
+            name, level = choice[0], level if level is not None else choice[1]
+        dictionary = None
+        compression = name
+        if opts.dict_id is not None:
+            dict_id = self._current_dict_id() if opts.dict_id == "latest" else opts.dict_id
+            dictionary = self._load_dict(dict_id)
+            compression = f"{name}:{dict_id}"
+        # Fail on bad codec/level before anything is written.
+        codecs.compressor(name, level, dictionary)
+        return (lambda: codecs.compressor(name, level, dictionary)), compression
+
+    def _decompressor(self, compression: str) -> Decompressor:
+        from . import codec as codecs
+
+        name, dict_id = codecs.split(compression)
+        dictionary = self._load_dict(dict_id) if dict_id else None
+        return codecs.decompressor(name, dictionary)
+
+    def _current_dict_id(self) -> str:
+        current = self.dict_root / "CURRENT"
+        if not current.exists():
+            raise FileNotFoundError("No trained dictionary (run `tldrs-vhs train-dict`)")
+        return current.read_text().strip()
+
+    def _load_dict(self, dict_id: str) -> bytes:
+        cached = self._dicts.get(dict_id)
+        if cached is None:
+            path = self.dict_root / f"{dict_id}.zdict"
+            if not path.exists():
+                raise FileNotFoundError(f"Missing compression dictionary {dict_id}")
+            cached = self._dicts[dict_id] = path.read_bytes()
+        return cached
+
+    def train_dict(self, samples: int = 2000, dict_size: int = 112640, max_sample_bytes: int = 1024 * 1024) -> str:
+        """Train a zstd dictionary from a random sample of stored blobs.
+
+        The dictionary becomes the ``"latest"`` one used by
+        ``put(codec="zstd", dict_id="latest")``. Returns its id.
+        """
+        import hashlib
+        from io import BytesIO
+
+        from . import codec as codecs
+
+        codecs.get("zstd")
+        import zstandard
+
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT hash, storage FROM objects WHERE size > 0 AND size <= ? ORDER BY RANDOM() LIMIT ?",
+                (max_sample_bytes, samples),
+            ).fetchall()
+        data = []
+        for hash_hex, _ in rows:
+            loc = self._lookup(hash_hex)
+            if loc is not None:
+                buf = BytesIO()
+                self._copy_object(loc, buf)
+                data.append(buf.getvalue())
+        if len(data) < 8:
+            raise ValueError(f"Need at least 8 stored blobs to train a dictionary (found {len(data)})")
+        trained = zstandard.train_dictionary(dict_size, data).as_bytes()
+        dict_id = hashlib.sha256(trained).hexdigest()[:16]
+        self.dict_root.mkdir(parents=True, exist_ok=True)
+        tmp = self.dict_root / f".{dict_id}.tmp"
+        tmp.write_bytes(trained)
+        tmp.replace(self.dict_root / f"{dict_id}.zdict")
+        tmp = self.dict_root / ".CURRENT.tmp"
+        tmp.write_text(dict_id + "\n")
+        tmp.replace(self.dict_root / "CURRENT")
+        return dict_id
+
+    def _commit(self, items: list[_Ingested]) -> None:
+        """Record staged items, in a group commit when ``durability="batched"``."""
+        # Each caller fsyncs its own files before queueing for the lock.
+        self._sync_staged(items)
+        if self.durability == "batched":
+            self._group.commit(items)
         else:
-            temp_path.unlink()
+            self._write(lambda conn: self._record(conn, items))
+
+    def _sync_staged(self, items: list[_Ingested]) -> None:
+        if self.durability == "fast":
+            return
+        with self.metrics.phase("sync"):
+            for item in items:
+                if item.synced or not item.staged:
+                    continue
+                for path in (item.temp, *(chunk.temp for chunk in item.chunks)):
+                    if path is not None:
+                        _fsync(path)
+                item.synced = True
+
+    def _publish(self, temp: Path, dest: Path, dirs: set[Path]) -> None:
+        """Rename a staged file to ``dest``, noting the directories that changed."""
+        with self.metrics.phase("disk"):
+            if not dest.parent.is_dir():
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                # blobs/<aa>/<bb>: new entries in both parents.
+                dirs.update((dest.parent.parent, dest.parent.parent.parent))
+            temp.replace(dest)
+        dirs.add(dest.parent)
 
-        stored_size = dest.stat().st_size if dest.exists() else 0
+    def _record(self, conn: sqlite3.Connection, items: list[_Ingested]) -> None:
+        """Move ingested temp files into place and insert their rows.
 
+        Runs inside the write transaction, so the blob on disk always matches
+        the compression recorded for it even when writers race on one hash.
+        Unless ``durability="fast"``, files and the directories they were
+        renamed into are synced before the rows are written.
+        """
+        self._sync_staged(items)
         now = self._now()
+        rows = []
+        dirs: set[Path] = set()
+        # Rows are inserted after the loop, so a hash that appears twice in
+        # one batch is only caught here.
+        recorded: set[str] = set()
+        for item in items:
+            if self._cache is not None:
+                self._cache.discard_missing(item.hash)
+            if not item.staged:
+                continue
+            stored = item.hash in recorded
+            if not stored:
+                exists = conn.execute("SELECT storage, tier FROM objects WHERE hash = ?", (item.hash,)).fetchone()
+                stored = exists is not None and (
+                    exists[0] in ROW_BACKED_STORAGE or self._object_path(item.hash, exists[1]).exists()
+                )
+            dest = self._blob_path(item.hash)
+            if stored:
+                item.discard()
+                item.staged = False
+                continue
+            recorded.add(item.hash)
+            pack_id = pack_offset = None
+            if item.storage == "chunked":
+                self._record_chunks(conn, item, dirs)
+            elif item.storage == "packed":
+                pack_id, pack_offset = self._pack_append(conn, item.data)
+                item.data = None
+            else:
+                self._publish(item.temp, dest, dirs)
+                item.temp = None
+            rows.append(
+                (item.hash, item.size, item.stored_size, item.compression, now, now, item.storage, pack_id, pack_offset)
+            )
+        if self.durability != "fast":
+            with self.metrics.phase("sync"):
+                for path in dirs:
+                    _fsync(path)
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO objects
+            (hash, size, stored_size, compression, created_at, last_accessed, storage, pack_id, pack_offset)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        for item in items:
+            if item.staged and item.text is not None:
+                self._index_text(conn, item.hash, item.text)
+                item.text = None
+        conn.executemany(
+            "INSERT OR REPLACE INTO line_index (hash, lines, stride, counts) VALUES (?, ?, ?, ?)",
+            [(item.hash, *item.lines) for item in items if item.staged and item.lines is not None],
+        )
+
+    def _index_text(self, conn: sqlite3.Connection, hash_hex: str, text: str) -> None:
+        from .search import doc_id
+
+        with self.metrics.phase("index"):
+            conn.execute("DELETE FROM text_index WHERE rowid = ?", (doc_id(hash_hex),))
+            conn.execute("INSERT INTO text_index (rowid, hash, body) VALUES (?, ?, ?)", (doc_id(hash_hex), hash_hex, text))
+
+    def _pack_append(self, conn: sqlite3.Connection, data: bytes) -> tuple[int, int]:
+        """Append ``data`` to the open pack, returning ``(pack_id, offset)``.
+
+        Must run inside the write transaction: the SQLite write lock is what
+        serializes appenders across processes. Bytes appended by a transaction
+        that later rolls back are dead space that ``repack`` reclaims.
+        """
+        row = conn.execute("SELECT id FROM packs WHERE sealed = 0 ORDER BY id DESC LIMIT 1").fetchone()
+        pack_id: Optional[int]
+        if row is None:
+            pack_id = conn.execute("INSERT INTO packs (size, live_bytes, sealed) VALUES (0, 0, 0)").lastrowid
+        else:
+            pack_id = row[0]
+        assert pack_id is not None
+        with self.metrics.phase("disk"):
+            self.pack_root.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._pack_path(pack_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                offset = os.fstat(fd).st_size
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.durability != "fast":
+                    os.fsync(fd)
+                    if offset == 0:
+                        _fsync(self.pack_root)
+            finally:
+                os.close(fd)
+        end = offset + len(data)
+        conn.execute(
+            "UPDATE packs SET size = ?, live_bytes = live_bytes + ?, sealed = ? WHERE id = ?",
+            (end, len(data), int(end >= PACK_TARGET_BYTES), pack_id),
+        )
+        return pack_id, offset
+
+    @_instrumented("repack")
+    def repack(self, max_live_ratio: float = 0.7) -> dict:
+        """Rewrite packs whose live fraction has dropped to ``max_live_ratio`` or less.
+
+        Live entries are copied into fresh packs and their rows updated in
+        one transaction per source pack; the old pack file is removed after
+        commit. Readers that raced with the move retry their lookup.
+        """
         with self._conn() as conn:
+            candidates = conn.execute(
+                "SELECT id FROM packs WHERE size > 0 AND live_bytes <= size * ? ORDER BY id",
+                (max_live_ratio,),
+            ).fetchall()
+        packs = reclaimed = moved = 0
+        for (pack_id,) in candidates:
+            result = self._write(lambda conn: self._repack_one(conn, pack_id))
+            if result is None:
+                continue
+            self._pack_path(pack_id).unlink(missing_ok=True)
+            packs += 1
+            moved += result[0]
+            reclaimed += result[1]
+        return {"packs": packs, "objects_moved": moved, "reclaimed_bytes": reclaimed}
+
+    def _repack_one(self, conn: sqlite3.Connection, pack_id: int) -> Optional[tuple[int, int]]:
+        row = conn.execute("SELECT size FROM packs WHERE id = ?", (pack_id,)).fetchone()
+        if row is None:
+            return None
+        path = self._pack_path(pack_id)
+        # Stop appending to the source while we drain it.
+        conn.execute("UPDATE packs SET sealed = 1 WHERE id = ?", (pack_id,))
+        entries = conn.execute(
+            "SELECT hash, pack_offset, stored_size FROM objects WHERE pack_id = ? ORDER BY pack_offset",
+            (pack_id,),
+        ).fetchall()
+        moved = 0
+        if entries:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                for hash_hex, offset, length in entries:
+                    data = os.pread(fd, length, offset)
+                    new_id, new_offset = self._pack_append(conn, data)
+                    conn.execute(
+                        "UPDATE objects SET pack_id = ?, pack_offset = ? WHERE hash = ?",
+                        (new_id, new_offset, hash_hex),
+                    )
+                    moved += 1
+            finally:
+                os.close(fd)
+        size = path.stat().st_size if path.exists() else row[0]
+        live = sum(length for _, _, length in entries)
+        conn.execute("DELETE FROM packs WHERE id = ?", (pack_id,))
+        return moved, size - live
+
+    def _record_chunks(self, conn: sqlite3.Connection, item: _Ingested, dirs: set[Path]) -> None:
+        from collections import Counter
+
+        counts = Counter(chunk.hash for chunk in item.chunks)
+        done: set[str] = set()
+        for chunk in item.chunks:
+            if chunk.hash in done:
+                continue
+            done.add(chunk.hash)
+            if conn.execute("SELECT 1 FROM chunks WHERE hash = ?", (chunk.hash,)).fetchone():
+                conn.execute(
+                    "UPDATE chunks SET refcount = refcount + ? WHERE hash = ?",
+                    (counts[chunk.hash], chunk.hash),
+                )
+                if chunk.temp is not None:
+                    chunk.temp.unlink(missing_ok=True)
+                    chunk.temp = None
+                continue
+            if chunk.temp is None:
+                raise RuntimeError(f"Chunk {chunk.hash} was removed while this put was in flight; retry the put")
+            self._publish(chunk.temp, self._chunk_path(chunk.hash), dirs)
+            chunk.temp = None
             conn.execute(
-                """
-                INSERT OR IGNORE INTO objects
-                (hash, size, stored_size, compression, created_at, last_accessed)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (hash_hex, size, stored_size, compression, now, now),
+                "INSERT INTO chunks (hash, size, stored_size, compression, refcount) VALUES (?, ?, ?, ?, ?)",
+                (chunk.hash, chunk.size, chunk.stored_size, chunk.compression, counts[chunk.hash]),
             )
+        conn.execute("DELETE FROM object_chunks WHERE object_hash = ?", (item.hash,))
+        conn.executemany(
+            "INSERT INTO object_chunks (object_hash, seq, chunk_hash) VALUES (?, ?, ?)",
+            [(item.hash, seq, chunk.hash) for seq, chunk in enumerate(item.chunks)],
+        )
 
-        return f"{SCHEME}{hash_hex}"
-
+    @_instrumented("delete")
     def delete(self, ref: str) -> bool:
         hash_hex = parse_ref(ref)
         if not hash_hex:
             raise ValueError("Invalid ref (expected vhs://<sha256>)")
-        deleted = self._delete_blob(hash_hex)
-        if deleted:
-            with self._conn() as conn:
-                conn.execute("DELETE FROM objects WHERE hash = ?", (hash_hex,))
-        return deleted
+        return self._write(lambda conn: self._remove(conn, hash_hex)) is not None
+
+    def _remove(self, conn: sqlite3.Connection, hash_hex: str) -> Optional[int]:
+        """Delete an object's data and row inside a write transaction.
+
+        Returns the stored bytes released (reclaimed by ``repack`` for packed
+        objects), or None when there was nothing to delete.
+        """
+        if self._cache is not None:
+            self._cache.invalidate(hash_hex)
+        row = conn.execute("SELECT storage, stored_size, tier FROM objects WHERE hash = ?", (hash_hex,)).fetchone()
+        if row is None:
+            return 0 if self._delete_blob(hash_hex) else None
+        storage, freed, tier = row
+        if storage == "chunked":
+            freed = 0
+            for chunk_hash, uses in conn.execute(
+                "SELECT chunk_hash, COUNT(*) FROM object_chunks WHERE object_hash = ? GROUP BY chunk_hash",
+                (hash_hex,),
+            ).fetchall():
+                conn.execute("UPDATE chunks SET refcount = refcount - ? WHERE hash = ?", (uses, chunk_hash))
+                refcount, chunk_stored = conn.execute(
+                    "SELECT refcount, stored_size FROM chunks WHERE hash = ?", (chunk_hash,)
+                ).fetchone()
+                if refcount <= 0:
+                    conn.execute("DELETE FROM chunks WHERE hash = ?", (chunk_hash,))
+                    self._chunk_path(chunk_hash).unlink(missing_ok=True)
+                    freed += chunk_stored
+            conn.execute("DELETE FROM object_chunks WHERE object_hash = ?", (hash_hex,))
+        elif storage == "packed":
+            conn.execute(
+                "UPDATE packs SET live_bytes = live_bytes - ? WHERE id = (SELECT pack_id FROM objects WHERE hash = ?)",
+                (freed, hash_hex),
+            )
+        else:
+            # A row whose blob file is already gone is still removed.
+            self._delete_blob(hash_hex, tier)
+        conn.execute("DELETE FROM objects WHERE hash = ?", (hash_hex,))
+        conn.execute("DELETE FROM line_index WHERE hash = ?", (hash_hex,))
+        if self.search_available:
+            from .search import doc_id
+
+            conn.execute("DELETE FROM text_index WHERE rowid = ?", (doc_id(hash_hex),))
+        return freed
 
     def _touch(self, hash_hex: str) -> None:
+        self._touch_many([hash_hex])
+
+    def _touch_many(self, hashes: list[str]) -> None:
+        if not hashes or self.read_only:
+            return
         now = self._now()
+        with self._touch_lock:
+            if not self._pending_touches:
+                self._pending_since = time.monotonic()
+            for hash_hex in hashes:
+                self._pending_touches[hash_hex] = now
+            due = (
+                self.access_tracking == "sync"
+                or len(self._pending_touches) >= self.touch_flush_size
+                or time.monotonic() - self._pending_since >= self.touch_flush_interval_s
+            )
+        if due:
+            self._flush_touches()
+
+    def flush(self) -> None:
+        """Write buffered access times, skipping rows that are already fresh."""
+        with self._touch_lock:
+            pending, self._pending_touches = self._pending_touches, {}
+        if not pending:
+            return
+        threshold = self._now() - self.touch_granularity_s
+        stale: list[str] = []
+        hashes = list(pending)
         with self._conn() as conn:
-            conn.execute(
-                "UPDATE objects SET last_accessed = ? WHERE hash = ?",
-                (now, hash_hex),
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                stale.extend(
+                    row[0]
+                    for row in conn.execute(
+                        f"SELECT hash FROM objects WHERE hash IN ({marks}) AND last_accessed < ?",
+                        [*batch, threshold],
+                    )
+                )
+        if not stale:
+            return
+        self._write(
+            lambda conn: conn.executemany(
+                "UPDATE objects SET last_accessed = ? WHERE hash = ? AND last_accessed < ?",
+                [(pending[hash_hex], hash_hex, pending[hash_hex]) for hash_hex in stale],
             )
+        )
 
+    @_instrumented("gc")
     def gc(
         self,
         max_age_days: Optional[int],
         max_size_mb: Optional[int],
         dry_run: bool = False,
         keep_last: int = 0,
+        budget_ms: Optional[int] = None,
+        batch_size: int = GC_BATCH_SIZE,
     ) -> dict:
-        now = datetime.now(timezone.utc)
-        deleted = 0
-        freed_bytes = 0
+        """Delete objects by age and/or evict least recently used ones to a size cap.
 
-        with self._conn() as conn:
-            protected: set[str] = set()
-            if keep_last and keep_last > 0:
-                protected_rows = conn.execute(
-                    "SELECT hash FROM objects ORDER BY last_accessed DESC LIMIT ?",
-                    (keep_last,),
-                ).fetchall()
-                protected = {row[0] for row in protected_rows}
+        Candidates come from indexed range queries on ``last_accessed``. Each
+        batch of at most ``batch_size`` objects is deleted in its own short
+        write transaction, so other writers get the lock between batches. With
+        ``budget_ms`` GC stops after the first batch that ends past the budget
+        and reports ``complete: False``; run it again to continue. The size cap
+        is measured in stored (on-disk) bytes.
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.flush()
+        started = time.monotonic()
+        cutoff = None if max_age_days is None else self._now() - max_age_days * 86400
+        cap_bytes = None if max_size_mb is None else max_size_mb * 1024 * 1024
+        keep, keep_args = self._gc_keep(keep_last)
+        result = {"deleted": 0, "freed_bytes": 0, "batches": 0, "complete": True}
 
-            if max_age_days is not None:
-                cutoff = now.timestamp() - (max_age_days * 86400)
-                rows = conn.execute(
-                    "SELECT hash, size, last_accessed FROM objects"
-                ).fetchall()
-                for hash_hex, size, last_accessed in rows:
-                    if hash_hex in protected:
-                        continue
-                    try:
-                        last_ts = datetime.fromisoformat(last_accessed).timestamp()
-                    except Exception:
-                        last_ts = now.timestamp()
-                    if last_ts < cutoff:
-                        if dry_run:
-                            deleted += 1
-                            freed_bytes += size
-                        else:
-                            if self._delete_blob(hash_hex):
-                                deleted += 1
-                                freed_bytes += size
-                                conn.execute("DELETE FROM objects WHERE hash = ?", (hash_hex,))
-
-            if max_size_mb is not None:
-                cap_bytes = max_size_mb * 1024 * 1024
-                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
-                if total > cap_bytes:
+        def over_budget() -> bool:
+            return budget_ms is not None and (time.monotonic() - started) * 1000 >= budget_ms
+
+        if dry_run:
+            conn = self._conn()
+            with conn:
+                if cutoff is not None:
+                    count, freed = conn.execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM objects WHERE last_accessed < ? AND {keep}",
+                        (cutoff, *keep_args),
+                    ).fetchone()
+                    result["deleted"] += count
+                    result["freed_bytes"] += freed
+                if cap_bytes is not None:
+                    total = self._stored_bytes(conn) - result["freed_bytes"]
                     rows = conn.execute(
-                        "SELECT hash, size FROM objects ORDER BY last_accessed ASC"
-                    ).fetchall()
-                    for hash_hex, size in rows:
+                        f"SELECT stored_size FROM objects WHERE last_accessed >= ? AND {keep} ORDER BY last_accessed, hash",
+                        (cutoff or 0, *keep_args),
+                    )
+                    for (stored,) in rows:
                         if total <= cap_bytes:
                             break
-                        if hash_hex in protected:
-                            continue
-                        if dry_run:
-                            deleted += 1
-                            freed_bytes += size
-                            total -= size
-                        else:
-                            if self._delete_blob(hash_hex):
-                                deleted += 1
-                                freed_bytes += size
-                                total -= size
-                                conn.execute("DELETE FROM objects WHERE hash = ?", (hash_hex,))
+                        result["deleted"] += 1
+                        result["freed_bytes"] += stored
+                        total -= stored
+            return result
 
-        return {
-            "deleted": deleted,
-            "freed_bytes": freed_bytes,
-        }
+        def run_batch(hashes: list[str]) -> int:
+            def delete(conn: sqlite3.Connection) -> int:
+                freed = 0
+                for hash_hex in hashes:
+                    released = self._remove(conn, hash_hex)
+                    if released is not None:
+                        result["deleted"] += 1
+                        freed += released
+                return freed
+
+            deleted = result["deleted"]
+            freed = self._write(delete)
+            result["freed_bytes"] += freed
+            result["batches"] += 1
+            self.metrics.add("gc.deleted", result["deleted"] - deleted)
+            self.metrics.add("gc.freed_bytes", freed)
+            return freed
+
+        conn = self._conn()
+        if cutoff is not None:
+            while True:
+                with conn:
+                    hashes = [
+                        row[0]
+                        for row in conn.execute(
+                            f"SELECT hash FROM objects WHERE last_accessed < ? AND {keep} ORDER BY last_accessed, hash LIMIT ?",
+                            (cutoff, *keep_args, batch_size),
+                        )
+                    ]
+                if not hashes:
+                    break
+                run_batch(hashes)
+                if over_budget():
+                    result["complete"] = False
+                    return result
+
+        if cap_bytes is not None:
+            with conn:
+                total = self._stored_bytes(conn)
+            while total > cap_bytes:
+                evict: list[str] = []
+                with conn:
+                    rows = conn.execute(
+                        f"SELECT hash, stored_size FROM objects WHERE {keep} ORDER BY last_accessed, hash LIMIT ?",
+                        (*keep_args, batch_size),
+                    )
+                    planned = total
+                    for hash_hex, stored in rows:
+                        if planned <= cap_bytes:
+                            break
+                        evict.append(hash_hex)
+                        planned -= stored
+                if not evict:
+                    break
+                total -= run_batch(evict)
+                if over_budget():
+                    result["complete"] = total <= cap_bytes
+                    return result
 
-    def _delete_blob(self, hash_hex: str) -> bool:
-        path = self._blob_path(hash_hex)
+        return result
+
+    def _gc_keep(self, keep_last: int) -> tuple[str, tuple]:
+        """SQL condition (and its parameters) sparing the ``keep_last`` most recently used objects.
+
+        They are the rows at or after the ``keep_last``-th one in
+        ``(last_accessed, hash)`` order, found with one index seek, so the
+        candidates are a range of that index.
+        """
+        if keep_last <= 0:
+            return "1", ()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT last_accessed, hash FROM objects ORDER BY last_accessed DESC, hash DESC LIMIT 1 OFFSET ?",
+                (keep_last - 1,),
+            ).fetchone()
+        if row is None:
+            return "0", ()
+        return "(last_accessed, hash) < (?, ?)", tuple(row)
+
+    def _stored_bytes(self, conn: sqlite3.Connection) -> int:
+        """Bytes on disk: stored size of unchunked objects plus unique chunks."""
+        return conn.execute("SELECT stored_bytes + chunk_stored_bytes FROM totals").fetchone()[0]
+
+    def _delete_blob(self, hash_hex: str, tier: int = TIER_HOT) -> bool:
+        path = self._object_path(hash_hex, tier)
         if path.exists():
             path.unlink()
             return True
         return False
 
 
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    """Create the objects table, upgrading pre-versioned databases in place."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS objects (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL DEFAULT 0,
+            compression TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL,
+            last_accessed TEXT NOT NULL
+        )
+        """
+    )
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(objects)")}
+    if "stored_size" not in cols:
+        conn.execute("ALTER TABLE objects ADD COLUMN stored_size INTEGER NOT NULL DEFAULT 0")
+    if "compression" not in cols:
+        conn.execute("ALTER TABLE objects ADD COLUMN compression TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE objects SET stored_size = size WHERE stored_size = 0")
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    """Add content-defined chunk storage."""
+    conn.execute("ALTER TABLE objects ADD COLUMN storage TEXT NOT NULL DEFAULT ''")
+    conn.execute(
+        """
+        CREATE TABLE chunks (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            compression TEXT NOT NULL DEFAULT '',
+            refcount INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE object_chunks (
+            object_hash TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            PRIMARY KEY (object_hash, seq)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+    """Add pack files for small blobs."""
+    conn.execute("ALTER TABLE objects ADD COLUMN pack_id INTEGER")
+    conn.execute("ALTER TABLE objects ADD COLUMN pack_offset INTEGER")
+    conn.execute("CREATE INDEX objects_pack ON objects (pack_id, pack_offset) WHERE pack_id IS NOT NULL")
+    conn.execute(
+        """
+        CREATE TABLE packs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            size INTEGER NOT NULL DEFAULT 0,
+            live_bytes INTEGER NOT NULL DEFAULT 0,
+            sealed INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+def _migrate_v4(conn: sqlite3.Connection) -> None:
+    """Store timestamps as indexed integer epoch seconds instead of ISO text."""
+    conn.execute(
+        """
+        CREATE TABLE objects_v4 (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL DEFAULT 0,
+            compression TEXT NOT NULL DEFAULT '',
+            created_at INTEGER NOT NULL,
+            last_accessed INTEGER NOT NULL,
+            storage TEXT NOT NULL DEFAULT '',
+            pack_id INTEGER,
+            pack_offset INTEGER
+        )
+        """
+    )
+    # Unparseable legacy values become "now" rather than "1970".
+    conn.execute(
+        """
+        INSERT INTO objects_v4
+        SELECT hash, size, stored_size, compression,
+               COALESCE(CAST(strftime('%s', created_at) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER)),
+               COALESCE(CAST(strftime('%s', last_accessed) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER)),
+               storage, pack_id, pack_offset
+        FROM objects
+        """
+    )
+    conn.execute("DROP TABLE objects")
+    conn.execute("ALTER TABLE objects_v4 RENAME TO objects")
+    conn.execute("CREATE INDEX objects_pack ON objects (pack_id, pack_offset) WHERE pack_id IS NOT NULL")
+    conn.execute("CREATE INDEX objects_last_accessed ON objects (last_accessed)")
+    conn.execute("CREATE INDEX objects_created_at ON objects (created_at)")
+
+
+def _migrate_v5(conn: sqlite3.Connection) -> None:
+    """Add the full-text index, when SQLite was built with FTS5."""
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS text_index USING fts5(
+                hash UNINDEXED, body, tokenize = "unicode61 tokenchars '_'"
+            )
+            """
+        )
+    except sqlite3.OperationalError as exc:
+        if "fts5" not in str(exc):
+            raise
+
+
+def _migrate_v6(conn: sqlite3.Connection) -> None:
+    """Record which tier a loose blob lives in."""
+    conn.execute("ALTER TABLE objects ADD COLUMN tier INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX objects_tier ON objects (tier, last_accessed)")
+
+
+def _migrate_v7(conn: sqlite3.Connection) -> None:
+    """Add sparse line indexes (see tldrs_vhs.lines)."""
+    conn.execute(
+        """
+        CREATE TABLE line_index (
+            hash TEXT PRIMARY KEY,
+            lines INTEGER NOT NULL,
+            stride INTEGER NOT NULL,
+            counts BLOB NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# Per-row contributions to each column of the totals table. "{r}" is the
+# NEW or OLD row in the triggers that maintain them.
+_OBJECT_TOTALS = {
+    "objects": "1",
+    "bytes": "{r}.size",
+    "stored_bytes": "({r}.storage != 'chunked') * {r}.stored_size",
+    "chunked_objects": "({r}.storage = 'chunked')",
+    "chunked_bytes": "({r}.storage = 'chunked') * {r}.size",
+}
+_CHUNK_TOTALS = {
+    "chunks": "1",
+    "chunk_bytes": "{r}.size",
+    "chunk_stored_bytes": "{r}.stored_size",
+}
+TOTALS = (*_OBJECT_TOTALS, *_CHUNK_TOTALS)
+
+
+def recount_totals(conn: sqlite3.Connection) -> bool:
+    """Recompute the totals row from the tables; True if it had drifted."""
+    actual: tuple = ()
+    for table, columns in (("objects", _OBJECT_TOTALS), ("chunks", _CHUNK_TOTALS)):
+        sums = ", ".join(f"COALESCE(SUM({expr.format(r=table)}), 0)" for expr in columns.values())
+        actual += conn.execute(f"SELECT {sums} FROM {table}").fetchone()
+    kept = conn.execute(f"SELECT {', '.join(TOTALS)} FROM totals").fetchone()
+    if kept == actual:
+        return False
+    conn.execute(f"UPDATE totals SET {', '.join(f'{c} = ?' for c in TOTALS)}", actual)
+    return True
+
+
+def _totals_triggers(table: str, columns: dict[str, str]) -> Iterator[str]:
+    def assign(*terms: tuple[str, str]) -> str:
+        return ", ".join(
+            f"{col} = {col}" + "".join(f" {sign} {expr.format(r=row)}" for sign, row in terms)
+            for col, expr in columns.items()
+        )
+
+    yield f"""
+        CREATE TRIGGER {table}_totals_insert AFTER INSERT ON {table}
+        BEGIN UPDATE totals SET {assign(("+", "NEW"))}; END
+    """
+    yield f"""
+        CREATE TRIGGER {table}_totals_delete AFTER DELETE ON {table}
+        BEGIN UPDATE totals SET {assign(("-", "OLD"))}; END
+    """
+    yield f"""
+        CREATE TRIGGER {table}_totals_update AFTER UPDATE OF size, stored_size, storage ON {table}
+        BEGIN UPDATE totals SET {assign(("-", "OLD"), ("+", "NEW"))}; END
+    """
+
+
+def _migrate_v8(conn: sqlite3.Connection) -> None:
+    """Keep store totals in one trigger-maintained row; index listing order."""
+    conn.execute(
+        f"""
+        CREATE TABLE totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            {", ".join(f"{col} INTEGER NOT NULL DEFAULT 0" for col in TOTALS)}
+        )
+        """
+    )
+    conn.execute("INSERT INTO totals (id) VALUES (0)")
+    recount_totals(conn)
+    for statement in (*_totals_triggers("objects", _OBJECT_TOTALS), *_totals_triggers("chunks", _CHUNK_TOTALS)):
+        conn.execute(statement)
+    # Keyset pages seek on (last_accessed, hash); the old index is its prefix.
+    conn.execute("DROP INDEX objects_last_accessed")
+    conn.execute("CREATE INDEX objects_recent ON objects (last_accessed, hash)")
+
+
+# Migration N upgrades a database at user_version N-1 to N. Append only.
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+    _migrate_v8,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def resolve_root(root: Optional[Path] = None) -> Path:
+    return (root or Path(os.environ.get("TLDRS_VHS_HOME", DEFAULT_HOME))).expanduser().resolve()
+
+
+def _span(size: int, offset: int, length: Optional[int]) -> int:
+    """Bytes in ``[offset, offset + length)`` of a ``size``-byte object."""
+    available = max(size - offset, 0)
+    return available if length is None else min(length, available)
+
+
 def parse_ref(ref: str) -> Optional[str]:
     if ref.startswith(SCHEME):
         ref = ref[len(SCHEME):]
@@ -316,12 +2570,109 @@ def parse_ref(ref: str) -> Optional[str]:
     return ref
 
 
-def _decompress_stream(src: BinaryIO, dst: BinaryIO, compression: str) -> None:
-    if compression == "zlib":
-        decompressor = zlib.decompressobj()
-        for chunk in iter(lambda: src.read(1024 * 1024), b""):
-            dst.write(decompressor.decompress(chunk))
-        dst.write(decompressor.flush())
+def _boot_id() -> Optional[str]:
+    """An id that changes on every boot (Linux), or None where unavailable."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _fsync(path: Path) -> None:
+    """fsync a file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _parse_cursor(cursor: str) -> tuple[int, str]:
+    """Split an ``ObjectInfo.cursor`` into ``(last_accessed, hash)``."""
+    stamp, _, hash_hex = cursor.partition(":")
+    if not stamp.lstrip("-").isdigit() or parse_ref(hash_hex) is None:
+        raise ValueError(f"Bad cursor: {cursor!r}")
+    return int(stamp), hash_hex
+
+
+def _file_version(stream: BinaryIO) -> Optional[tuple[int, int]]:
+    """``(st_size, st_mtime_ns)`` of the file behind ``stream``, or None if it has none."""
+    try:
+        st = os.fstat(stream.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _read_upto(stream: BinaryIO, size: int) -> Iterator[bytes]:
+    """Read at most ``size`` more bytes of ``stream`` in ``CHUNK_SIZE`` blocks."""
+    while size > 0:
+        block = stream.read(min(CHUNK_SIZE, size))
+        if not block:
+            return
+        size -= len(block)
+        yield block
+
+
+def _hash_regular_file(stream: BinaryIO) -> Optional[tuple[str, int]]:
+    """Hash the rest of a regular file via mmap and rewind it.
+
+    Returns ``(sha256, size)``, or None when ``stream`` is not a seekable
+    regular file (pipes, sockets, in-memory buffers).
+    """
+    import hashlib
+    import mmap
+    import stat
+
+    try:
+        fd = stream.fileno()
+        start = stream.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    size = st.st_size - start
+    hasher = hashlib.sha256()
+    if size > 0:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            with view[start:] as rest:
+                hasher.update(rest)
+    stream.seek(start)
+    return hasher.hexdigest(), size
+
+
+def _link_readonly(src: Path, dest: Path) -> bool:
+    """Hard-link ``src`` to ``dest`` (replacing it); False if linking is not possible.
+
+    The blob is made read-only first: both names share one inode, so writing
+    through ``dest`` would otherwise corrupt the store.
+    """
+    tmp = dest.with_name(f".{dest.name}.{os.urandom(4).hex()}.tmp")
+    try:
+        os.chmod(src, 0o444)
+        os.link(src, tmp)
+        os.replace(tmp, dest)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _unshare(path: Path) -> None:
+    """Unlink ``path`` if it is a hard link, so writing it cannot reach a linked blob."""
+    import stat
+
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
         return
-    # Unknown compression: treat as raw
-    shutil.copyfileobj(src, dst)
+    if stat.S_ISREG(st.st_mode) and st.st_nlink > 1:
+        path.unlink()
+
+
+def _decompress_stream(src: BinaryIO, dst: BinaryIO, decompressor: Decompressor) -> None:
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        dst.write(decompressor.decompress(chunk))
+    dst.write(decompressor.flush())
@@ -0,0 +1,230 @@
+"""Hot/cold tiering of loose blobs, driven by ``last_accessed``.
+
+New blobs are hot: they live under ``<root>/blobs`` with whatever codec
+``put`` chose, usually raw or a fast one. ``run`` demotes blobs that have not
+been read for ``cold_after_days``: each is recompressed with a slow,
+dense codec (zstd level 19, or zlib level 9 without zstd) into
+``<root>/cold/blobs``. ``<root>/cold`` is a plain directory unless the store
+was opened with a cold root, in which case it is a symlink to a bigger,
+slower disk. If recompression does not shrink a blob, its bytes are moved
+unchanged. Cold blobs that have been read since the cutoff are promoted
+back to the hot root uncompressed, as ``put`` stores them by default, so
+range reads seek again instead of decompressing from the start.
+
+Each move writes the new file first, then swaps it in and updates
+``tier``, ``compression`` and ``stored_size`` in one write transaction. The
+old file is removed after commit, and readers that looked it up just
+before retry their lookup. Chunked, packed and seekable objects stay where
+they are.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Optional
+
+from .store import TIER_COLD, TIER_HOT, _fsync
+
+if TYPE_CHECKING:
+    from .codec import Compressor
+    from .store import Store, _Location
+
+# Densest first; the first available one is the default cold codec.
+COLD_CODECS = (("zstd", 19), ("zlib", 9))
+BATCH_SIZE = 100
+
+
+def cold_codec() -> tuple[str, int]:
+    from . import codec as codecs
+
+    for name, level in COLD_CODECS:
+        if codecs.CODECS[name].available():
+            return name, level
+    raise AssertionError("zlib is always available")
+
+
+class _CompressingWriter:
+    def __init__(self, out: BinaryIO, compressor: "Compressor") -> None:
+        self.out = out
+        self.compressor = compressor
+
+    def write(self, data: bytes) -> int:
+        self.out.write(self.compressor.compress(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.out.write(self.compressor.flush())
+
+
+def report(store: "Store") -> dict:
+    """Objects, logical bytes and stored bytes per tier.
+
+    ``pinned`` covers chunked, packed and seekable objects, which are never
+    moved between tiers.
+    """
+    tiers = {name: {"objects": 0, "bytes": 0, "stored_bytes": 0} for name in ("hot", "cold", "pinned")}
+    with store._conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT CASE WHEN storage != '' THEN 'pinned' WHEN tier = 1 THEN 'cold' ELSE 'hot' END,
+                   COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0)
+            FROM objects GROUP BY 1
+            """
+        ).fetchall()
+    for name, count, size, stored in rows:
+        tiers[name] = {"objects": count, "bytes": size, "stored_bytes": stored}
+    return {**tiers, "cold_root": str(store.cold_root.resolve())}
+
+
+def _stage(store: "Store", loc: "_Location", to_tier: int, codec: Optional[tuple[str, int]]) -> tuple[Path, str]:
+    """Write the blob's bytes for ``to_tier`` next to their destination.
+
+    Returns ``(temp_path, compression)``. With ``codec`` the content is
+    recompressed, unless that does not make it smaller; without it, the
+    content is written raw.
+    """
+    import shutil
+
+    from . import codec as codecs
+
+    dest_root = store.cold_root if to_tier == TIER_COLD else store.root
+    tmp_dir = dest_root / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    temp = tmp_dir / f"tier-{os.getpid()}-{os.urandom(6).hex()}"
+    try:
+        if codec is not None:
+            name, level = codec
+            with temp.open("wb") as out:
+                writer = _CompressingWriter(out, codecs.compressor(name, level))
+                store._copy_object(loc, writer)  # type: ignore[arg-type]
+                writer.close()
+            if temp.stat().st_size < loc.path.stat().st_size:
+                return temp, name
+            temp.unlink()
+        elif loc.compression:
+            with temp.open("wb") as out:
+                store._copy_object(loc, out)
+            return temp, ""
+        try:
+            os.link(loc.path, temp)
+        except OSError:
+            shutil.copyfile(loc.path, temp)
+        return temp, loc.compression
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+def _move(store: "Store", hash_hex: str, to_tier: int, codec: Optional[tuple[str, int]]) -> Optional[int]:
+    """Move one loose blob to ``to_tier``; returns the change in stored bytes, or None if skipped."""
+    loc = store._lookup(hash_hex)
+    if loc is None or loc.storage != "":
+        return None
+    from_tier = TIER_COLD if loc.path == store._object_path(hash_hex, TIER_COLD) else TIER_HOT
+    if from_tier == to_tier:
+        return None
+    temp, compression = _stage(store, loc, to_tier, codec)
+    stored_size = temp.stat().st_size
+    durable = store.durability != "fast"
+    if durable:
+        _fsync(temp)
+
+    def swap(conn) -> Optional[int]:
+        row = conn.execute(
+            "SELECT storage, compression, tier, stored_size FROM objects WHERE hash = ?", (hash_hex,)
+        ).fetchone()
+        # Deleted, re-put or moved by someone else since the lookup.
+        if row is None or tuple(row[:3]) != ("", loc.compression, from_tier):
+            return None
+        dest = store._object_path(hash_hex, to_tier)
+        dirs: set[Path] = set()
+        store._publish(temp, dest, dirs)
+        if durable:
+            for path in dirs:
+                _fsync(path)
+        conn.execute(
+            "UPDATE objects SET tier = ?, compression = ?, stored_size = ? WHERE hash = ?",
+            (to_tier, compression, stored_size, hash_hex),
+        )
+        return stored_size - row[3]
+
+    try:
+        delta = store._write(swap)
+    finally:
+        temp.unlink(missing_ok=True)
+    if delta is not None:
+        loc.path.unlink(missing_ok=True)
+    return delta
+
+
+def run(
+    store: "Store",
+    *,
+    cold_after_days: float = 1.0,
+    codec: Optional[str] = None,
+    level: Optional[int] = None,
+    promote: bool = True,
+    dry_run: bool = False,
+    budget_ms: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """Demote loose blobs unread for ``cold_after_days``; promote cold ones read since.
+
+    ``codec``/``level`` override the cold codec (default: ``cold_codec()``).
+    With ``budget_ms`` the run stops after the batch that ends past the
+    budget and reports ``complete: False``; run it again to continue.
+    """
+    from . import codec as codecs
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    if codec is None:
+        target = cold_codec() if level is None else (cold_codec()[0], level)
+    else:
+        target = (codec, level if level is not None else codecs.get(codec).max_level)
+    # Fail on a bad codec or level before anything moves.
+    codecs.compressor(*target)
+    started = time.monotonic()
+    cutoff = store._now() - int(cold_after_days * 86400)
+    result = {"demoted": 0, "promoted": 0, "saved_bytes": 0, "complete": True}
+    with store.metrics.op("tier"):
+        store.flush()
+        conn = store._conn()
+        passes: list[tuple[int, int, str, str, Optional[tuple[str, int]]]] = [
+            (TIER_HOT, TIER_COLD, "last_accessed < ?", "demoted", target)
+        ]
+        if promote:
+            passes.append((TIER_COLD, TIER_HOT, "last_accessed >= ?", "promoted", None))
+        for from_tier, to_tier, when, key, move_codec in passes:
+            # Keyset cursor: objects that could not be moved are not revisited.
+            after = (-1, "")
+            while True:
+                with conn:
+                    rows = conn.execute(
+                        f"""
+                        SELECT hash, last_accessed FROM objects
+                        WHERE tier = ? AND storage = '' AND {when} AND (last_accessed, hash) > (?, ?)
+                        ORDER BY last_accessed, hash LIMIT ?
+                        """,
+                        (from_tier, cutoff, *after, batch_size),
+                    ).fetchall()
+                if not rows:
+                    break
+                after = (rows[-1][1], rows[-1][0])
+                for hash_hex, _ in rows:
+                    if dry_run:
+                        result[key] += 1
+                        continue
+                    delta = _move(store, hash_hex, to_tier, move_codec)
+                    if delta is not None:
+                        result[key] += 1
+                        result["saved_bytes"] -= delta
+                if budget_ms is not None and (time.monotonic() - started) * 1000 >= budget_ms:
+                    result["complete"] = False
+                    return result
+    return result
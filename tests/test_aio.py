@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.aio import AsyncStore
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[i:i + size]
+
+
+def test_async_put_get_roundtrip(tmp_path: Path) -> None:
+    payload = os.urandom(3 * 1024 * 1024)
+
+    async def run() -> None:
+        async with AsyncStore(tmp_path) as store:
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"from a stream reader")
+            reader.feed_eof()
+            ref_reader = await store.put(reader)
+            ref_iter = await store.put(_chunks(payload, 100_000), compress=True)
+            refs = await asyncio.gather(*(store.put(f"small {i}".encode()) for i in range(50)))
+
+            assert await store.read(ref_reader) == b"from a stream reader"
+            assert await store.read(ref_iter) == payload
+            assert await store.read(ref_iter, 10, 20) == payload[10:30]
+            assert await store.has(refs[7]) is True
+            assert (await store.info(refs[7])).size == len(b"small 7")
+            assert [await store.read(r) for r in refs[:3]] == [b"small 0", b"small 1", b"small 2"]
+
+            assert await store.delete(refs[0]) is True
+            assert await store.has(refs[0]) is False
+            assert (await store.gc(max_age_days=None, max_size_mb=0))["deleted"] == 51
+            with pytest.raises(FileNotFoundError):
+                await store.get(ref_iter)
+
+    asyncio.run(run())
+
+
+def test_lookups_not_starved_by_uploads(tmp_path: Path) -> None:
+    async def run() -> None:
+        async with AsyncStore(tmp_path, io_workers=2) as store:
+            ref = await store.put(b"hot")
+            gate = asyncio.Event()
+
+            async def slow_body():
+                yield b"x" * 1024
+                await gate.wait()
+                yield b"y" * 1024
+
+            # Both io workers are now blocked inside slow uploads.
+            uploads = [asyncio.create_task(store.put(slow_body())) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            checks = await asyncio.wait_for(asyncio.gather(*(store.has(ref) for _ in range(1000))), 10)
+            assert all(checks)
+            gate.set()
+            assert len(set(await asyncio.gather(*uploads))) == 1
+
+    asyncio.run(run())
+
+
+def test_puts_are_counted_and_touches_flush_on_the_writer(tmp_path: Path) -> None:
+    async def run() -> None:
+        async with AsyncStore(tmp_path, access_tracking="sync") as store:
+            refs = [await store.put(b"counted"), await store.put(b"counted"), await store.put(b"other")]
+            counters = store.store.metrics.summary()["counters"]
+            assert counters["put.objects"] == 3 and counters["put.dedup_hits"] == 1
+
+            with store.store._conn() as conn:
+                conn.execute("UPDATE objects SET last_accessed = 0")
+            writers: list[str] = []
+            write = store.store._write
+
+            def recording_write(fn):
+                writers.append(threading.current_thread().name)
+                return write(fn)
+
+            store.store._write = recording_write  # type: ignore[method-assign]
+            assert all(await asyncio.gather(*(store.has(ref) for ref in refs * 20)))
+            assert (await store.info(refs[2])).size == 5
+            # Queued behind the touch flushes.
+            assert await store.delete("vhs://" + "0" * 64) is False
+            assert writers and all(name.startswith("vhs-writer") for name in writers)
+            with store.store._conn() as conn:
+                assert conn.execute("SELECT MIN(last_accessed) FROM objects").fetchone()[0] > 0
+
+    asyncio.run(run())
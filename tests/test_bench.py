@@ -0,0 +1,13 @@
+from pathlib import Path
+
+from tldrs_vhs.bench import bench_store
+
+
+def test_bench_store_reports_each_size(tmp_path: Path) -> None:
+    result = bench_store((30, 60), ops=10, cli_samples=0, root=tmp_path)
+    assert [row["objects"] for row in result["sizes"]] == [30, 60]
+    ops = result["sizes"][1]["ops"]
+    assert set(ops) == {"put", "get", "has", "has_miss", "info", "ls", "stats", "gc"}
+    assert ops["put"]["n"] == 30 and ops["get"]["p99_ms"] >= ops["get"]["p50_ms"]
+    assert "cli" not in result["sizes"][0]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.bundle import BundleError, export_bundle, import_bundle
+from tldrs_vhs.store import Store
+
+
+def _log(n: int) -> bytes:
+    return b"".join(b"step %d: compiling module_%d\n" % (i, i % 97) for i in range(n))
+
+
+def _source(tmp_path: Path) -> tuple[Store, dict[str, bytes]]:
+    store = Store(root=tmp_path / "src", pack_max_bytes=64)
+    payloads = {
+        "raw": _log(2000),
+        "zlib": _log(3000),
+        "packed": b"tiny",
+        "chunked": os.urandom(300_000) + _log(5000),
+        "framed": _log(20_000),
+        "empty": b"",
+    }
+    refs = {
+        store.put(BytesIO(payloads["raw"])): payloads["raw"],
+        store.put(BytesIO(payloads["zlib"]), compress=True): payloads["zlib"],
+        store.put(BytesIO(payloads["packed"])): payloads["packed"],
+        store.put(BytesIO(payloads["chunked"]), compress=True, chunked=True): payloads["chunked"],
+        store.put(BytesIO(payloads["framed"]), compress=True, seekable=True, frame_size=4096): payloads["framed"],
+        store.put(BytesIO(payloads["empty"])): payloads["empty"],
+    }
+    return store, refs
+
+
+def test_roundtrip_keeps_stored_bytes_and_metadata(tmp_path: Path) -> None:
+    source, refs = _source(tmp_path)
+    with source._conn() as conn:
+        conn.execute("UPDATE objects SET created_at = 1000")
+    bundle = BytesIO()
+    sent = export_bundle(source, [*refs, *refs], bundle)
+    assert sent["objects"] == len(refs) and sent["chunks"] >= 1
+
+    target = Store(root=tmp_path / "dst")
+    result = import_bundle(target, BytesIO(bundle.getvalue()), batch_size=2)
+    assert result["imported"] == len(refs) and result["skipped"] == 0
+    for ref, payload in refs.items():
+        assert target.read_range(ref, 0) == payload
+        theirs, ours = source.info(ref), target.info(ref)
+        assert ours.created_at == 1000
+        assert ours.compression == theirs.compression
+        if theirs.storage != "packed":
+            assert (ours.storage, ours.stored_size) == (theirs.storage, theirs.stored_size)
+    # The framed container survives, so range reads stay cheap.
+    framed = [ref for ref in refs if target.info(ref).storage == "framed"]
+    assert len(framed) == 1 and target.read_range(framed[0], 4, 4) == b" 0: "
+
+    again = import_bundle(target, BytesIO(bundle.getvalue()))
+    assert (again["imported"], again["skipped"], again["chunks"]) == (0, len(refs), 0)
+    source.close()
+    target.close()
+
+
+def test_missing_ref_fails_before_writing(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"present"))
+    out = BytesIO()
+    with pytest.raises(FileNotFoundError):
+        export_bundle(store, [ref, "vhs://" + "0" * 64], out)
+    assert out.getvalue() == b""
+    with pytest.raises(ValueError):
+        export_bundle(store, ["nope"], out)
+
+
+def test_corrupt_and_truncated_bundles(tmp_path: Path) -> None:
+    source = Store(root=tmp_path / "src")
+    payloads = [b"object %d\n" % i * 200 for i in range(4)]
+    refs = [source.put(BytesIO(p)) for p in payloads]
+    bundle = BytesIO()
+    export_bundle(source, refs, bundle)
+    data = bundle.getvalue()
+
+    target = Store(root=tmp_path / "dst")
+    with pytest.raises(BundleError, match="Not a tldrs-vhs bundle"):
+        import_bundle(target, BytesIO(b"garbage" * 4))
+    corrupt = bytearray(data)
+    corrupt[data.index(payloads[2]) + 3] ^= 0xFF
+    with pytest.raises(BundleError, match="does not match"):
+        import_bundle(target, BytesIO(bytes(corrupt)), batch_size=1)
+    # Batches before the bad object were committed; the bad one was not.
+    assert [target.has(r) for r in refs] == [True, True, False, False]
+    assert not list((tmp_path / "dst" / "tmp").iterdir())
+
+    with pytest.raises(BundleError, match="Truncated"):
+        import_bundle(target, BytesIO(data[:-20]))
+    result = import_bundle(target, BytesIO(data))
+    assert (result["imported"], result["skipped"]) == (2, 2)
+    assert target.read_range(refs[3], 0) == payloads[3]
+
+
+def test_cli_export_import_pipe(tmp_path: Path) -> None:
+    source, refs = _source(tmp_path)
+    source.close()
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path / "src"), TLDRS_VHS_NO_DAEMON="1")
+    exported = subprocess.run(
+        [sys.executable, "-m", "tldrs_vhs.cli", "export"],
+        input="\n".join(refs).encode(),
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    env["TLDRS_VHS_HOME"] = str(tmp_path / "dst")
+    imported = subprocess.run(
+        [sys.executable, "-m", "tldrs_vhs.cli", "import"], input=exported.stdout, env=env, capture_output=True
+    )
+    assert imported.returncode == 0, imported.stderr
+    target = Store(root=tmp_path / "dst")
+    assert all(target.read_range(ref, 0) == payload for ref, payload in refs.items())
+    target.close()
@@ -0,0 +1,58 @@
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.store import Store
+
+
+def test_hot_cache_and_invalidation(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, cache_max_bytes=64 * 1024, cache_max_item_bytes=32 * 1024)
+    ref = store.put(BytesIO(b"system prompt " * 100), compress=True)
+    ref_big = store.put(BytesIO(b"b" * 40 * 1024))
+
+    out = BytesIO()
+    store.copy_to(ref, out)
+    # Served from memory even if the blob file disappears
+    store._blob_path(ref[6:]).rename(tmp_path / "aside")
+    assert store.read_range(ref, 0, 6) == b"system"
+    assert store.has(ref) is True
+    (tmp_path / "aside").rename(store._blob_path(ref[6:]))
+    assert store.read_range(ref_big, 0, 1) == b"b"
+
+    stats = store.stats()["cache"]
+    assert stats["entries"] == 1 and stats["hits"] == 1 and stats["misses"] == 2
+
+    assert store.delete(ref) is True
+    assert store.has(ref) is False
+    assert store.stats()["cache"]["entries"] == 0
+
+
+def test_negative_cache_cleared_by_put(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, cache_max_bytes=1024)
+    ref = "vhs://" + __import__("hashlib").sha256(b"later").hexdigest()
+    assert store.has(ref) is False
+    assert store.has(ref) is False
+    assert store.stats()["cache"]["negative_hits"] == 1
+    assert store.put(BytesIO(b"later")) == ref
+    assert store.has(ref) is True
+
+
+def test_negative_cache_cleared_by_expect_hash_hit(tmp_path: Path) -> None:
+    import hashlib
+
+    store = Store(root=tmp_path, cache_max_bytes=1024)
+    ref = "vhs://" + hashlib.sha256(b"from elsewhere").hexdigest()
+    assert store.has(ref) is False
+    # Another process stores it; this store's negative entry is now stale.
+    other = Store(root=tmp_path)
+    other.put(BytesIO(b"from elsewhere"))
+    other.close()
+    assert store.put(BytesIO(b"from elsewhere"), expect_hash=ref) == ref
+    assert store.has(ref) is True
+
+    ref = "vhs://" + hashlib.sha256(b"file from elsewhere").hexdigest()
+    assert store.has(ref) is False
+    Store(root=tmp_path).put(BytesIO(b"file from elsewhere"))
+    source = tmp_path / "source"
+    source.write_bytes(b"file from elsewhere")
+    assert store.put_file(source, expect_hash=ref) == ref
+    assert store.has(ref) is True
@@ -0,0 +1,88 @@
+import os
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.chunking import AVG_SIZE, MAX_SIZE, iter_chunks
+from tldrs_vhs.store import Store
+
+
+def _log(changed_line: int = -1) -> bytes:
+    lines = []
+    for i in range(20000):
+        status = "FAILED" if i == changed_line else "PASSED"
+        lines.append(f"tests/test_mod_{i % 50}.py::test_case_{i} {status}\n".encode())
+    return b"".join(lines)
+
+
+def test_chunker_is_content_defined() -> None:
+    base = _log()
+    edited = _log(changed_line=10000)
+    a = list(iter_chunks(BytesIO(base)))
+    b = list(iter_chunks(BytesIO(edited)))
+    assert b"".join(a) == base
+    assert len(set(a) & set(b)) >= len(a) - 2
+
+
+def test_chunk_size_does_not_depend_on_line_length() -> None:
+    for line_bytes in (16, 60, 400, 3000):
+        lines = (os.urandom(line_bytes // 2).hex().encode()[: line_bytes - 1] for _ in range((8 << 20) // line_bytes))
+        data = b"\n".join(lines) + b"\n"
+        sizes = [len(c) for c in iter_chunks(BytesIO(data))]
+        assert sum(sizes) == len(data)
+        assert 0.6 * AVG_SIZE < len(data) / len(sizes) < 1.8 * AVG_SIZE, line_bytes
+    # No line breaks: fixed-size cuts.
+    sizes = [len(c) for c in iter_chunks(BytesIO(b"x" * (MAX_SIZE * 3 + 5)))]
+    assert sizes == [MAX_SIZE] * 3 + [5]
+
+
+def test_newline_free_data_only_dedups_when_aligned() -> None:
+    blob = os.urandom(20 * MAX_SIZE).replace(b"\n", b" ")
+    base = set(iter_chunks(BytesIO(blob)))
+    # An edit in place keeps the cuts where they were: one chunk changes.
+    edited = bytearray(blob)
+    edited[5 * MAX_SIZE + 10] ^= 1
+    assert len(base - set(iter_chunks(BytesIO(bytes(edited))))) == 1
+    # An insertion shifts every later fixed-size cut: nothing after it is shared.
+    inserted = blob[: 5 * MAX_SIZE + 10] + b"inserted" + blob[5 * MAX_SIZE + 10 :]
+    shared = base & set(iter_chunks(BytesIO(inserted)))
+    assert len(shared) == 5
+
+
+def test_chunked_dedup_roundtrip_and_delete(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    base, edited = _log(), _log(changed_line=10000)
+    ref_a = store.put(BytesIO(base), chunked=True, compress=True)
+    ref_b = store.put(BytesIO(edited), chunked=True, compress=True)
+    assert ref_a != ref_b
+    assert store.has(ref_b) is True
+
+    out = BytesIO()
+    store.copy_to(ref_b, out)
+    assert out.getvalue() == edited
+
+    stats = store.stats()
+    assert stats["chunked_objects"] == 2
+    assert stats["dedup_ratio"] > 1.8
+
+    assert store.delete(ref_a) is True
+    out = BytesIO()
+    store.copy_to(ref_b, out)
+    assert out.getvalue() == edited
+
+    assert store.delete(ref_b) is True
+    assert store.stats()["chunks"] == 0
+    assert not [p for p in (tmp_path / "chunks").rglob("*") if p.is_file()]
+
+
+def test_repeated_chunked_payload_in_one_batch(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    payload = _log()
+    refs = store.put_many([BytesIO(payload), BytesIO(payload)], chunked=True)
+    assert refs[0] == refs[1]
+    assert store.read_range(refs[0], 0) == payload
+    with store._conn() as conn:
+        assert conn.execute("SELECT MAX(refcount) FROM chunks").fetchone()[0] == 1
+    assert store.delete(refs[0]) is True
+    assert store.stats()["chunks"] == 0 and store.stats()["count"] == 0
+    assert not [p for p in (tmp_path / "chunks").rglob("*") if p.is_file()]
+    assert not list((tmp_path / "tmp").iterdir())
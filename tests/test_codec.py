@@ -0,0 +1,73 @@
+import os
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.codec import CodecError
+from tldrs_vhs.store import Store
+
+TEXT = b'{"level": "info", "msg": "test passed", "duration_ms": 12}\n' * 2000
+
+
+def _roundtrip(store: Store, ref: str) -> bytes:
+    out = BytesIO()
+    store.copy_to(ref, out)
+    return out.getvalue()
+
+
+def test_zlib_level(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(TEXT), codec="zlib", level=9)
+    info = store.info(ref)
+    assert info is not None and info.compression == "zlib"
+    assert info.stored_size < info.size
+    assert _roundtrip(store, ref) == TEXT
+
+    with pytest.raises(CodecError):
+        store.put(BytesIO(b"x"), codec="zlib", level=42)
+
+
+def test_auto_codec(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref_text = store.put(BytesIO(TEXT), codec="auto")
+    info_text = store.info(ref_text)
+    assert info_text is not None and info_text.compression in ("lz4", "zstd", "zlib")
+    assert _roundtrip(store, ref_text) == TEXT
+
+    noise = os.urandom(64 * 1024)
+    ref_noise = store.put(BytesIO(noise), codec="auto")
+    info_noise = store.info(ref_noise)
+    assert info_noise is not None and info_noise.compression == ""
+
+
+def test_unknown_codec_is_an_error(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(TEXT), codec="zlib")
+    with store._conn() as conn:
+        conn.execute("UPDATE objects SET compression = 'bogus'")
+    with pytest.raises(CodecError):
+        _roundtrip(store, ref)
+
+
+@pytest.mark.parametrize("name,module", [("zstd", "zstandard"), ("lz4", "lz4.frame")])
+def test_optional_codecs(tmp_path: Path, name: str, module: str) -> None:
+    pytest.importorskip(module)
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(TEXT), codec=name, level=1)
+    info = store.info(ref)
+    assert info is not None and info.compression == name
+    assert _roundtrip(store, ref) == TEXT
+
+
+def test_train_dict(tmp_path: Path) -> None:
+    pytest.importorskip("zstandard")
+    store = Store(root=tmp_path)
+    for i in range(200):
+        store.put(BytesIO(f'{{"id": {i}, "status": "ok", "path": "src/mod_{i % 7}.py"}}\n'.encode()))
+    dict_id = store.train_dict(dict_size=4096)
+    sample = b'{"id": 999, "status": "ok", "path": "src/mod_3.py"}\n'
+    ref = store.put(BytesIO(sample), codec="zstd", dict_id="latest")
+    info = store.info(ref)
+    assert info is not None and info.compression == f"zstd:{dict_id}"
+    assert _roundtrip(store, ref) == sample
@@ -0,0 +1,39 @@
+import multiprocessing
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.store import Store
+
+
+def _writer(args: tuple[str, int]) -> list[str]:
+    root, worker = args
+    store = Store(root=Path(root))
+    refs = []
+    for i in range(20):
+        refs.append(store.put(BytesIO(b"shared payload")))
+        refs.append(store.put(BytesIO(f"worker {worker} item {i}".encode())))
+    store.close()
+    return refs
+
+
+def test_connection_is_reused_and_wal(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    assert store._conn() is store._conn()
+    mode = store._conn().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+    store.close()
+
+
+def test_parallel_writers(tmp_path: Path) -> None:
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(8) as pool:
+        results = pool.map(_writer, [(str(tmp_path), w) for w in range(8)])
+
+    shared = {refs[0] for refs in results}
+    assert len(shared) == 1
+
+    store = Store(root=tmp_path)
+    assert store.stats()["count"] == 1 + 8 * 20
+    blobs = [p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 1 + 8 * 20
+    assert not list((tmp_path / "tmp").iterdir())
@@ -0,0 +1,156 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.recovery import TEMP_GRACE_S, recover
+from tldrs_vhs.store import RECOVERY_MARKER, Store, _boot_id
+
+
+def test_modes_set_sqlite_sync_and_fsync_blobs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with pytest.raises(ValueError):
+        Store(root=tmp_path, durability="sometimes")
+    synced: list[int] = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), real_fsync(fd)))
+
+    fast = Store(root=tmp_path / "fast")
+    assert fast._conn().execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    fast.put(BytesIO(b"fast" * 1000))
+    assert synced == []
+    fast.close()
+
+    monkeypatch.setenv("TLDRS_VHS_DURABILITY", "strict")
+    strict = Store(root=tmp_path / "strict", pack_max_bytes=64)
+    assert strict._conn().execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    ref = strict.put(BytesIO(b"strict" * 1000))
+    # The blob, and blobs/<aa>/<bb>, blobs/<aa> and blobs/ when new.
+    assert len(synced) == 4
+    strict.put(BytesIO(os.urandom(200_000)), chunked=True, compress=True)
+    strict.put(BytesIO(b"tiny"))
+    assert strict.read_range(ref, 0, 6) == b"strict"
+    strict.close()
+
+
+def test_batched_puts_share_commits(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, durability="batched", group_commit_window_ms=50)
+    start = threading.Barrier(8)
+    refs: dict[int, str] = {}
+
+    def put(i: int) -> None:
+        start.wait()
+        refs[i] = store.put(BytesIO(b"payload %d\n" % i * 100))
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(store.read_range(refs[i], 0, 9) == b"payload %d" % i for i in range(8))
+    assert store.metrics.summary()["counters"]["put.group_commits"] < 8
+    assert store.put_many([BytesIO(b"a"), BytesIO(b"b")]) == [store.put(BytesIO(b"a")), store.put(BytesIO(b"b"))]
+    store.close()
+
+
+def test_batched_puts_of_one_chunked_payload(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, durability="batched", group_commit_window_ms=50)
+    payload = b"".join(b"line %d of a shared log\n" % i for i in range(40000))
+    start = threading.Barrier(4)
+    refs: list[str] = []
+
+    def put() -> None:
+        start.wait()
+        refs.append(store.put(BytesIO(payload), chunked=True))
+
+    threads = [threading.Thread(target=put) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(refs)) == 1 and store.read_range(refs[0], 0) == payload
+    assert store.delete(refs[0]) is True
+    assert store.stats()["chunks"] == 0
+    assert not [p for p in (tmp_path / "chunks").rglob("*") if p.is_file()]
+    store.close()
+
+
+def test_open_skips_recovery_for_puts_in_flight(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import tldrs_vhs.recovery
+
+    Store(root=tmp_path).close()
+    runs: list[Store] = []
+    monkeypatch.setattr(tldrs_vhs.recovery, "recover", lambda store: runs.append(store))
+    in_flight = tmp_path / "tmp" / f"upload-{os.getpid()}-abc"
+    in_flight.parent.mkdir(exist_ok=True)
+    in_flight.write_bytes(b"partial")
+    Store(root=tmp_path).close()
+    assert runs == []
+
+    old = time.time() - 2 * TEMP_GRACE_S
+    os.utime(in_flight, (old, old))
+    Store(root=tmp_path).close()
+    assert len(runs) == 1
+
+
+@pytest.mark.skipif(_boot_id() is None, reason="needs a boot id")
+def test_first_open_after_reboot_drops_lost_data(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, pack_max_bytes=64)
+    intact = store.put(BytesIO(b"survived" * 100))
+    truncated = store.put(BytesIO(b"truncated" * 100))
+    missing = store.put(BytesIO(b"missing" * 100))
+    packed = store.put(BytesIO(b"packed tail"))
+    chunked = store.put(BytesIO(os.urandom(200_000)), chunked=True)
+    store.close()
+    assert (tmp_path / RECOVERY_MARKER).read_text().split()[0] == _boot_id()
+
+    # What a power loss in fast mode can leave behind.
+    store._blob_path(truncated[6:]).write_bytes(b"")
+    store._blob_path(missing[6:]).unlink()
+    with open(store._pack_path(1), "r+b") as pack:
+        pack.truncate(5)
+    with store._conn() as conn:
+        chunk = conn.execute("SELECT chunk_hash FROM object_chunks LIMIT 1").fetchone()[0]
+    store.close()
+    store._chunk_path(chunk).unlink()
+    (tmp_path / RECOVERY_MARKER).write_text(f"previous-boot {int(time.time()) - 60}\n")
+
+    store = Store(root=tmp_path)
+    assert store.has(intact) and store.read_range(intact, 0, 8) == b"survived"
+    assert not any(store.has(ref) for ref in (truncated, missing, packed, chunked))
+    assert store.stats()["count"] == 1 and store.stats()["chunks"] == 0
+    assert (tmp_path / RECOVERY_MARKER).read_text().split()[0] == _boot_id()
+    # The content can be stored again.
+    assert store.put(BytesIO(b"truncated" * 100)) == truncated
+    assert store.read_range(truncated, 0, 9) == b"truncated"
+    store.close()
+
+
+def test_open_removes_temps_of_dead_processes(tmp_path: Path) -> None:
+    Store(root=tmp_path).close()
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    pid = int(dead.stdout)
+    tmp = tmp_path / "tmp"
+    tmp.mkdir()
+    old = time.time() - 2 * TEMP_GRACE_S
+    stale = tmp / f"upload-{pid}-abc"
+    fresh = tmp / f"upload-{pid}-def"
+    mine = tmp / f"upload-{os.getpid()}-123"
+    for path in (stale, fresh, mine):
+        path.write_bytes(b"partial")
+    os.utime(stale, (old, old))
+    os.utime(mine, (old, old))
+
+    Store(root=tmp_path).close()
+    assert not stale.exists() and fresh.exists() and mine.exists()
+
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"kept"))
+    store._blob_path(ref[6:]).unlink()
+    report = recover(store, full=True)
+    assert report["dropped"] == [ref[6:]] and not store.has(ref)
+    store.close()
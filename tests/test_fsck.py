@@ -0,0 +1,50 @@
+import os
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.fsck import fsck
+from tldrs_vhs.store import Store
+
+
+def test_fsck_detects_and_repairs(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref_ok = store.put(BytesIO(b"fine" * 100), compress=True)
+    ref_rot = store.put(BytesIO(b"bit rot here"))
+    ref_gone = store.put(BytesIO(b"deleted behind our back"))
+    ref_chunked = store.put(BytesIO(os.urandom(100_000)), chunked=True)
+
+    store._blob_path(ref_rot[6:]).write_bytes(b"bit rot HERE")
+    store._blob_path(ref_gone[6:]).unlink()
+    orphan = store._blob_path("f" * 64)
+    orphan.parent.mkdir(parents=True, exist_ok=True)
+    orphan.write_bytes(b"stray")
+    (tmp_path / "tmp").mkdir(exist_ok=True)
+    temp = tmp_path / "tmp" / "upload-1-abc"
+    temp.write_bytes(b"partial")
+    os.utime(temp, (0, 0))
+
+    report = fsck(store, workers=2)
+    assert report["checked"] == 4 and report["ok"] == 2
+    assert [e["hash"] for e in report["corrupt"]] == [ref_rot[6:]]
+    assert [e["hash"] for e in report["missing"]] == [ref_gone[6:]]
+    assert report["orphans"] == [str(orphan)]
+    assert report["stale_temps"] == [str(temp)]
+
+    report = fsck(store, repair=True)
+    assert report["repaired"] == 4
+    assert not orphan.exists() and not temp.exists()
+    clean = fsck(store)
+    assert clean["checked"] == 2 and clean["ok"] == 2 and not clean["orphans"]
+    assert store.has(ref_ok) and store.has(ref_chunked)
+
+
+def test_fsck_resumes_from_cursor(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    for i in range(600):
+        store.put(BytesIO(f"object {i}".encode()))
+
+    first = fsck(store, budget_ms=0)
+    assert first["complete"] is False and first["checked"] == 256
+    second = fsck(store, resume=True)
+    assert second["complete"] is True and second["checked"] == 344
+    assert not (tmp_path / "fsck.cursor").exists()
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timezone
 from io import BytesIO
 from pathlib import Path
@@ -5,7 +6,7 @@ from pathlib import Path
 from tldrs_vhs.store import Store
 
 
-def _set_last_accessed(store: Store, hash_hex: str, ts: str) -> None:
+def _set_last_accessed(store: Store, hash_hex: str, ts: int) -> None:
     with store._conn() as conn:
         conn.execute(
             "UPDATE objects SET last_accessed = ? WHERE hash = ?",
@@ -23,7 +24,7 @@ def test_gc_max_age(tmp_path: Path) -> None:
     ref_old = store.put(BytesIO(b"old"))
     ref_new = store.put(BytesIO(b"new"))
 
-    old_ts = datetime(2000, 1, 1, tzinfo=timezone.utc).isoformat()
+    old_ts = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
     _set_last_accessed(store, _hash_from_ref(ref_old), old_ts)
 
     result = store.gc(max_age_days=1, max_size_mb=None)
@@ -62,9 +63,9 @@ def test_gc_keep_last(tmp_path: Path) -> None:
     ref_mid = store.put(BytesIO(b"mid"))
     ref_new = store.put(BytesIO(b"new"))
 
-    old_ts = datetime(2001, 1, 1, tzinfo=timezone.utc).isoformat()
-    mid_ts = datetime(2002, 1, 1, tzinfo=timezone.utc).isoformat()
-    new_ts = datetime(2003, 1, 1, tzinfo=timezone.utc).isoformat()
+    old_ts = int(datetime(2001, 1, 1, tzinfo=timezone.utc).timestamp())
+    mid_ts = int(datetime(2002, 1, 1, tzinfo=timezone.utc).timestamp())
+    new_ts = int(datetime(2003, 1, 1, tzinfo=timezone.utc).timestamp())
 
     _set_last_accessed(store, _hash_from_ref(ref_old), old_ts)
     _set_last_accessed(store, _hash_from_ref(ref_mid), mid_ts)
@@ -75,3 +76,84 @@ def test_gc_keep_last(tmp_path: Path) -> None:
     assert store.has(ref_new) is True
     assert store.has(ref_old) is False
     assert store.has(ref_mid) is False
+
+
+def test_gc_keep_last_with_tied_access_times(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    refs = [store.put(BytesIO(f"tied {i}".encode())) for i in range(5)]
+    ts = int(datetime(2001, 1, 1, tzinfo=timezone.utc).timestamp())
+    for ref in refs:
+        _set_last_accessed(store, _hash_from_ref(ref), ts)
+
+    result = store.gc(max_age_days=None, max_size_mb=0, keep_last=2)
+    assert result["deleted"] == 3
+    assert sum(store.has(ref) for ref in refs) == 2
+    assert store.gc(max_age_days=None, max_size_mb=0, keep_last=10)["deleted"] == 0
+
+
+def _get_last_accessed(store: Store, hash_hex: str) -> int:
+    with store._conn() as conn:
+        return conn.execute(
+            "SELECT last_accessed FROM objects WHERE hash = ?", (hash_hex,)
+        ).fetchone()[0]
+
+
+def test_buffered_touches_flush_before_gc(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"read later"))
+    hash_hex = _hash_from_ref(ref)
+
+    old_ts = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
+    _set_last_accessed(store, hash_hex, old_ts)
+    assert store.has(ref) is True
+    # The read is buffered, not written yet
+    assert _get_last_accessed(store, hash_hex) == old_ts
+
+    # GC flushes pending touches first, so the recent read protects the blob
+    result = store.gc(max_age_days=1, max_size_mb=None)
+    assert result["deleted"] == 0
+    assert _get_last_accessed(store, hash_hex) != old_ts
+
+
+def test_sync_touch_respects_granularity(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, access_tracking="sync", touch_granularity_s=3600)
+    ref = store.put(BytesIO(b"fresh"))
+    hash_hex = _hash_from_ref(ref)
+    recent = int(time.time())
+    _set_last_accessed(store, hash_hex, recent)
+
+    store.info(ref)
+    assert _get_last_accessed(store, hash_hex) == recent
+
+    old_ts = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
+    _set_last_accessed(store, hash_hex, old_ts)
+    store.info(ref)
+    assert _get_last_accessed(store, hash_hex) >= recent
+
+
+def test_gc_incremental_batches_and_budget(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    refs = [store.put(BytesIO(f"old {i}".encode())) for i in range(5)]
+    ref_new = store.put(BytesIO(b"new"))
+    for i, ref in enumerate(refs):
+        _set_last_accessed(store, _hash_from_ref(ref), 1000 + i)
+
+    partial = store.gc(max_age_days=1, max_size_mb=None, batch_size=2, budget_ms=0)
+    assert partial == {"deleted": 2, "freed_bytes": 10, "batches": 1, "complete": False}
+    # Oldest first
+    assert [info.hash for info in store.list(limit=10)][-3:] == [_hash_from_ref(r) for r in refs[4:1:-1]]
+
+    rest = store.gc(max_age_days=1, max_size_mb=None, batch_size=2)
+    assert rest["deleted"] == 3 and rest["batches"] == 2 and rest["complete"] is True
+    assert store.has(ref_new) is True
+
+
+def test_gc_size_cap_uses_stored_size(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref_big = store.put(BytesIO(b"a" * 4 * 1024 * 1024), compress=True)
+    ref_raw = store.put(BytesIO(b"raw" * 1000))
+    _set_last_accessed(store, _hash_from_ref(ref_big), 1000)
+
+    # 4 MiB logical, but only a few KiB on disk: under a 1 MB cap
+    assert store.gc(max_age_days=None, max_size_mb=1)["deleted"] == 0
+    assert store.has(ref_big) is True and store.has(ref_raw) is True
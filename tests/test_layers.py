@@ -0,0 +1,104 @@
+import os
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.store import Store
+
+
+def _team_cache(root: Path) -> dict[str, bytes]:
+    store = Store(root=root, pack_max_bytes=64)
+    payloads = [b"shared build log\n" * 500, b"tiny", os.urandom(200_000) + b"tail\n" * 1000]
+    refs = {
+        store.put(BytesIO(payloads[0]), compress=True): payloads[0],
+        store.put(BytesIO(payloads[1])): payloads[1],
+        store.put(BytesIO(payloads[2]), compress=True, chunked=True): payloads[2],
+    }
+    store.close()
+    return refs
+
+
+def _files(root: Path) -> list[Path]:
+    # WAL readers may create meta.sqlite-shm/-wal; those are SQLite's own.
+    return sorted(p for p in root.rglob("*") if not p.name.startswith("meta.sqlite-"))
+
+
+def test_reads_fall_through_and_puts_skip_lower_content(tmp_path: Path) -> None:
+    refs = _team_cache(tmp_path / "team")
+    team_files = _files(tmp_path / "team")
+    local = Store(root=tmp_path / "local", layers=[tmp_path / "missing", tmp_path / "team"])
+    for ref, payload in refs.items():
+        assert local.has(ref)
+        assert local.info(ref).size == len(payload)
+        assert local.read_range(ref, 0) == payload
+        assert local.read_range(ref, 3, 5) == payload[3:8]
+    out = tmp_path / "out.bin"
+    local.get(next(iter(refs)), out=out)
+    assert out.read_bytes() == next(iter(refs.values()))
+    assert local.get_many(list(refs), tmp_path / "many")[next(iter(refs))] is not None
+    assert local.has_many(["vhs://" + "0" * 64]) == {"vhs://" + "0" * 64: False}
+
+    # Content a lower layer holds is not stored again, whether it arrives
+    # as a stream or a file.
+    assert local.put(BytesIO(b"shared build log\n" * 500)) in refs
+    src = tmp_path / "tiny.txt"
+    src.write_bytes(b"tiny")
+    assert local.put_file(src) in refs
+    assert local.stats()["count"] == 0
+    fresh = local.put(BytesIO(b"only local"))
+    assert local.stats()["count"] == 1 and local.stats()["layers"] == [str(tmp_path / "team")]
+    local.close()
+    assert _files(tmp_path / "team") == team_files
+    assert not Store(root=tmp_path / "team").has(fresh)
+
+
+def test_promote_reads_copies_objects_up(tmp_path: Path) -> None:
+    refs = _team_cache(tmp_path / "team")
+    local = Store(root=tmp_path / "local", layers=[tmp_path / "team"], promote_reads=True)
+    for ref, payload in refs.items():
+        assert local.read_range(ref, 0) == payload
+    assert local.stats()["count"] == len(refs)
+    local.close()
+
+    # The promoted copies stand on their own.
+    alone = Store(root=tmp_path / "local", layers=[])
+    for ref, payload in refs.items():
+        assert alone.read_range(ref, 0) == payload
+    alone.close()
+
+
+def test_layers_from_env_and_read_only_stores(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    refs = _team_cache(tmp_path / "team")
+    monkeypatch.setenv("TLDRS_VHS_PATH", os.pathsep.join([str(tmp_path / "team"), ""]))
+    local = Store(root=tmp_path / "local")
+    assert all(local.has(ref) for ref in refs)
+    local.close()
+
+    team = Store(root=tmp_path / "team", read_only=True)
+    assert all(team.has(ref) for ref in refs)
+    with pytest.raises(ValueError, match="read-only"):
+        team.put(BytesIO(b"new"))
+    with pytest.raises(FileNotFoundError):
+        Store(root=tmp_path / "nothing", read_only=True)
+    assert not (tmp_path / "nothing").exists()
+
+
+def test_unopenable_layers_are_skipped(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    refs = _team_cache(tmp_path / "team")
+    old = Store(root=tmp_path / "old")
+    old_ref = old.put(BytesIO(b"from an older release"))
+    with old._conn() as conn:
+        conn.execute("PRAGMA user_version = 1")
+    old.close()
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "meta.sqlite").write_bytes(b"not a database" * 100)
+
+    local = Store(root=tmp_path / "local", layers=[tmp_path / "old", tmp_path / "broken", tmp_path / "team"])
+    assert all(local.has(ref) for ref in refs)
+    assert not local.has(old_ref)
+    assert local.stats()["layers"] == [str(tmp_path / "team")]
+    assert local.metrics.summary()["counters"]["layers.skipped"] == 2
+    err = capsys.readouterr().err
+    assert "skipping layer" in err and "older schema" in err
+    local.close()
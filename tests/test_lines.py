@@ -0,0 +1,86 @@
+import os
+import random
+import subprocess
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.lines import LineIndexer, scan_lines
+from tldrs_vhs.store import Store
+
+
+def _expected(data: bytes, start: int, end) -> bytes:
+    lines = data.splitlines(keepends=True)
+    return b"".join(lines[start - 1:end])
+
+
+def test_line_ranges_match_with_and_without_index(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, line_index_stride=1000)
+    rng = random.Random(7)
+    data = b"".join(b"%d:%s\n" % (i, b"y" * rng.randrange(0, 300)) for i in range(1, 3001)) + b"no newline"
+    refs = [
+        store.put(BytesIO(data), line_index=True),
+        store.put(BytesIO(data + b"\n"), compress=True, line_index=True),
+        store.put(BytesIO(data + b"\n\n"), compress=True),
+    ]
+    assert store.info(refs[0]).lines == 3001
+    assert store.info(refs[1]).storage == "framed"
+    assert store.info(refs[2]).lines is None
+    for ref in refs:
+        content = store.read_range(ref, 0)
+        for start, end in [(1, 1), (1, 5), (999, 1003), (2999, 3001), (3001, None), (2500, None), (4000, 4005)]:
+            assert store.read_lines(ref, start, end) == _expected(content, start, end), (ref, start, end)
+    with pytest.raises(ValueError):
+        store.read_lines(refs[0], 0, 3)
+    with pytest.raises(ValueError):
+        store.read_lines(refs[0], 5, 4)
+
+
+def test_index_skips_binary_and_follows_the_object(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, line_index=True)
+    binary = store.put(BytesIO(b"\0\x01\n" * 100))
+    empty = store.put(BytesIO(b""))
+    assert store.info(binary).lines is None and store.info(empty).lines is None
+    assert store.read_lines(binary, 2, 2) == b"\0\x01\n"
+    assert store.read_lines(empty, 1) == b""
+
+    src = tmp_path / "build.log"
+    src.write_bytes(b"".join(b"line %d\n" % i for i in range(1, 101)))
+    ref = store.put_file(src, "link")
+    assert store.info(ref).lines == 100
+    assert store.read_lines(ref, 42, 43) == b"line 42\nline 43\n"
+    store.delete(ref)
+    with store._conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM line_index").fetchone()[0] == 0
+
+
+def test_cli_lines_leaves_out_alone_on_a_bad_ref(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store")
+    ref = store.put(BytesIO(b"".join(b"line %d\n" % i for i in range(1, 11))))
+    store.close()
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path / "store"), TLDRS_VHS_NO_DAEMON="1")
+    out = tmp_path / "out.txt"
+    out.write_bytes(b"keep me")
+
+    def get_lines(ref: str) -> subprocess.CompletedProcess:
+        cmd = [sys.executable, "-m", "tldrs_vhs.cli", "get", ref, "--lines", "2:3", "--out", str(out)]
+        return subprocess.run(cmd, env=env, capture_output=True, text=True)
+
+    for bad in ("vhs://" + "0" * 64, "not-a-ref"):
+        result = get_lines(bad)
+        assert result.returncode == 1 and result.stderr.startswith("Error:")
+        assert out.read_bytes() == b"keep me"
+    assert get_lines(ref).returncode == 0
+    assert out.read_bytes() == b"line 2\nline 3\n"
+
+
+def test_indexer_counts_across_blocks() -> None:
+    indexer = LineIndexer(stride=4)
+    blocks = [b"ab\ncd", b"\n", b"", b"efgh\nij"]
+    assert b"".join(indexer.tee(blocks)) == b"ab\ncd\nefgh\nij"
+    lines, stride, _ = indexer.result()
+    assert (lines, stride) == (4, 4)
+    assert list(indexer.counts) == [1, 2, 3]
+    assert b"".join(scan_lines(iter(blocks), 2, 3)) == b"cd\nefgh\n"
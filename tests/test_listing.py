@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs import tiering
+from tldrs_vhs.store import Store, recount_totals
+
+
+def _assert_totals_exact(store: Store) -> None:
+    conn = store._conn()
+    assert not recount_totals(conn)
+    conn.rollback()
+
+
+def test_totals_follow_every_write_path(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, pack_max_bytes=64)
+    refs = [store.put(BytesIO(b"small %d" % i)) for i in range(20)]
+    refs += [store.put(BytesIO(os.urandom(200_000) + b"%d" % i), compress=True, chunked=True) for i in range(3)]
+    refs += [store.put(BytesIO(b"log line\n" * 5000 + b"%d" % i)) for i in range(5)]
+    _assert_totals_exact(store)
+    assert store.stats()["count"] == len(refs)
+
+    store.delete(refs[0])
+    store.delete(refs[21])
+    _assert_totals_exact(store)
+
+    # A row whose blob vanished is replaced on the next put.
+    store._blob_path(refs[-1][len("vhs://"):]).unlink()
+    assert store.put(BytesIO(b"log line\n" * 5000 + b"4")) == refs[-1]
+    _assert_totals_exact(store)
+
+    with store._conn() as conn:
+        conn.execute("UPDATE objects SET last_accessed = 0")
+    tiering.run(store, cold_after_days=1)
+    _assert_totals_exact(store)
+    store.gc(1, None, keep_last=4)
+    _assert_totals_exact(store)
+    assert store.stats()["count"] == 4
+    store.close()
+
+
+def test_fsck_repair_recounts_drifted_totals(tmp_path: Path) -> None:
+    from tldrs_vhs.fsck import fsck
+
+    store = Store(root=tmp_path)
+    store.put(BytesIO(b"counted"))
+    with store._conn() as conn:
+        conn.execute("UPDATE totals SET objects = 99")
+    assert store.stats()["count"] == 99
+    assert fsck(store, repair=True)["repaired"] == 1
+    assert store.stats()["count"] == 1
+
+
+def test_keyset_pages_and_filters(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    refs = [store.put(BytesIO(b"x" * i), compress=i % 2 == 0) for i in range(1, 31)]
+    with store._conn() as conn:
+        # Ties on last_accessed are broken by hash.
+        conn.execute("UPDATE objects SET last_accessed = size / 10, created_at = 1000")
+    expected = store.list(limit=None)
+    assert len(expected) == len(refs)
+
+    seen, after = [], None
+    while True:
+        page = store.list(limit=7, after=after)
+        if not page:
+            break
+        seen += page
+        after = page[-1].cursor
+    assert [i.hash for i in seen] == [i.hash for i in expected]
+    assert [i.hash for i in store.iter_objects(page_size=4)] == [i.hash for i in expected]
+
+    assert {i.size for i in store.list(None, min_size=10, max_size=12)} == {10, 11, 12}
+    assert all(i.compression == "" for i in store.list(None, compression=""))
+    assert len(store.list(None, older_than_days=1)) == 30
+    assert store.list(None, newer_than_days=1) == []
+    with pytest.raises(ValueError, match="Bad cursor"):
+        store.list(after="nope")
+    store.close()
+
+
+def test_cli_ls_streams_with_cursor(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    for i in range(5):
+        store.put(BytesIO(b"object %d" % i))
+    store.close()
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path), TLDRS_VHS_NO_DAEMON="1")
+
+    def ls(*args: str) -> list[str]:
+        out = subprocess.run(
+            [sys.executable, "-m", "tldrs_vhs.cli", "ls", "--jsonl", *args],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.splitlines()
+
+    first = ls("--limit", "3")
+    cursor = first[-1].split('"cursor": "')[1].rstrip('"}')
+    rest = ls("--after", cursor, "--compression", "none")
+    assert len(first) == 3 and len(rest) == 2
+    assert len(ls("--limit", "0")) == 5
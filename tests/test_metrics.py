@@ -0,0 +1,68 @@
+import json
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.store import Store
+
+
+def test_metrics_persist_across_stores(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"x" * 10_000), compress=True)
+    store.put(BytesIO(b"x" * 10_000), compress=True)
+    assert store.read_range(ref, 0, 100) == b"x" * 100
+    assert store.has(ref) and not store.has("vhs://" + "0" * 64)
+    store.close()
+
+    store = Store(root=tmp_path)
+    store.copy_to(ref, BytesIO())
+    summary = store.metrics.summary()
+    counters = summary["counters"]
+    assert counters["put.calls"] == 2 and counters["put.dedup_hits"] == 1
+    assert counters["get.calls"] == 2 and counters["get.bytes_out"] == 10_100
+    assert counters["has.hits"] == 1 and counters["has.misses"] == 1
+    assert summary["derived"]["dedup_hit_ratio"] == 0.5
+    assert 0 < summary["derived"]["compression_savings"] < 1
+    put = summary["operations"]["put"]
+    assert put["count"] == 2 and {"compress", "hash", "lock", "metadata"} <= set(put["phases"])
+    store.close()
+    # That store only read, so it left the file alone.
+    assert json.loads((tmp_path / "metrics.json").read_text())["counters"]["get.calls"] == 1
+
+
+def test_read_only_process_does_not_rewrite_metrics(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    assert not store.has("vhs://" + "0" * 64)
+    store.close()
+    assert not (tmp_path / "metrics.json").exists()
+
+    store = Store(root=tmp_path)
+    store.put(BytesIO(b"written"))
+    store.has("vhs://" + "0" * 64)
+    store.close()
+    counters = json.loads((tmp_path / "metrics.json").read_text())["counters"]
+    assert counters["put.calls"] == 1 and counters["has.misses"] == 1
+
+
+def test_prometheus_textfile_and_errors(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    try:
+        store.copy_to("vhs://" + "0" * 64, BytesIO())
+    except FileNotFoundError:
+        pass
+    store.put(BytesIO(b"hello"))
+    out = tmp_path / "vhs.prom"
+    store.metrics.write_prometheus(out, {"count": 1})
+    text = out.read_text()
+    assert "tldrs_vhs_store_count 1" in text
+    assert "tldrs_vhs_get_errors_total 1" in text
+    assert 'tldrs_vhs_operation_seconds_bucket{op="put",le="+Inf"} 1' in text
+    assert 'tldrs_vhs_phase_seconds_count{op="put",phase="metadata"} 1' in text
+    assert text.count("# TYPE tldrs_vhs_phase_seconds histogram") == 1
+    store.close()
+
+
+def test_metrics_disabled(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, metrics=False)
+    store.put(BytesIO(b"hello"))
+    store.close()
+    assert not (tmp_path / "metrics.json").exists()
@@ -0,0 +1,59 @@
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs.store import Store
+
+
+def _read(store: Store, ref: str) -> bytes:
+    out = BytesIO()
+    store.copy_to(ref, out)
+    return out.getvalue()
+
+
+def test_small_blobs_are_packed(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, pack_max_bytes=1024)
+    payloads = [f"small output {i}\n".encode() for i in range(50)]
+    refs = store.put_many([BytesIO(p) for p in payloads])
+    big = b"x" * 4096
+    ref_big = store.put(BytesIO(big))
+
+    assert [p for p in (tmp_path / "blobs").rglob("*") if p.is_file()] == [store._blob_path(ref_big[6:])]
+    assert len(list((tmp_path / "packs").iterdir())) == 1
+    for ref, payload in zip(refs, payloads):
+        assert store.has(ref) is True
+        assert _read(store, ref) == payload
+    assert store.read_range(refs[3], 6, 6) == b"output"
+    info = store.info(refs[0])
+    assert info is not None and info.storage == "packed"
+
+    ref_z = store.put(BytesIO(b"compressible " * 20), compress=True)
+    assert _read(store, ref_z) == b"compressible " * 20
+
+
+def test_repack_after_delete(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, pack_max_bytes=1024)
+    refs = store.put_many([BytesIO(f"entry {i}".encode() * 10) for i in range(20)])
+    for ref in refs[:15]:
+        assert store.delete(ref) is True
+    assert store.has(refs[0]) is False
+
+    before = store.stats()
+    result = store.repack()
+    assert result["packs"] == 1 and result["objects_moved"] == 5
+    after = store.stats()
+    assert after["pack_bytes"] < before["pack_bytes"]
+    assert after["pack_bytes"] == after["pack_live_bytes"]
+    for i, ref in enumerate(refs[15:], start=15):
+        assert _read(store, ref) == f"entry {i}".encode() * 10
+    assert len(list((tmp_path / "packs").iterdir())) == 1
+
+
+def test_repeated_payload_in_one_batch_is_packed_once(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, pack_max_bytes=1024)
+    refs = store.put_many([BytesIO(b"12345"), BytesIO(b"12345"), BytesIO(b"other")])
+    assert refs[0] == refs[1]
+    with store._conn() as conn:
+        assert conn.execute("SELECT size, live_bytes FROM packs").fetchone() == (10, 10)
+    assert store.delete(refs[0]) is True and store.delete(refs[2]) is True
+    with store._conn() as conn:
+        assert conn.execute("SELECT live_bytes FROM packs").fetchone() == (0,)
@@ -0,0 +1,79 @@
+import os
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.store import Store
+
+PAYLOAD = b"".join(f"{i:08d} log line with some padding\n".encode() for i in range(50000))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"compress": True},
+        {"compress": True, "seekable": True, "frame_size": 64 * 1024},
+        {"chunked": True, "compress": True},
+    ],
+)
+def test_read_range_matches_slice(tmp_path: Path, options: dict) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(PAYLOAD), **options)
+    for offset, length in [(0, 10), (12345, 70000), (len(PAYLOAD) - 5, 100), (len(PAYLOAD) + 1, 10), (500, None)]:
+        expected = PAYLOAD[offset:] if length is None else PAYLOAD[offset:offset + length]
+        assert store.read_range(ref, offset, length) == expected
+
+
+def test_seekable_tail_reads_only_last_frame(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(PAYLOAD), compress=True, seekable=True, frame_size=64 * 1024)
+    info = store.info(ref)
+    assert info is not None and info.storage == "framed" and info.stored_size < info.size
+
+    calls = []
+    original = store._decompressor
+
+    def counting(compression: str):
+        calls.append(compression)
+        return original(compression)
+
+    monkeypatch.setattr(store, "_decompressor", counting)
+    tail = store.read_range(ref, len(PAYLOAD) - 100, 100)
+    assert tail == PAYLOAD[-100:]
+    assert len(calls) == 1
+
+    out = tmp_path / "full.txt"
+    store.get(ref, out=out)
+    assert out.read_bytes() == PAYLOAD
+
+
+def test_kernel_copy_and_link(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store")
+    payload = os.urandom(3 * 1024 * 1024 + 17)
+    ref = store.put(BytesIO(payload))
+    ref_z = store.put(BytesIO(b"zz" * 1000), compress=True)
+
+    out = tmp_path / "out.bin"
+    store.get(ref, out=out)
+    assert out.read_bytes() == payload
+    store.get(ref, out=out, offset=1000, length=5000)
+    assert out.read_bytes() == payload[1000:6000]
+
+    # A real file object takes the fd path; prefix written first must be kept.
+    with (tmp_path / "cat.bin").open("wb") as f:
+        f.write(b"head:")
+        store.copy_to(ref, f)
+    assert (tmp_path / "cat.bin").read_bytes() == b"head:" + payload
+
+    linked = tmp_path / "linked.bin"
+    store.get(ref, out=linked, link=True)
+    assert linked.read_bytes() == payload
+    assert os.stat(linked).st_ino == os.stat(store._blob_path(ref[6:])).st_ino
+    assert not os.access(linked, os.W_OK) or os.geteuid() == 0
+
+    # Compressed objects cannot be linked and are copied instead.
+    store.get(ref_z, out=linked, link=True)
+    assert linked.read_bytes() == b"zz" * 1000
+    assert store.read_range(ref, 0, 16) == payload[:16]
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs import search as search_mod
+from tldrs_vhs.search import grep, reindex, search
+from tldrs_vhs.store import Store
+
+
+def _fts5() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+needs_fts5 = pytest.mark.skipif(not _fts5(), reason="SQLite without FTS5")
+
+
+@needs_fts5
+def test_index_on_put_and_removal(tmp_path: Path) -> None:
+    store = Store(root=tmp_path, search_index=True)
+    err = store.put(BytesIO(b"pytest run\nE   ConnectionRefusedError: [Errno 111]\n"), compress=True)
+    ok = store.put(BytesIO(b"all 12 tests passed\n"), chunked=True)
+    store.put(BytesIO(b"\x00\x01ConnectionRefusedError"))
+    store.put(BytesIO(b"ConnectionRefusedError unindexed\n"), index=False)
+
+    hits = search(store, "ConnectionRefusedError")
+    assert [h["ref"] for h in hits] == [err]
+    assert "[ConnectionRefusedError]" in hits[0]["snippet"]
+    assert [h["ref"] for h in search(store, "tests AND passed")] == [ok]
+    with pytest.raises(ValueError):
+        search(store, '"unterminated')
+
+    assert store.delete(err)
+    assert search(store, "ConnectionRefusedError") == []
+    store.gc(max_age_days=None, max_size_mb=0)
+    assert search(store, "passed") == []
+    store.close()
+
+
+@needs_fts5
+def test_reindex_backfills_text_only(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"warning: unused variable `x`\n"))
+    store.put(BytesIO(bytes(range(256))))
+    assert search(store, "unused") == []
+    assert reindex(store) == {"indexed": 1, "skipped": 1}
+    assert [h["ref"] for h in search(store, "unused")] == [ref]
+    assert reindex(store) == {"indexed": 0, "skipped": 2}
+    store.close()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_grep_scans_all_text_objects(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, workers: int) -> None:
+    monkeypatch.setattr(search_mod, "GREP_BATCH", 1)
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"ok\nFAILED tests/test_a.py::test_x\nFAILED tests/test_b.py::test_y\n"), compress=True)
+    store.put(BytesIO(b"nothing here\n"))
+    store.put(BytesIO(b"\x00FAILED"))
+
+    hits = grep(store, r"FAILED \S+::test_(\w)", workers=workers)
+    assert [(h["ref"], h["line"]) for h in hits] == [(ref, 2), (ref, 3)]
+    assert hits[0]["text"] == "FAILED tests/test_a.py::test_x"
+    assert len(grep(store, "failed", ignore_case=True, max_per_object=1, workers=workers)) == 1
+    assert grep(store, "test_a.py", fixed=True, workers=workers)[0]["line"] == 2
+    with pytest.raises(ValueError):
+        grep(store, "(")
+    store.close()
+
+
+def test_grep_streams_lines_and_stops_at_binary(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = Store(root=tmp_path)
+    lines = [b"line %d ok" % i for i in range(1, 300_001)]
+    for n in (7, 150_000, 299_999):
+        lines[n - 1] = b"line %d FAILED" % n
+    text = store.put(BytesIO(b"\n".join(lines)), compress=True)
+    binary = store.put(BytesIO(b"\0" + os.urandom(4 << 20)))
+    blocks_read: dict[str, int] = {}
+    iter_range = store._iter_range
+
+    def counting(loc, offset, length):
+        for block in iter_range(loc, offset, length):
+            blocks_read[loc.hash] = blocks_read.get(loc.hash, 0) + 1
+            yield block
+
+    monkeypatch.setattr(store, "_iter_range", counting)
+    hits = grep(store, "^line \\d+ FAILED$", workers=1, max_per_object=10)
+    assert [(h["ref"], h["line"], h["text"]) for h in hits] == [
+        (text, n, f"line {n} FAILED") for n in (7, 150_000, 299_999)
+    ]
+    assert blocks_read[binary[6:]] == 1
+    store.close()
+
+
+def test_grep_workers_open_the_store_read_only(tmp_path: Path) -> None:
+    Store(root=tmp_path).close()
+    search_mod._init_worker(str(tmp_path))
+    assert search_mod._worker_store is not None and search_mod._worker_store.read_only
+    search_mod._worker_store.close()
+    search_mod._worker_store = None
@@ -0,0 +1,111 @@
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.server import Client, DaemonError, StoreServer, socket_path
+from tldrs_vhs.store import Store
+
+
+def _start_server(store: Store) -> StoreServer:
+    server = StoreServer(socket_path(store.root), store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_client_roundtrip(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    payload = b"served payload\n" * 1000
+    ref = store.put(BytesIO(payload), compress=True)
+    server = _start_server(store)
+    try:
+        client = Client.connect(socket_path(tmp_path))
+        assert client is not None
+        assert client.has(ref) is True
+        assert client.has("vhs://" + "0" * 64) is False
+        assert client.info(ref)["size"] == len(payload)
+        out = BytesIO()
+        client.get(ref, out)
+        assert out.getvalue() == payload
+        # Connection stays usable after a stream
+        assert client.ping() is True
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cli_uses_daemon_and_falls_back(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"via daemon"))
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path))
+    cmd = [sys.executable, "-m", "tldrs_vhs.cli", "cat", ref]
+
+    server = _start_server(store)
+    try:
+        result = subprocess.run(cmd, env=env, capture_output=True)
+        assert result.returncode == 0
+        assert result.stdout == b"via daemon"
+    finally:
+        server.shutdown()
+        server.server_close()
+        socket_path(tmp_path).unlink()
+
+    result = subprocess.run(cmd, env=env, capture_output=True)
+    assert result.returncode == 0
+    assert result.stdout == b"via daemon"
+
+
+def test_client_threads_release_their_connections(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"served"))
+    server = _start_server(store)
+    fds_before = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+    try:
+        for _ in range(50):
+            client = Client.connect(socket_path(tmp_path))
+            assert client is not None
+            assert client.info(ref) is not None
+            assert client.has("vhs://" + "0" * 64) is False
+            client.close()
+        deadline = time.monotonic() + 5
+        while len(store._conns) > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Only the test thread's own connection is left.
+        assert len(store._conns) <= 1
+        if fds_before is not None:
+            assert len(os.listdir("/proc/self/fd")) <= fds_before + 5
+    finally:
+        server.shutdown()
+        server.server_close()
+        store.close()
+
+
+def test_failing_request_gets_an_error_reply(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"served"))
+    server = _start_server(store)
+    assert stat.S_IMODE(os.stat(socket_path(tmp_path)).st_mode) == 0o600
+
+    def broken_stats() -> dict:
+        raise RuntimeError("stats exploded")
+
+    monkeypatch.setattr(store, "stats", broken_stats)
+    try:
+        client = Client.connect(socket_path(tmp_path))
+        assert client is not None
+        with pytest.raises(DaemonError, match="stats exploded"):
+            client.stats()
+        # The connection survives the failure.
+        assert client.has(ref) is True
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        store.close()
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from tldrs_vhs.store import SCHEMA_VERSION, Store
+
+# Opt-in wall-clock budget for a cold `tldrs-vhs has` (see README "Startup").
+STARTUP_BUDGET_S = float(os.environ.get("TLDRS_VHS_STARTUP_BUDGET_MS", "100")) / 1000
+
+
+def test_schema_version_and_legacy_upgrade(tmp_path: Path) -> None:
+    db = tmp_path / "meta.sqlite"
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE objects (hash TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+        " created_at TEXT NOT NULL, last_accessed TEXT NOT NULL)"
+    )
+    conn.execute("INSERT INTO objects VALUES ('a' , 5, 'x', 'x')")
+    conn.execute("INSERT INTO objects VALUES ('b' , 5, '2000-01-01T00:00:00+00:00', '2000-01-02T00:00:00.5+00:00')")
+    conn.commit()
+    conn.close()
+
+    store = Store(root=tmp_path)
+    conn = store._conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT stored_size, compression FROM objects WHERE hash = 'a'").fetchone() == (5, "")
+    # ISO timestamps become epoch seconds
+    assert conn.execute("SELECT created_at, last_accessed FROM objects WHERE hash = 'b'").fetchone() == (946684800, 946771200)
+    store.close()
+
+
+_COLD_HAS_PROBE = """
+import json, sqlite3, sys
+statements = []
+connect = sqlite3.connect
+def traced(*args, **kwargs):
+    conn = connect(*args, **kwargs)
+    conn.set_trace_callback(statements.append)
+    return conn
+sqlite3.connect = traced
+sys.argv = ["tldrs-vhs", "has", sys.argv[1]]
+from tldrs_vhs import cli
+code = cli.main()
+print(json.dumps({"code": code, "modules": sorted(m for m in sys.modules if m.startswith("tldrs_vhs")),
+                  "hashlib": "hashlib" in sys.modules, "statements": statements}))
+"""
+
+
+def test_cold_has_does_no_extra_work(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"startup"))
+    store.close()
+
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path), TLDRS_VHS_NO_DAEMON="1")
+    probe = (
+        "import sys; from tldrs_vhs import cli; from tldrs_vhs.store import Store; "
+        "print(','.join(m for m in ('zlib', 'hashlib', 'shutil') if m in sys.modules))"
+    )
+    loaded = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True)
+    assert loaded.stdout.strip() == ""
+
+    out = subprocess.run(
+        [sys.executable, "-c", _COLD_HAS_PROBE, ref], env=env, capture_output=True, text=True, check=True
+    )
+    report = json.loads(out.stdout)
+    assert report["code"] == 0
+    # No recovery, hashing or feature modules on the hot path.
+    assert report["modules"] == ["tldrs_vhs", "tldrs_vhs.cli", "tldrs_vhs.metrics", "tldrs_vhs.store"]
+    assert not report["hashlib"]
+    # A current store costs one pragma read: no migration and no write lock.
+    statements = [s.split()[0].upper() for s in report["statements"]]
+    assert set(statements) <= {"PRAGMA", "SELECT"}
+    assert report["statements"].count("PRAGMA user_version") == 1
+
+
+@pytest.mark.skipif(
+    "TLDRS_VHS_STARTUP_BUDGET_MS" not in os.environ, reason="set TLDRS_VHS_STARTUP_BUDGET_MS to time startup"
+)
+def test_cold_has_within_budget(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"startup"))
+    store.close()
+
+    env = dict(os.environ, TLDRS_VHS_HOME=str(tmp_path), TLDRS_VHS_NO_DAEMON="1")
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-m", "tldrs_vhs.cli", "has", ref], env=env)
+        best = min(best, time.perf_counter() - start)
+        assert result.returncode == 0
+    assert best < STARTUP_BUDGET_S, f"cold has took {best * 1000:.1f} ms"
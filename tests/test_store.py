@@ -1,6 +1,10 @@
+import stat
 from io import BytesIO
 from pathlib import Path
 
+import pytest
+
+from tldrs_vhs import store as store_module
 from tldrs_vhs.store import Store
 
 
@@ -69,3 +73,176 @@ def test_compress_min_bytes(tmp_path: Path) -> None:
     info_big = store.info(ref_big)
     assert info_big is not None
     assert info_big.compression == "zlib"
+
+
+def test_batch_put_get_has(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store")
+    src = tmp_path / "input.txt"
+    src.write_bytes(b"from a file")
+
+    refs = store.put_many([src, BytesIO(b"from a stream")], compress_min_bytes=1)
+    assert len(refs) == 2
+    assert store.stats()["count"] == 2
+
+    missing = "vhs://" + "0" * 64
+    assert store.has_many(refs + [missing]) == {refs[0]: True, refs[1]: True, missing: False}
+
+    results = store.get_many(refs + [missing], tmp_path / "out")
+    assert results[missing] is None
+    assert results[refs[0]].read_bytes() == b"from a file"
+    assert results[refs[1]].read_bytes() == b"from a stream"
+
+
+def test_cli_put_many_reports_unreadable_paths(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    import io
+    import json
+
+    from tldrs_vhs import cli
+
+    good, locked = tmp_path / "good.txt", tmp_path / "locked.txt"
+    good.write_bytes(b"good")
+    locked.write_bytes(b"locked")
+    real_open = open
+
+    def guarded_open(path, *args, **kwargs):
+        if str(path) == str(locked):
+            raise PermissionError(13, "Permission denied", str(path))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(cli, "open", guarded_open, raising=False)
+    monkeypatch.setenv("TLDRS_VHS_HOME", str(tmp_path / "store"))
+    monkeypatch.setenv("TLDRS_VHS_NO_DAEMON", "1")
+    monkeypatch.setattr("sys.argv", ["tldrs-vhs", "put-many"])
+    manifest = f"{good}\n{locked}\n{tmp_path / 'missing'}\n{good}\n".encode()
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(manifest)))
+    assert cli.main() == 1
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line.get("error") for line in lines] == [None, "Permission denied", "not a file", None]
+    assert lines[0]["ref"] == lines[3]["ref"]
+
+
+def test_cli_info_and_ls_print_iso_timestamps(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    import json
+    from datetime import datetime
+
+    from tldrs_vhs import cli
+
+    monkeypatch.setenv("TLDRS_VHS_HOME", str(tmp_path))
+    monkeypatch.setenv("TLDRS_VHS_NO_DAEMON", "1")
+    ref = Store(root=tmp_path).put(BytesIO(b"dated"))
+    monkeypatch.setattr("sys.argv", ["tldrs-vhs", "info", ref])
+    assert cli.main() == 0
+    info = json.loads(capsys.readouterr().out)
+    monkeypatch.setattr("sys.argv", ["tldrs-vhs", "ls"])
+    assert cli.main() == 0
+    (item,) = json.loads(capsys.readouterr().out)
+    for record in (info, item):
+        for key in ("created_at", "last_accessed"):
+            assert datetime.fromisoformat(record[key]).utcoffset().total_seconds() == 0
+
+
+def test_put_dedup_hit_writes_nothing(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store")
+    src = tmp_path / "input.txt"
+    src.write_bytes(b"already stored" * 1000)
+    with src.open("rb") as f:
+        ref = store.put(f, compress=True)
+
+    tmp_dir = tmp_path / "store" / "tmp"
+    before = store._blob_path(ref[len("vhs://"):]).stat().st_mtime_ns
+    with src.open("rb") as f:
+        assert store.put(f) == ref
+    assert store._blob_path(ref[len("vhs://"):]).stat().st_mtime_ns == before
+    assert not list(tmp_dir.iterdir())
+    # The original compression choice is kept
+    info = store.info(ref)
+    assert info is not None and info.compression == "zlib"
+
+
+def test_file_changed_after_hashing_is_rehashed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import hashlib
+
+    store = Store(root=tmp_path / "store")
+    src = tmp_path / "growing.log"
+    src.write_bytes(b"a" * 100)
+    real_hash = store_module._hash_regular_file
+
+    def hash_then_grow(stream):
+        known = real_hash(stream)
+        with open(src, "ab") as f:
+            f.write(b"b" * 50)
+        return known
+
+    monkeypatch.setattr(store_module, "_hash_regular_file", hash_then_grow)
+    for kwargs in ({}, {"compress": True}, {"chunked": True}):
+        src.write_bytes(b"a" * 100 + repr(kwargs).encode())
+        with src.open("rb") as f:
+            ref = store.put(f, **kwargs)
+        stored = store.read_range(ref, 0)
+        assert ref == "vhs://" + hashlib.sha256(stored).hexdigest()
+        assert store.info(ref).size == len(stored) == src.stat().st_size
+
+
+def test_put_expect_hash(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"known"))
+
+    class Unreadable:
+        def read(self, n: int = -1) -> bytes:
+            raise AssertionError("stream should not be read")
+
+    assert store.put(Unreadable(), expect_hash=ref) == ref  # type: ignore[arg-type]
+
+    with pytest.raises(ValueError):
+        store.put(BytesIO(b"different"), expect_hash="0" * 64)
+    assert store.stats()["count"] == 1
+    assert not list((tmp_path / "tmp").iterdir())
+
+
+def test_put_file_move_and_link(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store")
+    src = tmp_path / "artifact.bin"
+    src.write_bytes(b"artifact " * 1000)
+    ino = src.stat().st_ino
+
+    ref = store.put_file(src, "move")
+    assert not src.exists()
+    blob = store._blob_path(ref[6:])
+    assert blob.stat().st_ino == ino
+    assert store.read_range(ref, 0, 8) == b"artifact"
+
+    # A dedup hit leaves the source alone
+    src.write_bytes(b"artifact " * 1000)
+    assert store.put_file(src, "move") == ref
+    assert src.exists()
+
+    other = tmp_path / "other.bin"
+    other.write_bytes(b"linked payload")
+    other.chmod(0o640)
+    ref_link = store.put_file(other, "link")
+    assert other.read_bytes() == b"linked payload"
+    assert store.read_range(ref_link, 0) == b"linked payload"
+    # A writable source is reflinked or copied, never made read-only
+    assert stat.S_IMODE(other.stat().st_mode) == 0o640
+    assert store._blob_path(ref_link[6:]).stat().st_ino != other.stat().st_ino
+    other.write_bytes(b"edited after put")
+    assert store.read_range(ref_link, 0) == b"linked payload"
+
+    # A read-only source may share its inode with the blob
+    frozen = tmp_path / "frozen.bin"
+    frozen.write_bytes(b"frozen payload")
+    frozen.chmod(0o444)
+    ref_frozen = store.put_file(frozen, "link")
+    assert stat.S_IMODE(frozen.stat().st_mode) == 0o444
+    assert store.read_range(ref_frozen, 0) == b"frozen payload"
+
+    # Compressed payloads are copied; move still consumes the source
+    third = tmp_path / "third.bin"
+    third.write_bytes(b"z" * 5000)
+    ref_z = store.put_file(third, "move", compress=True)
+    assert not third.exists()
+    assert store.info(ref_z).compression == "zlib"
@@ -0,0 +1,75 @@
+from io import BytesIO
+from pathlib import Path
+
+from tldrs_vhs import tiering
+from tldrs_vhs.fsck import fsck
+from tldrs_vhs.store import TIER_COLD, TIER_HOT, Store
+
+
+def _age(store: Store, ref: str, days: int) -> None:
+    store.flush()
+    with store._conn() as conn:
+        conn.execute(
+            "UPDATE objects SET last_accessed = last_accessed - ? WHERE hash = ?", (days * 86400, ref[6:])
+        )
+
+
+def test_demote_recompress_and_promote(tmp_path: Path) -> None:
+    store = Store(root=tmp_path / "store", cold_root=tmp_path / "slow")
+    payload = b"".join(b"line %d of a long build log\n" % i for i in range(20_000))
+    old = store.put(BytesIO(payload))
+    fresh = store.put(BytesIO(b"fresh"))
+    _age(store, old, 3)
+
+    result = tiering.run(store, cold_after_days=1, codec="zlib", level=9)
+    assert result["demoted"] == 1 and result["saved_bytes"] > 0 and result["complete"]
+    info = store.info(old)
+    assert info.tier == TIER_COLD and info.compression == "zlib" and info.stored_size < len(payload)
+    assert not store._blob_path(old[6:]).exists()
+    assert (tmp_path / "slow" / "blobs" / old[6:8] / old[8:10] / old[6:]).exists()
+    assert store.info(fresh).tier == TIER_HOT
+
+    # Reads are transparent, and fsck knows where cold blobs live.
+    assert store.read_range(old, 0) == payload
+    assert store.has(old)
+    report = fsck(store)
+    assert report["ok"] == 2 and report["orphans"] == []
+    tiers = tiering.report(store)
+    assert tiers["cold"]["objects"] == 1 and tiers["hot"]["objects"] == 1
+
+    # The reads above made it hot again.
+    store.flush()
+    assert tiering.run(store, cold_after_days=1)["promoted"] == 1
+    info = store.info(old)
+    assert info.tier == TIER_HOT and info.compression == "" and info.stored_size == len(payload)
+    assert store._blob_path(old[6:]).exists()
+    assert store.read_range(old, 5, 4) == payload[5:9]
+    store.close()
+
+
+def test_dry_run_and_delete_from_cold(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"x" * 5000), compress=True)
+    _age(store, ref, 10)
+    assert tiering.run(store, cold_after_days=1, dry_run=True)["demoted"] == 1
+    assert tiering.report(store)["hot"]["objects"] == 1
+    tiering.run(store, cold_after_days=1, promote=False)
+    cold_path = store._object_path(ref[6:], TIER_COLD)
+    assert cold_path.exists() and (tmp_path / "cold").is_dir()
+    # A re-put of cold content is a dedup hit, not a second copy.
+    assert store.put(BytesIO(b"x" * 5000)) == ref and not store._blob_path(ref[6:]).exists()
+    assert store.delete(ref)
+    assert not cold_path.exists()
+    store.close()
+
+
+def test_reader_follows_a_blob_moved_after_lookup(tmp_path: Path) -> None:
+    store = Store(root=tmp_path)
+    ref = store.put(BytesIO(b"moving target " * 100))
+    loc = store._lookup(ref[6:])
+    _age(store, ref, 5)
+    tiering.run(store, cold_after_days=1, promote=False)
+    out = BytesIO()
+    store._copy_object(loc, out)
+    assert out.getvalue() == b"moving target " * 100
+    store.close()